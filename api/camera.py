@@ -1,22 +1,54 @@
-from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect, Query, Response
 from db.database import get_connection
 from services.rtsp_service import rtsp_service
 from schemas.camera_schema import CameraOut, CameraCreate
+from api.pagination import decode_cursor, paginate, parse_fields, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
 import asyncio
 import subprocess
 
 router = APIRouter()
+
+CAMERA_FIELDS = ["camera_id", "name", "rtsp_url", "capture_backend", "snapshot_url", "conversion_rate"]
+
 @router.get("/cameras")
-def get_cameras():
+def get_cameras(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE,
+                                 description=f"Số camera mỗi trang (mặc định {DEFAULT_PAGE_SIZE} khi có cursor)"),
+    cursor: Optional[str] = Query(None, description="Giá trị X-Next-Cursor của trang trước"),
+    fields: Optional[str] = Query(None, description="Danh sách cột, phân tách bởi dấu phẩy")
+):
+    """
+    Danh sách camera. Không truyền limit và cursor thì trả về toàn bộ camera như trước;
+    có limit hoặc cursor thì phân trang keyset theo camera_id.
+    """
+    columns = parse_fields(fields, CAMERA_FIELDS, ["camera_id"])
     conn = get_connection()
     if conn is None:
         raise HTTPException(status_code=500, detail="Database connection failed")
     
     try:
-        with conn.cursor() as cursor:
-            cursor.execute("SELECT * FROM cameras")
-            result = cursor.fetchall()
-        return result
+        query = f"SELECT {', '.join(columns)} FROM cameras"
+        params = []
+        if cursor:
+            (after_id,) = decode_cursor(cursor, 1)
+            query += " WHERE camera_id > %s"
+            params.append(after_id)
+        query += " ORDER BY camera_id"
+        paginated = limit is not None or cursor is not None
+        if paginated:
+            limit = limit or DEFAULT_PAGE_SIZE
+            query += " LIMIT %s"
+            params.append(limit + 1)
+
+        with conn.cursor() as db_cursor:
+            db_cursor.execute(query, params)
+            result = list(db_cursor.fetchall())
+        return paginate(response, result, limit, ["camera_id"]) if paginated else result
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
     finally:
@@ -30,17 +62,19 @@ def create_camera(camera: CameraCreate):
 
     try:
         # Gọi hàm tính hệ số chuyển đổi
-        conversion_rate = rtsp_service.process_unit_conversion(camera.rtsp_url, camera.input_size_value)
+        conversion_rate = rtsp_service.process_unit_conversion(camera.rtsp_url, camera.input_size_value,
+                                                                camera.model_dump())
 
         if conversion_rate is None:
             raise HTTPException(status_code=400, detail="Không tính được hệ số chuyển đổi từ RTSP.")
 
         with conn.cursor() as cursor:
             insert_query = """
-                INSERT INTO cameras (name, rtsp_url, conversion_rate)
-                VALUES (%s, %s, %s)
+                INSERT INTO cameras (name, rtsp_url, capture_backend, snapshot_url, conversion_rate)
+                VALUES (%s, %s, %s, %s, %s)
             """
-            cursor.execute(insert_query, (camera.name, camera.rtsp_url, conversion_rate))
+            cursor.execute(insert_query, (camera.name, camera.rtsp_url, camera.capture_backend,
+                                          camera.snapshot_url, conversion_rate))
             conn.commit()
             camera_id = cursor.lastrowid
 
@@ -48,6 +82,8 @@ def create_camera(camera: CameraCreate):
                 "camera_id": camera_id,
                 "name": camera.name,
                 "rtsp_url": camera.rtsp_url,
+                "capture_backend": camera.capture_backend,
+                "snapshot_url": camera.snapshot_url,
                 "conversion_rate": conversion_rate
             }
     except HTTPException:
@@ -0,0 +1,79 @@
+from typing import List
+
+from fastapi import APIRouter, HTTPException
+from db.database import get_connection
+from schemas.camera_pair_schema import CameraPairCreate, CameraPairOut
+
+router = APIRouter()
+
+@router.get("/camera-pairs", response_model=List[CameraPairOut])
+def get_camera_pairs():
+    conn = get_connection()
+    if conn is None:
+        raise HTTPException(status_code=500, detail="Database connection failed")
+
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                SELECT pair_id, camera_id_movable, camera_id_fixed, is_active
+                FROM camera_pairs ORDER BY pair_id
+            """)
+            return cursor.fetchall()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    finally:
+        conn.close()
+
+@router.post("/camera-pairs", response_model=CameraPairOut)
+def create_camera_pair(pair: CameraPairCreate):
+    """
+    Khai báo cặp camera QR di động / QR cố định: từ lượt chụp tiếp theo hai camera
+    được lấy frame đồng thời và measurements của chúng có chung thời điểm.
+    """
+    if pair.camera_id_movable == pair.camera_id_fixed:
+        raise HTTPException(status_code=400, detail="Hai camera của một cặp phải khác nhau")
+
+    conn = get_connection()
+    if conn is None:
+        raise HTTPException(status_code=500, detail="Database connection failed")
+
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT COUNT(*) AS total FROM cameras WHERE camera_id IN (%s, %s)",
+                           (pair.camera_id_movable, pair.camera_id_fixed))
+            if cursor.fetchone()["total"] != 2:
+                raise HTTPException(status_code=404, detail="Camera not found")
+
+            cursor.execute("""
+                INSERT INTO camera_pairs (camera_id_movable, camera_id_fixed, is_active)
+                VALUES (%s, %s, %s)
+                ON DUPLICATE KEY UPDATE is_active = VALUES(is_active), pair_id = LAST_INSERT_ID(pair_id)
+            """, (pair.camera_id_movable, pair.camera_id_fixed, pair.is_active))
+            conn.commit()
+            return {"pair_id": cursor.lastrowid, **pair.model_dump()}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    finally:
+        conn.close()
+
+@router.delete("/camera-pairs/{pair_id}")
+def delete_camera_pair(pair_id: int):
+    conn = get_connection()
+    if conn is None:
+        raise HTTPException(status_code=500, detail="Database connection failed")
+
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("DELETE FROM camera_pairs WHERE pair_id = %s", (pair_id,))
+            conn.commit()
+            if cursor.rowcount == 0:
+                raise HTTPException(status_code=404, detail="Camera pair not found")
+        return {"message": "Camera pair deleted successfully"}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    finally:
+        conn.close()
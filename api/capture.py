@@ -0,0 +1,74 @@
+import json
+from typing import Literal, Optional
+
+from fastapi import APIRouter, HTTPException, Query
+from services.cluster_membership import cluster_membership
+from services.thread_safe_db_service import thread_safe_db_service
+from services.capture_job_queue import capture_job_queue
+
+router = APIRouter()
+
+@router.get("/capture/stats")
+def get_capture_stats():
+    """
+    Thống kê lần chạy gần nhất của capture engine trên từng node còn sống
+    (pipeline: độ trễ và queue depth của từng stage), đọc từ heartbeat trong scheduler_nodes
+    nên API không chạy scheduler vẫn thấy thống kê của các worker.
+    """
+    try:
+        nodes = thread_safe_db_service.get_nodes_safe(cluster_membership.node_ttl)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+    stats = []
+    for node in nodes:
+        if not node["alive"] or not node.get("stats"):
+            continue
+        node_stats = json.loads(node["stats"])
+        stats.append({
+            "node_id": node["node_id"],
+            "role": node["role"],
+            "heartbeat_at": node["heartbeat_at"],
+            "engine": node_stats.get("engine"),
+            "last_run": node_stats.get("last_run"),
+            "capture": node_stats.get("capture"),
+        })
+    return stats
+
+@router.get("/capture/nodes")
+def get_capture_nodes():
+    """
+    Các node chạy scheduler (API hoặc `python -m task.worker`) với trạng thái còn sống
+    và thống kê gửi kèm heartbeat gần nhất.
+    """
+    try:
+        nodes = thread_safe_db_service.get_nodes_safe(cluster_membership.node_ttl)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+    for node in nodes:
+        node["alive"] = bool(node["alive"])
+        node["stats"] = json.loads(node["stats"]) if node.get("stats") else None
+    return nodes
+
+@router.get("/capture/queue")
+def get_capture_queue_stats():
+    """
+    Thống kê hàng đợi capture_jobs: số job theo trạng thái, throughput, retry và queue lag.
+    """
+    try:
+        return capture_job_queue.get_stats()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+@router.get("/capture/health")
+def get_camera_health(state: Optional[Literal["closed", "open", "half_open"]] = Query(None)):
+    """
+    Tình trạng từng camera trong cluster (bảng camera_health, do node chụp camera ghi sau mỗi lượt):
+    trạng thái circuit breaker, tỉ lệ thành công, độ trễ trung bình, node đang chụp và thời gian
+    còn lại trước lần probe tiếp theo (camera đang mở circuit).
+    """
+    try:
+        return thread_safe_db_service.get_camera_health_safe(state)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
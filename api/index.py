@@ -1,7 +1,11 @@
 from fastapi import APIRouter
 from .camera import router as camera_router
+from .camera_pair import router as camera_pair_router
 from .schedule_time import router as schedule_time_router
 from .settlement_chart import router as settlement_chart_router
+from .measurement import router as measurement_router
+from .qr_code import router as qr_code_router
+from .capture import router as capture_router
 
 # Tạo router tổng
 router = APIRouter()
@@ -15,6 +19,12 @@ router.include_router(
     tags=["camera"]
 )
 
+router.include_router(
+    camera_pair_router,
+    prefix=f"{API_PREFIX}",
+    tags=["camera-pair"]
+)
+
 router.include_router(
     schedule_time_router,
     prefix=f"{API_PREFIX}",
@@ -26,3 +36,21 @@ router.include_router(
     prefix=f"{API_PREFIX}",
     tags=["settlement-chart"]
 )
+
+router.include_router(
+    measurement_router,
+    prefix=f"{API_PREFIX}",
+    tags=["measurement"]
+)
+
+router.include_router(
+    qr_code_router,
+    prefix=f"{API_PREFIX}",
+    tags=["qr-code"]
+)
+
+router.include_router(
+    capture_router,
+    prefix=f"{API_PREFIX}",
+    tags=["capture"]
+)
@@ -0,0 +1,96 @@
+from datetime import datetime
+from typing import Literal, Optional
+
+from fastapi import APIRouter, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
+from db.database import get_connection
+from services.export_service import measurement_export_service, EXPORT_MEDIA_TYPES
+from api.pagination import decode_cursor, paginate, parse_fields, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+
+router = APIRouter()
+
+MEASUREMENT_FIELDS = ["measurement_id", "qr_code_id", "camera_id", "x", "y", "tracking_time"]
+MEASUREMENT_KEY = ["tracking_time", "measurement_id"]
+
+@router.get("/measurements")
+def get_measurements(
+    response: Response,
+    qr_code_id: Optional[int] = None,
+    camera_id: Optional[int] = None,
+    time_from: Optional[datetime] = Query(None, description="Start time (ISO format)"),
+    time_to: Optional[datetime] = Query(None, description="End time (ISO format)"),
+    order: Literal["asc", "desc"] = "asc",
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description="Giá trị X-Next-Cursor của trang trước"),
+    fields: Optional[str] = Query(None, description="Danh sách cột, phân tách bởi dấu phẩy")
+):
+    """
+    Danh sách measurements, phân trang keyset theo (tracking_time, measurement_id).
+    Mỗi trang là một index range scan bắt đầu từ cursor, nên trang sâu có chi phí
+    như trang đầu (khác với OFFSET). Lọc theo camera_id bỏ qua measurement có camera_id NULL.
+    """
+    columns = parse_fields(fields, MEASUREMENT_FIELDS, MEASUREMENT_KEY)
+    after = None
+    if cursor:
+        after_time, after_id = decode_cursor(cursor, 2)
+        try:
+            after = (datetime.fromisoformat(after_time), after_id)
+        except (TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="Cursor không hợp lệ")
+
+    query, params = measurement_export_service.build_query(
+        qr_code_id=qr_code_id,
+        camera_id=camera_id,
+        time_from=time_from,
+        time_to=time_to,
+        columns=columns,
+        order=order,
+        after=after,
+        limit=limit + 1
+    )
+
+    conn = get_connection()
+    if conn is None:
+        raise HTTPException(status_code=500, detail="Database connection failed")
+
+    try:
+        with conn.cursor() as db_cursor:
+            db_cursor.execute(query, params)
+            result = db_cursor.fetchall()
+        return paginate(response, list(result), limit, MEASUREMENT_KEY)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    finally:
+        conn.close()
+
+@router.get("/measurements/export")
+def export_measurements(
+    format: Literal["ndjson", "csv", "parquet", "arrow"] = "ndjson",
+    qr_code_id: Optional[int] = None,
+    camera_id: Optional[int] = None,
+    time_from: Optional[datetime] = Query(None, description="Start time (ISO format)"),
+    time_to: Optional[datetime] = Query(None, description="End time (ISO format)")
+):
+    """
+    Export measurements dạng stream (chunked), đọc bằng server-side cursor
+    nên bộ nhớ không tăng theo khoảng thời gian export.
+    Lọc theo camera_id bỏ qua measurement cũ có camera_id NULL (ghi trước migration 001
+    và không backfill được bằng migration 013).
+    """
+    if not measurement_export_service.is_format_available(format):
+        # Server không tạo được định dạng đã chọn (thiếu dependency tuỳ chọn pyarrow)
+        raise HTTPException(status_code=406, detail=f"Export {format} cần cài đặt pyarrow (pip install pyarrow)")
+
+    stream = measurement_export_service.stream(
+        format,
+        qr_code_id=qr_code_id,
+        camera_id=camera_id,
+        time_from=time_from,
+        time_to=time_to
+    )
+    filename = f"measurements_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{format}"
+    return StreamingResponse(
+        stream,
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
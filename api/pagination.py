@@ -0,0 +1,60 @@
+"""
+Helpers cho keyset (seek) pagination dùng chung giữa các list endpoint
+"""
+import base64
+import json
+from typing import Any, List, Optional
+
+from fastapi import HTTPException, Response
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+
+def encode_cursor(values: List[Any]) -> str:
+    """Mã hoá giá trị khoá của dòng cuối trang thành cursor (opaque)"""
+    raw = json.dumps(values, default=str, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str, size: int) -> List[Any]:
+    """Giải mã cursor, trả lỗi 400 nếu cursor không hợp lệ"""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except Exception:
+        raise HTTPException(status_code=400, detail="Cursor không hợp lệ")
+    if not isinstance(values, list) or len(values) != size:
+        raise HTTPException(status_code=400, detail="Cursor không hợp lệ")
+    return values
+
+
+def parse_fields(fields: Optional[str], allowed: List[str], required: List[str]) -> List[str]:
+    """
+    Chuyển tham số fields (phân tách bởi dấu phẩy) thành danh sách cột được phép.
+    Các cột khoá (required) luôn được lấy để tạo cursor.
+    """
+    if not fields:
+        return list(allowed)
+
+    requested = [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = [field for field in requested if field not in allowed]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Field không hợp lệ: {', '.join(unknown)}")
+
+    columns = [column for column in required if column not in requested]
+    return columns + requested
+
+
+def paginate(response: Response, rows: List[dict], limit: int, key_columns: List[str]) -> List[dict]:
+    """
+    Query lấy limit + 1 dòng; nếu có dòng dư thì còn trang tiếp theo và
+    cursor của dòng cuối trang được đặt vào header X-Next-Cursor.
+    """
+    if len(rows) <= limit:
+        return rows
+
+    page = rows[:limit]
+    last_row = page[-1]
+    response.headers[NEXT_CURSOR_HEADER] = encode_cursor([last_row[column] for column in key_columns])
+    return page
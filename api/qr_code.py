@@ -0,0 +1,76 @@
+from typing import List, Optional
+
+from fastapi import APIRouter, HTTPException, Query, Response
+from db.database import get_connection
+from schemas.qr_code_schema import QrCodeLatestOut
+from services.thread_safe_db_service import thread_safe_db_service
+from api.pagination import decode_cursor, paginate, parse_fields, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+
+router = APIRouter()
+
+QR_CODE_FIELDS = ["qr_code_id", "name_roi", "initial_x", "initial_y", "initial_time"]
+
+@router.get("/qr-codes")
+def get_qr_codes(
+    response: Response,
+    name_roi: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description="Giá trị X-Next-Cursor của trang trước"),
+    fields: Optional[str] = Query(None, description="Danh sách cột, phân tách bởi dấu phẩy")
+):
+    """
+    Danh sách QR codes, phân trang keyset theo qr_code_id.
+    """
+    columns = parse_fields(fields, QR_CODE_FIELDS, ["qr_code_id"])
+    conditions = []
+    params = []
+    if name_roi is not None:
+        conditions.append("name_roi = %s")
+        params.append(name_roi)
+    if cursor:
+        (after_id,) = decode_cursor(cursor, 1)
+        conditions.append("qr_code_id > %s")
+        params.append(after_id)
+
+    query = f"SELECT {', '.join(columns)} FROM qr_codes"
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    query += " ORDER BY qr_code_id LIMIT %s"
+    params.append(limit + 1)
+
+    conn = get_connection()
+    if conn is None:
+        raise HTTPException(status_code=500, detail="Database connection failed")
+
+    try:
+        with conn.cursor() as db_cursor:
+            db_cursor.execute(query, params)
+            result = db_cursor.fetchall()
+        return paginate(response, list(result), limit, ["qr_code_id"])
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    finally:
+        conn.close()
+
+@router.get("/qr-codes/latest", response_model=List[QrCodeLatestOut])
+def get_latest_qr_codes():
+    """
+    Vị trí hiện tại và độ dịch chuyển của mọi QR, đọc từ bảng latest_measurements
+    (được cập nhật mỗi lần pipeline ghi measurement).
+    """
+    try:
+        rows = thread_safe_db_service.get_latest_measurements_safe()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+    result = []
+    for row in rows:
+        item = dict(row)
+        conversion_rate = item.pop("conversion_rate", None)
+        if item["y"] is not None:
+            item["delta_x"] = item["x"] - item["initial_x"]
+            item["delta_y"] = item["y"] - item["initial_y"]
+            if conversion_rate is not None:
+                item["displacement_y_mm"] = item["delta_y"] * float(conversion_rate)
+        result.append(item)
+    return result
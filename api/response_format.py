@@ -0,0 +1,123 @@
+"""
+Content negotiation cho dữ liệu dạng chuỗi thời gian (biểu đồ):
+JSON (mặc định, orjson nếu có), msgpack hoặc Arrow IPC dạng cột.
+"""
+import importlib.util
+import json
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from fastapi import HTTPException, Request, Response
+
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+MSGPACK_MEDIA_TYPE = "application/x-msgpack"
+JSON_MEDIA_TYPE = "application/json"
+
+_FORMAT_ALIASES = {
+    "arrow": ARROW_MEDIA_TYPE,
+    ARROW_MEDIA_TYPE: ARROW_MEDIA_TYPE,
+    "msgpack": MSGPACK_MEDIA_TYPE,
+    MSGPACK_MEDIA_TYPE: MSGPACK_MEDIA_TYPE,
+    "application/msgpack": MSGPACK_MEDIA_TYPE,
+    "json": JSON_MEDIA_TYPE,
+    JSON_MEDIA_TYPE: JSON_MEDIA_TYPE,
+}
+
+# Thư viện (dependency tuỳ chọn, xem requirements.txt) cần cho từng định dạng nhị phân
+_REQUIRED_MODULES = {
+    ARROW_MEDIA_TYPE: "pyarrow",
+    MSGPACK_MEDIA_TYPE: "msgpack",
+}
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def is_media_type_available(media_type: str) -> bool:
+    module = _REQUIRED_MODULES.get(media_type)
+    return module is None or importlib.util.find_spec(module) is not None
+
+
+def _not_acceptable(media_type: str) -> HTTPException:
+    module = _REQUIRED_MODULES[media_type]
+    return HTTPException(status_code=406,
+                         detail=f"Định dạng {media_type} cần cài đặt {module} (pip install {module})")
+
+
+def negotiate_media_type(request: Request, format: Optional[str] = None) -> str:
+    """
+    Chọn định dạng theo tham số format (ưu tiên) hoặc header Accept.
+    Mặc định là JSON. Định dạng được chọn rõ bằng format mà server thiếu thư viện -> 406;
+    qua Accept thì bỏ qua định dạng đó và xét định dạng tiếp theo.
+    """
+    if format:
+        media_type = _FORMAT_ALIASES.get(format.lower())
+        if media_type is None:
+            raise HTTPException(status_code=400, detail=f"Định dạng không hỗ trợ: {format}")
+        if not is_media_type_available(media_type):
+            raise _not_acceptable(media_type)
+        return media_type
+
+    accept = request.headers.get("accept", "")
+    unavailable = None
+    for part in accept.split(","):
+        media_type = _FORMAT_ALIASES.get(part.split(";")[0].strip().lower())
+        if media_type is None:
+            continue
+        if is_media_type_available(media_type):
+            return media_type
+        unavailable = unavailable or media_type
+    if unavailable is not None and not any(part.split(";")[0].strip() in ("*/*", "application/*")
+                                           for part in accept.split(",")):
+        # Client chỉ chấp nhận định dạng nhị phân mà server không tạo được
+        raise _not_acceptable(unavailable)
+    return JSON_MEDIA_TYPE
+
+
+def _epoch_seconds(value: datetime) -> int:
+    # Thời gian trong DB là naive, giữ nguyên giờ "wall clock" khi đổi sang epoch
+    return int(value.replace(tzinfo=timezone.utc).timestamp())
+
+
+def series_response(media_type: str, times: List[datetime], columns: Dict[str, List[float]],
+                    time_format: str = "%Y-%m-%d %H:%M:%S") -> Response:
+    """
+    Trả về chuỗi thời gian theo định dạng đã chọn.
+    - JSON: danh sách {"time": ..., <column>: ...} như trước (tương thích client cũ)
+    - msgpack: {"time": [epoch giây], <column>: [giá trị]} - các mảng song song
+    - Arrow IPC stream: bảng cột time (timestamp[s]) và các cột giá trị (float64)
+    """
+    if media_type == ARROW_MEDIA_TYPE:
+        try:
+            import pyarrow as pa
+        except ImportError:
+            raise _not_acceptable(ARROW_MEDIA_TYPE)
+        arrays = {"time": pa.array(times, type=pa.timestamp("s"))}
+        arrays.update({name: pa.array(values, type=pa.float64()) for name, values in columns.items()})
+        table = pa.table(arrays)
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return Response(content=sink.getvalue().to_pybytes(), media_type=ARROW_MEDIA_TYPE)
+
+    if media_type == MSGPACK_MEDIA_TYPE:
+        try:
+            import msgpack
+        except ImportError:
+            raise _not_acceptable(MSGPACK_MEDIA_TYPE)
+        payload = {"time": [_epoch_seconds(value) for value in times]}
+        payload.update(columns)
+        return Response(content=msgpack.packb(payload, use_bin_type=True), media_type=MSGPACK_MEDIA_TYPE)
+
+    formatted_times = [value.strftime(time_format) for value in times]
+    records = [
+        {"time": formatted_times[index], **{name: values[index] for name, values in columns.items()}}
+        for index in range(len(times))
+    ]
+    if orjson is not None:
+        content = orjson.dumps(records)
+    else:
+        content = json.dumps(records, separators=(",", ":")).encode("utf-8")
+    return Response(content=content, media_type=JSON_MEDIA_TYPE)
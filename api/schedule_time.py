@@ -3,6 +3,7 @@ from typing import List
 from fastapi import APIRouter, HTTPException
 from db.database import get_connection
 from schemas.schedule_schema import ScheduleTimeOut
+from task.test_task import camera_task_service
 
 router = APIRouter()
 
@@ -39,7 +40,14 @@ def update_schedule_time(schedule_time_id: int, is_active: bool):
             if cursor.rowcount == 0:
                 raise HTTPException(status_code=404, detail="Schedule time not found")
 
+        # Scheduler chạy trong process này: cập nhật cron trigger ngay. Worker chạy riêng
+        # nhận thay đổi qua lần kiểm tra fingerprint schedule_times (SCHEDULE_CHANGE_POLL_SECONDS)
+        if camera_task_service.scheduler.running:
+            camera_task_service.sync_schedules()
+
         return {"message": "Schedule time updated successfully"}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
     finally:
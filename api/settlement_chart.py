@@ -1,23 +1,41 @@
-from fastapi import APIRouter, Query, HTTPException
-from typing import List, Literal, Dict
+from fastapi import APIRouter, Query, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from typing import Literal, Optional
 from datetime import datetime
+import asyncio
+import json
 from db.database import get_connection
+from api.response_format import negotiate_media_type, series_response
+from services.settlement_service import compute_settlement
+from services.settlement_stream import settlement_stream_hub
+
+try:
+    from config.settings import SETTLEMENT_STREAM_KEEPALIVE
+except ImportError:
+    SETTLEMENT_STREAM_KEEPALIVE = 15
 
 router = APIRouter()
 
 @router.get("/settlement-chart")
 def get_settlement_chart(
+    request: Request,
     qr_code_id_movable: int,
     qr_code_id_fixed: int,
     camera_id_movable: int,
     camera_id_fixed: int,
     interval: Literal["hour", "day", "month", "year"] = "hour",
     time_from: datetime = Query(..., description="Start time (ISO format)"),
-    time_to: datetime = Query(..., description="End time (ISO format)")
-) -> List[Dict]:
+    time_to: datetime = Query(..., description="End time (ISO format)"),
+    format: Optional[Literal["json", "msgpack", "arrow"]] = Query(
+        None, description="Ghi đè header Accept (json | msgpack | arrow)"
+    )
+):
     """
     Trả về dữ liệu vẽ biểu đồ độ lún theo công thức tổng quát, nhóm theo giờ/ngày/tháng/năm.
+    Mặc định là JSON; với Accept application/x-msgpack hoặc
+    application/vnd.apache.arrow.stream, dữ liệu được trả về dạng cột (time, settlement).
     """
+    media_type = negotiate_media_type(request, format)
     conn = get_connection()
     if conn is None:
         raise HTTPException(status_code=500, detail="Database connection failed")
@@ -81,27 +99,60 @@ def get_settlement_chart(
             all_time_points = sorted(set(movable_data.keys()) | set(fixed_data.keys()))
 
             # Tính toán độ lún tại từng time_point
-            result = []
+            times = []
+            settlements = []
             for time_group in all_time_points:
                 ym = movable_data.get(time_group, ym0)
                 yr = fixed_data.get(time_group, yr0)
 
-                # Ép kiểu float để tránh lỗi Decimal * float
-                ym_f = float(ym)
-                yr_f = float(yr)
-                ym0_f = float(ym0)
-                yr0_f = float(yr0)
-
-                delta_ym = ym_f - ym0_f
-                delta_yr = yr_f - yr0_f
-                settlement = delta_ym * Sb - delta_yr * Sa
-
-                result.append({
-                    "time": time_group,
-                    "settlement": settlement
-                })
-            return result
+                times.append(datetime.strptime(time_group, "%Y-%m-%d %H:%M:%S"))
+                settlements.append(compute_settlement(ym, yr, ym0, yr0, Sb, Sa))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     finally:
-        conn.close()
\ No newline at end of file
+        conn.close()
+
+    return series_response(media_type, times, {"settlement": settlements})
+
+@router.get("/settlement-chart/stream")
+async def stream_settlement(
+    request: Request,
+    qr_code_id_movable: int,
+    qr_code_id_fixed: int,
+    camera_id_movable: int,
+    camera_id_fixed: int
+):
+    """
+    Server-Sent Events: gửi điểm độ lún mới ngay khi pipeline ghi measurement
+    của QR di động hoặc QR cố định, thay cho việc poll /settlement-chart.
+    Measurement do worker/node khác ghi tới sau tối đa SETTLEMENT_STREAM_POLL_SECONDS.
+    """
+    key = (qr_code_id_movable, qr_code_id_fixed, camera_id_movable, camera_id_fixed)
+    loop = asyncio.get_running_loop()
+    try:
+        subscriber = await asyncio.to_thread(settlement_stream_hub.subscribe, key, loop)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    if subscriber is None:
+        raise HTTPException(status_code=400, detail="Không tìm thấy conversion_rate của camera hoặc initial_y của QR")
+
+    async def event_stream():
+        try:
+            current = settlement_stream_hub.current_point(key)
+            if current is not None:
+                yield f"event: snapshot\ndata: {json.dumps(current)}\n\n"
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(subscriber.queue.get(), timeout=SETTLEMENT_STREAM_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: settlement\ndata: {json.dumps(event)}\n\n"
+        finally:
+            settlement_stream_hub.unsubscribe(key, subscriber)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
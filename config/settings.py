@@ -1,11 +1,111 @@
 """
 Configuration file for camera task service
 """
+import os
 
 # Threading configuration
 MAX_CAMERA_WORKERS = 4  # Số lượng camera có thể xử lý đồng thời
 TIMEOUT_SECONDS = 30     # Timeout cho việc xử lý một camera
 
+# Pipeline configuration (capture -> detect -> persist)
+CAPTURE_STAGE_WORKERS = MAX_CAMERA_WORKERS  # Số thread mở RTSP/đọc frame (chờ mạng)
+DETECT_STAGE_WORKERS = 2                    # Số thread phát hiện QR (CPU)
+PERSIST_STAGE_WORKERS = 2                   # Số thread ghi database/lưu ảnh
+PIPELINE_QUEUE_SIZE = 4                     # Số frame tối đa chờ giữa hai stage
+MAX_SESSIONS_PER_HOST = 2                   # Số phiên RTSP đồng thời tối đa tới cùng một host (NVR)
+
+# Tự điều chỉnh số worker của pipeline theo độ trễ đo được và mức dùng CPU
+ADAPTIVE_WORKERS = True
+CAPTURE_WORKERS_MIN = 2
+CAPTURE_WORKERS_MAX = 32
+DETECT_WORKERS_MIN = 1
+DETECT_WORKERS_MAX = os.cpu_count() or 2
+ADAPTIVE_TARGET_FRACTION = 0.8   # Mục tiêu: lượt chạy xong trong 80% cửa sổ TIMEOUT_SECONDS
+ADAPTIVE_CPU_HIGH = 0.85         # CPU trên ngưỡng này: giảm worker
+ADAPTIVE_CPU_LOW = 0.6           # Chỉ tăng worker khi CPU dưới ngưỡng này
+
+# Deadline cho từng camera (watchdog)
+CAPTURE_ISOLATION = True              # Capture trong process riêng, bị kill khi quá deadline
+CAMERA_CONNECT_DEADLINE_SECONDS = 10  # Deadline mở RTSP stream
+CAMERA_READ_DEADLINE_SECONDS = 5      # Deadline đọc frame sau khi đã kết nối
+CAMERA_DETECT_DEADLINE_SECONDS = 10   # Deadline phát hiện QR trên một frame
+
+# Phát hiện QR đa độ phân giải: tìm trên ảnh thu nhỏ, đọc lại tọa độ trên vùng full-resolution quanh QR
+DETECT_DOWNSCALE_MAX_WIDTH = 1280     # Chiều rộng tối đa của ảnh dùng để tìm QR (0 = tìm trên frame gốc)
+DETECT_REFINE_MARGIN = 0.25           # Lề quanh QR khi cắt vùng full-resolution (tỉ lệ theo kích thước QR)
+DETECT_FULLRES_FALLBACK = True        # Không tìm thấy QR trên ảnh thu nhỏ thì tìm lại trên frame gốc
+
+# Burst: đọc nhiều frame liên tiếp trên cùng một phiên, lưu tâm gộp của mỗi QR kèm độ phân tán
+BURST_FRAMES = 1                      # Số frame mỗi camera mỗi tick (1 = tắt)
+BURST_AGGREGATE = "median"            # Cách gộp tâm: "median" hoặc "trimmed_mean"
+BURST_TRIM_FRACTION = 0.2             # Tỉ lệ giá trị bị bỏ mỗi phía với "trimmed_mean"
+BURST_MATCH_TOLERANCE_PX = 25         # Khoảng cách tâm tối đa (pixel) để ghép QR không tên giữa các frame
+
+# Chụp đồng bộ các camera trong một cặp (bảng camera_pairs)
+PAIR_SYNC_TIMEOUT_SECONDS = 10        # Thời gian tối đa chờ camera còn lại của cặp mở xong phiên
+
+# Pool buffer frame (dùng lại mảng đã cấp phát theo độ phân giải)
+FRAME_POOL_ENABLED = True
+FRAME_POOL_MAX_PER_SHAPE = 8          # Số buffer rảnh tối đa giữ lại cho mỗi độ phân giải
+
+# Ghi ảnh lưu trữ (frame vẽ ROI / debug) bằng thread nền
+ARCHIVE_WRITER_WORKERS = 2            # Số thread encode + ghi ảnh
+ARCHIVE_QUEUE_SIZE = 32               # Số ảnh chờ ghi tối đa
+ARCHIVE_DROP_POLICY = "drop_oldest"   # Khi queue đầy: "drop_oldest" | "drop_newest"
+ARCHIVE_FORMAT = "jpg"                # "jpg" | "webp"
+ARCHIVE_QUALITY = 95                  # Chất lượng encode (1-100)
+ARCHIVE_MAX_WIDTH = 0                 # Thu nhỏ ảnh về chiều rộng tối đa (0 = giữ nguyên độ phân giải)
+ARCHIVE_ROI_ONLY = False              # Chỉ lưu ảnh crop quanh từng QR thay vì cả frame
+ARCHIVE_ROI_PADDING = 32              # Số pixel lấy thêm quanh ROI khi crop
+
+# Camera health / circuit breaker
+HEALTH_FAILURE_THRESHOLD = 3        # Số lần lỗi liên tiếp trước khi mở circuit
+HEALTH_BACKOFF_BASE_SECONDS = 60    # Backoff lần mở đầu tiên, nhân đôi mỗi lần mở lại
+HEALTH_BACKOFF_MAX_SECONDS = 3600   # Backoff tối đa
+HEALTH_PROBE_TIMEOUT_SECONDS = 2    # Timeout probe TCP tới host RTSP khi hết backoff
+HEALTH_HISTORY_SIZE = 20            # Số lần capture gần nhất được giữ để tính tỉ lệ thành công
+
+# Capture engine: "pipeline" (thread + queue theo stage) hoặc "asyncio" (cho hàng trăm camera)
+CAPTURE_ENGINE = "pipeline"
+ASYNC_MAX_CONCURRENT_CAPTURES = 64   # Số phiên RTSP đồng thời tối đa (asyncio engine)
+ASYNC_CAMERA_DEADLINE_SECONDS = 15   # Deadline capture cho từng camera (asyncio engine)
+ASYNC_CPU_WORKERS = 4                # Thread pool cho decode + phát hiện QR
+ASYNC_CAPTURE_THREADS = 32           # Thread pool riêng cho capture blocking (HTTP snapshot, burst, warm-up)
+ASYNC_PERSIST_WORKERS = 4            # Thread pool cho ghi database
+FFMPEG_PATH = "ffmpeg"               # Đường dẫn ffmpeg dùng để lấy frame
+CAPTURE_BACKEND = "opencv"           # Backend mặc định: "opencv", "ffmpeg" (chỉ keyframe) hoặc "http" (JPEG snapshot);
+                                     # cột cameras.capture_backend / snapshot_url chọn riêng cho từng camera
+
+# Scheduling configuration
+CAPTURE_SPREAD_POLICY = "none"       # Rải thời điểm capture: "none" (mặc định, chụp ngay tại capture_time), "hash" (theo camera_id) hoặc "latency" (theo độ trễ đã đo)
+CAPTURE_SPREAD_WINDOW_SECONDS = 20   # Độ rộng cửa sổ rải sau capture_time (giây)
+SCHEDULE_RESYNC_MINUTES = 10  # Chu kỳ đồng bộ lại cron trigger với bảng schedule_times
+SCHEDULE_CHANGE_POLL_SECONDS = 5  # Chu kỳ kiểm tra schedule_times có thay đổi (API ở process khác sửa lịch)
+RUN_OVERLAP_POLICY = "coalesce"  # Khi lượt trước chưa xong: "skip" (bỏ), "queue" (xếp hàng), "coalesce" (gộp thành 1 lượt chờ)
+RUN_QUEUE_MAX = 3                # Số lượt tối đa được xếp hàng với policy "queue"
+MISFIRE_GRACE_SECONDS = 60       # Cron tick bị trễ quá thời gian này thì APScheduler bỏ qua
+CATCHUP_WINDOW_MINUTES = 30      # Khi khởi động, chạy bù tick gần nhất bị lỡ trong cửa sổ này (0 = tắt)
+WARMUP_SECONDS = 5               # Mở trước phiên RTSP bao nhiêu giây trước capture_time (0 = tắt)
+WARMUP_MAX_SESSIONS = 32         # Số phiên warm-up tối đa mỗi tick
+
+# Chạy scheduler trong process API (False khi capture chạy bằng `python -m task.worker`)
+RUN_SCHEDULER_IN_API = os.getenv('RUN_SCHEDULER_IN_API', 'true').lower() in ('1', 'true', 'yes')
+
+# Hàng đợi job capture bền vững (bảng capture_jobs)
+CAPTURE_QUEUE_ENABLED = False          # True: scheduler tạo job, các worker claim job từ database
+CAPTURE_QUEUE_POLL_SECONDS = 1.0       # Chu kỳ kiểm tra job mới khi hàng đợi trống
+CAPTURE_QUEUE_BATCH_SIZE = 16          # Số job tối đa được claim mỗi lần
+CAPTURE_QUEUE_LEASE_SECONDS = 60       # Lease của job; hết lease (worker chết) thì job được claim lại
+CAPTURE_QUEUE_MAX_ATTEMPTS = 3         # Số lần thử tối đa của một job
+CAPTURE_QUEUE_RETRY_BASE_SECONDS = 5   # Backoff retry: base * 2^(lần thử - 1)
+CAPTURE_QUEUE_WINDOW_SECONDS = 120     # Job phải hoàn thành trong cửa sổ này sau capture_time
+
+# Cluster configuration (nhiều uvicorn worker / replica dùng chung database)
+CLUSTER_MODE = True                # Chia camera giữa các node còn sống thay vì mỗi node chụp toàn bộ
+CLUSTER_NODE_ID = None             # Mặc định: hostname-pid-random
+CLUSTER_HEARTBEAT_SECONDS = 10     # Chu kỳ gửi heartbeat vào bảng scheduler_nodes
+CLUSTER_NODE_TTL_SECONDS = 30      # Node không gửi heartbeat quá thời gian này bị coi là đã chết
+
 # Database configuration
 DB_CONNECTION_POOL_SIZE = 10  # Số lượng connection tối đa trong pool
 DB_CONNECTION_TIMEOUT = 30    # Timeout cho database connection
@@ -14,6 +114,15 @@ DB_CONNECTION_TIMEOUT = 30    # Timeout cho database connection
 RTSP_TIMEOUT = 15  # Timeout cho RTSP stream
 RTSP_BUFFER_SIZE = 1  # Buffer size cho RTSP stream
 
+# Export configuration
+EXPORT_FETCH_SIZE = 5000            # Số dòng đọc mỗi lần từ server-side cursor
+EXPORT_PARQUET_ROW_GROUP = 50000    # Số dòng mỗi row group khi export Parquet
+
+# Realtime settlement stream (SSE)
+SETTLEMENT_STREAM_QUEUE_SIZE = 100    # Số event tối đa chờ gửi cho mỗi client
+SETTLEMENT_STREAM_KEEPALIVE = 15      # Giây giữa các comment keep-alive
+SETTLEMENT_STREAM_POLL_SECONDS = 2    # Chu kỳ đọc latest_measurements cho measurement do process/node khác ghi
+
 # Logging configuration
 LOG_LEVEL = "INFO"
 LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
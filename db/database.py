@@ -1,12 +1,12 @@
 import os
 import pymysql
-from pymysql.cursors import DictCursor
+from pymysql.cursors import DictCursor, SSDictCursor
 from dotenv import load_dotenv
 
 # Load file env thay vì .env
 load_dotenv('.env')
 
-def get_connection():
+def get_connection(cursorclass=DictCursor):
     """Tạo connection đến database"""
     try:
         conn = pymysql.connect(
@@ -15,7 +15,7 @@ def get_connection():
             password=os.getenv('MYSQL_PASSWORD', ''),
             database=os.getenv('DATABASE_NAME', 'camera_tracking_system'),
             port=int(os.getenv('MYSQL_PORT', '3306')),
-            cursorclass=DictCursor,
+            cursorclass=cursorclass,
             conv={**pymysql.converters.conversions, pymysql.FIELD_TYPE.TIME: str}
         )
         return conn
@@ -23,5 +23,13 @@ def get_connection():
         print(f"Database connection error: {e}")
         return None
 
+def get_streaming_connection():
+    """
+    Tạo connection với server-side cursor (SSDictCursor) để đọc từng dòng
+    thay vì fetchall() toàn bộ kết quả vào bộ nhớ.
+    Lưu ý: phải đọc hết hoặc đóng connection trước khi chạy query khác.
+    """
+    return get_connection(cursorclass=SSDictCursor)
+
 # Tạo connection mặc định (có thể None nếu không kết nối được)
 conn = get_connection()
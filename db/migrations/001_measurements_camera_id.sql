@@ -0,0 +1,8 @@
+-- Lưu camera_id trên mỗi measurement để có thể lọc/export theo camera
+-- và index phục vụ export theo thời gian (ORDER BY tracking_time, measurement_id).
+ALTER TABLE measurements
+    ADD COLUMN camera_id INT NULL AFTER qr_code_id;
+
+CREATE INDEX idx_measurements_time_id ON measurements (tracking_time, measurement_id);
+CREATE INDEX idx_measurements_qr_time ON measurements (qr_code_id, tracking_time, measurement_id);
+CREATE INDEX idx_measurements_camera_time ON measurements (camera_id, tracking_time, measurement_id);
@@ -0,0 +1,22 @@
+-- Giá trị đo mới nhất của từng QR, được cập nhật cùng transaction với INSERT measurements.
+-- Dashboard đọc toàn bộ bảng này (PK qr_code_id) thay vì query range trên measurements.
+CREATE TABLE IF NOT EXISTS latest_measurements (
+    qr_code_id INT NOT NULL PRIMARY KEY,
+    measurement_id INT NOT NULL,
+    camera_id INT NULL,
+    x INT NOT NULL,
+    y INT NOT NULL,
+    tracking_time DATETIME(6) NOT NULL
+);
+
+-- Backfill từ dữ liệu đã có
+INSERT INTO latest_measurements (qr_code_id, measurement_id, camera_id, x, y, tracking_time)
+SELECT m.qr_code_id, m.measurement_id, m.camera_id, m.x, m.y, m.tracking_time
+FROM measurements m
+JOIN (
+    SELECT qr_code_id, MAX(measurement_id) AS measurement_id
+    FROM measurements
+    WHERE qr_code_id IS NOT NULL
+    GROUP BY qr_code_id
+) newest ON newest.measurement_id = m.measurement_id
+ON DUPLICATE KEY UPDATE qr_code_id = latest_measurements.qr_code_id;
@@ -0,0 +1,13 @@
+-- Lịch sử các lượt capture theo lịch: dùng để gắn run ID vào log, chống chạy chồng
+-- và chạy bù các tick bị lỡ khi service khởi động lại.
+CREATE TABLE IF NOT EXISTS capture_runs (
+    run_id VARCHAR(32) NOT NULL PRIMARY KEY,
+    scheduled_for DATETIME NOT NULL,
+    trigger_source VARCHAR(16) NOT NULL,      -- cron | catchup
+    status VARCHAR(16) NOT NULL,              -- running | completed | failed | skipped | coalesced
+    camera_count INT NOT NULL DEFAULT 0,
+    success_count INT NOT NULL DEFAULT 0,
+    started_at DATETIME(6) NULL,
+    finished_at DATETIME(6) NULL,
+    INDEX idx_capture_runs_scheduled (scheduled_for)
+);
@@ -0,0 +1,4 @@
+-- tracking_time là thời điểm logic của lịch chụp (giống nhau cho mọi camera trong một lượt,
+-- kể cả khi thời điểm bắt đầu capture được rải trong cửa sổ); captured_at là thời điểm thực tế lấy frame.
+ALTER TABLE measurements
+    ADD COLUMN captured_at DATETIME(6) NULL AFTER tracking_time;
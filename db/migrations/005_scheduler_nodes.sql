@@ -0,0 +1,13 @@
+-- Các node đang chạy scheduler (mỗi uvicorn worker / replica là một node).
+-- Node gửi heartbeat định kỳ; node còn sống chia nhau camera bằng rendezvous hashing.
+CREATE TABLE IF NOT EXISTS scheduler_nodes (
+    node_id VARCHAR(64) NOT NULL PRIMARY KEY,
+    hostname VARCHAR(255) NOT NULL,
+    pid INT NOT NULL,
+    started_at DATETIME(6) NOT NULL,
+    heartbeat_at DATETIME(6) NOT NULL,
+    INDEX idx_scheduler_nodes_heartbeat (heartbeat_at)
+);
+
+ALTER TABLE capture_runs
+    ADD COLUMN node_id VARCHAR(64) NULL AFTER run_id;
@@ -0,0 +1,5 @@
+-- Vai trò của node (api: scheduler chạy trong FastAPI, worker: python -m task.worker)
+-- và thống kê gần nhất (JSON) được gửi kèm mỗi heartbeat.
+ALTER TABLE scheduler_nodes
+    ADD COLUMN role VARCHAR(16) NOT NULL DEFAULT 'api' AFTER pid,
+    ADD COLUMN stats TEXT NULL AFTER heartbeat_at;
@@ -0,0 +1,21 @@
+-- Hàng đợi job capture bền vững: một job cho mỗi (run, camera).
+-- Worker claim job bằng lease (SELECT ... FOR UPDATE SKIP LOCKED, cần MySQL 8.0+);
+-- job thất bại được retry với backoff cho tới khi hết cửa sổ của lịch chụp (deadline_at).
+CREATE TABLE IF NOT EXISTS capture_jobs (
+    job_id BIGINT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+    run_id VARCHAR(32) NOT NULL,
+    camera_id INT NOT NULL,
+    scheduled_for DATETIME NOT NULL,
+    status VARCHAR(16) NOT NULL DEFAULT 'pending',   -- pending | leased | done | failed
+    attempts INT NOT NULL DEFAULT 0,
+    available_at DATETIME(6) NOT NULL,
+    deadline_at DATETIME(6) NOT NULL,
+    lease_owner VARCHAR(64) NULL,
+    lease_expires_at DATETIME(6) NULL,
+    last_error VARCHAR(255) NULL,
+    created_at DATETIME(6) NOT NULL,
+    finished_at DATETIME(6) NULL,
+    UNIQUE KEY uq_capture_jobs_run_camera (run_id, camera_id),
+    INDEX idx_capture_jobs_claim (status, available_at),
+    INDEX idx_capture_jobs_finished (finished_at)
+);
@@ -0,0 +1,5 @@
+-- Chọn cách lấy frame cho từng camera: NULL dùng CAPTURE_BACKEND trong config
+-- ('opencv', 'ffmpeg' hoặc 'http'); snapshot_url là URL ảnh JPEG cho backend 'http'.
+ALTER TABLE cameras
+    ADD COLUMN capture_backend VARCHAR(16) NULL AFTER rtsp_url,
+    ADD COLUMN snapshot_url VARCHAR(512) NULL AFTER capture_backend;
@@ -0,0 +1,6 @@
+-- Burst sampling: tâm (x, y) là giá trị gộp (median/trimmed mean) của sample_count frame
+-- đọc liên tiếp trên cùng một phiên; center_dispersion là RMS khoảng cách (pixel) từ tâm
+-- của từng frame tới tâm gộp. NULL với measurement chỉ từ một frame.
+ALTER TABLE measurements
+    ADD COLUMN sample_count SMALLINT NULL AFTER captured_at,
+    ADD COLUMN center_dispersion FLOAT NULL AFTER sample_count;
@@ -0,0 +1,13 @@
+-- Cặp camera dùng để tính độ lún: camera có QR di động và camera có QR cố định làm mốc.
+-- Các camera trong cùng một cặp được mở phiên trước rồi lấy frame cùng lúc (barrier),
+-- và hai measurements có chung tracking_time/captured_at.
+CREATE TABLE IF NOT EXISTS camera_pairs (
+    pair_id INT AUTO_INCREMENT PRIMARY KEY,
+    camera_id_movable INT NOT NULL,
+    camera_id_fixed INT NOT NULL,
+    is_active BOOLEAN NOT NULL DEFAULT TRUE,
+    created_at DATETIME(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6),
+    UNIQUE KEY uq_camera_pairs (camera_id_movable, camera_id_fixed),
+    CONSTRAINT fk_camera_pairs_movable FOREIGN KEY (camera_id_movable) REFERENCES cameras (camera_id) ON DELETE CASCADE,
+    CONSTRAINT fk_camera_pairs_fixed FOREIGN KEY (camera_id_fixed) REFERENCES cameras (camera_id) ON DELETE CASCADE
+);
@@ -0,0 +1,6 @@
+-- Job của các camera cùng cặp (camera_pairs) có chung available_at và pair_leader_id
+-- (camera_id nhỏ nhất trong nhóm): worker claim job của camera leader sẽ claim luôn các job
+-- còn lại của nhóm để chụp đồng bộ. NULL với camera không thuộc cặp nào.
+ALTER TABLE capture_jobs
+    ADD COLUMN pair_leader_id INT NULL AFTER camera_id,
+    ADD INDEX idx_capture_jobs_pair (run_id, pair_leader_id);
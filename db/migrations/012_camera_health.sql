@@ -0,0 +1,19 @@
+-- Tình trạng camera (circuit breaker) do node chụp camera ghi sau mỗi lượt chạy,
+-- để API (kể cả khi không chạy scheduler) đọc được tình trạng của toàn bộ camera trong cluster.
+CREATE TABLE IF NOT EXISTS camera_health (
+    camera_id INT NOT NULL PRIMARY KEY,
+    camera_name VARCHAR(255) NULL,
+    node_id VARCHAR(64) NOT NULL,
+    state VARCHAR(16) NOT NULL,                 -- closed | open | half_open
+    consecutive_failures INT NOT NULL DEFAULT 0,
+    success_rate FLOAT NULL,
+    avg_latency_ms FLOAT NULL,
+    recent_attempts INT NOT NULL DEFAULT 0,
+    last_reason VARCHAR(255) NULL,
+    last_success_at DATETIME(6) NULL,
+    last_failure_at DATETIME(6) NULL,
+    open_until DATETIME(6) NULL,
+    probes INT NOT NULL DEFAULT 0,
+    updated_at DATETIME(6) NOT NULL,
+    INDEX idx_camera_health_state (state)
+);
@@ -0,0 +1,19 @@
+-- Measurement ghi trước migration 001 có camera_id NULL nên export/GET /measurements lọc theo
+-- camera_id không thấy chúng. QR không lưu camera, nên chỉ backfill được cho QR mà mọi measurement
+-- đã có camera_id đều thuộc đúng một camera; QR từng thấy ở nhiều camera (hoặc chưa có measurement
+-- mới nào) giữ NULL và chỉ xuất hiện khi lọc theo qr_code_id/thời gian. Chạy lại được nhiều lần.
+UPDATE measurements m
+JOIN (
+    SELECT qr_code_id, MIN(camera_id) AS camera_id
+    FROM measurements
+    WHERE camera_id IS NOT NULL AND qr_code_id IS NOT NULL
+    GROUP BY qr_code_id
+    HAVING COUNT(DISTINCT camera_id) = 1
+) known ON known.qr_code_id = m.qr_code_id
+SET m.camera_id = known.camera_id
+WHERE m.camera_id IS NULL;
+
+UPDATE latest_measurements latest
+JOIN measurements m ON m.measurement_id = latest.measurement_id
+SET latest.camera_id = m.camera_id
+WHERE latest.camera_id IS NULL AND m.camera_id IS NOT NULL;
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Script export measurements ra file NDJSON / CSV / Parquet (dạng stream, bộ nhớ cố định)
+
+Ví dụ:
+    python export_measurements.py --format parquet --from 2024-01-01 --to 2024-12-31 -o measurements.parquet
+"""
+
+import argparse
+import os
+import sys
+from datetime import datetime
+
+# Thêm đường dẫn để import các module
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from services.export_service import measurement_export_service
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Export measurements")
+    parser.add_argument("--format", choices=["ndjson", "csv", "parquet", "arrow"], default="ndjson")
+    parser.add_argument("--qr-code-id", type=int, default=None)
+    parser.add_argument("--camera-id", type=int, default=None)
+    parser.add_argument("--from", dest="time_from", type=datetime.fromisoformat, default=None,
+                        help="Thời gian bắt đầu (ISO format)")
+    parser.add_argument("--to", dest="time_to", type=datetime.fromisoformat, default=None,
+                        help="Thời gian kết thúc (ISO format)")
+    parser.add_argument("-o", "--output", default="-", help="File output, '-' để ghi ra stdout")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    if not measurement_export_service.is_format_available(args.format):
+        print(f"❌ Export {args.format} cần cài đặt pyarrow", file=sys.stderr)
+        return 1
+
+    stream = measurement_export_service.stream(
+        args.format,
+        qr_code_id=args.qr_code_id,
+        camera_id=args.camera_id,
+        time_from=args.time_from,
+        time_to=args.time_to
+    )
+
+    output = sys.stdout.buffer if args.output == "-" else open(args.output, "wb")
+    written = 0
+    try:
+        for chunk in stream:
+            output.write(chunk)
+            written += len(chunk)
+    finally:
+        if output is not sys.stdout.buffer:
+            output.close()
+
+    print(f"✅ Đã export {written} bytes ({args.format})", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
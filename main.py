@@ -4,13 +4,21 @@ from contextlib import asynccontextmanager
 from task.test_task import camera_task_service
 from fastapi.middleware.cors import CORSMiddleware
 
+try:
+    from config.settings import RUN_SCHEDULER_IN_API
+except ImportError:
+    RUN_SCHEDULER_IN_API = True
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Khởi động các dịch vụ nền khi app bắt đầu
-    camera_task_service.start()
+    # (khi capture chạy bằng `python -m task.worker` thì API không chạy scheduler)
+    if RUN_SCHEDULER_IN_API:
+        camera_task_service.start()
     yield
     # Dừng các dịch vụ nền khi app kết thúc
-    camera_task_service.stop()
+    if RUN_SCHEDULER_IN_API:
+        camera_task_service.stop()
 
 app = FastAPI(lifespan=lifespan)
 
@@ -20,6 +28,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 # Include tất cả routes từ index.routes
@@ -12,6 +12,7 @@ from datetime import datetime
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from services.thread_safe_rtsp_service import thread_safe_rtsp_service
+from services.frame_archive import frame_archive_writer
 from services.database_service import database_service
 
 # Cấu hình logging
@@ -140,3 +141,6 @@ if __name__ == "__main__":
         logger.info("\n⚠️ Test đã bị dừng bởi người dùng")
     except Exception as e:
         logger.error(f"❌ Lỗi không mong muốn: {str(e)}")
+    finally:
+        # Ảnh debug được ghi trên thread nền: chờ ghi xong trước khi thoát
+        frame_archive_writer.flush(timeout=30)
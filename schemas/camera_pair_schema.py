@@ -0,0 +1,12 @@
+from pydantic import BaseModel
+
+class CameraPairCreate(BaseModel):
+    camera_id_movable: int
+    camera_id_fixed: int
+    is_active: bool = True
+
+class CameraPairOut(CameraPairCreate):
+    pair_id: int
+
+    class Config:
+        from_attributes = True
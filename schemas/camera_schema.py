@@ -1,9 +1,13 @@
+from typing import Literal, Optional
+
 from pydantic import BaseModel
 
 class CameraCreate(BaseModel):
     name: str
     rtsp_url: str
     input_size_value: float
+    capture_backend: Optional[Literal["opencv", "ffmpeg", "http"]] = None
+    snapshot_url: Optional[str] = None
 
 class CameraOut(CameraCreate):
     camera_id: int
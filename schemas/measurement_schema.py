@@ -1,5 +1,6 @@
 from pydantic import BaseModel
 from datetime import datetime
+from typing import Optional
 
 class MeasurementBase(BaseModel):
     x: int
@@ -9,6 +10,7 @@ class MeasurementBase(BaseModel):
 class MeasurementOut(MeasurementBase):
     measurement_id: int
     tracking_time: datetime
+    camera_id: Optional[int] = None
 
     class Config:
         from_attributes = True
@@ -1,5 +1,6 @@
 from pydantic import BaseModel
 from datetime import datetime
+from typing import Optional
 
 class QrCodeBase(BaseModel):
     name_roi: str
@@ -12,3 +13,17 @@ class QrCodeOut(QrCodeBase):
 
     class Config:
         from_attributes = True
+
+class QrCodeLatestOut(BaseModel):
+    qr_code_id: int
+    name_roi: str
+    initial_x: int
+    initial_y: int
+    measurement_id: Optional[int] = None
+    camera_id: Optional[int] = None
+    x: Optional[int] = None
+    y: Optional[int] = None
+    tracking_time: Optional[datetime] = None
+    delta_x: Optional[int] = None
+    delta_y: Optional[int] = None
+    displacement_y_mm: Optional[float] = None
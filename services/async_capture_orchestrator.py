@@ -0,0 +1,452 @@
+"""
+Asyncio orchestrator cho số lượng camera lớn: capture bằng ffmpeg subprocess bất đồng bộ,
+chỉ phần decode/phát hiện QR chạy trên thread pool
+"""
+import asyncio
+import contextlib
+import logging
+import os
+import signal
+import time
+from collections import Counter
+from datetime import datetime
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from services.thread_safe_rtsp_service import thread_safe_rtsp_service
+from services.host_limiter import host_concurrency_limiter, host_key, interleave_by_host
+from services.capture_warmup import capture_warmup_pool
+from services.capture_backends import CaptureBackend, resolve_backend
+from services.burst_sampling import aggregate_detections
+from services.frame_pool import current_rss_mb, frame_pool, peak_rss_mb
+from services.frame_archive import frame_archive_writer
+
+try:
+    from config.settings import (ASYNC_MAX_CONCURRENT_CAPTURES, ASYNC_CAMERA_DEADLINE_SECONDS,
+                                 ASYNC_CPU_WORKERS, ASYNC_PERSIST_WORKERS, ASYNC_CAPTURE_THREADS,
+                                 TIMEOUT_SECONDS, FFMPEG_PATH,
+                                 CAMERA_DETECT_DEADLINE_SECONDS, MAX_SESSIONS_PER_HOST, BURST_FRAMES)
+except ImportError:
+    ASYNC_MAX_CONCURRENT_CAPTURES = 64
+    ASYNC_CAMERA_DEADLINE_SECONDS = 15
+    ASYNC_CPU_WORKERS = os.cpu_count() or 2
+    ASYNC_PERSIST_WORKERS = 4
+    ASYNC_CAPTURE_THREADS = 32
+    TIMEOUT_SECONDS = 30
+    FFMPEG_PATH = "ffmpeg"
+    CAMERA_DETECT_DEADLINE_SECONDS = 10
+    MAX_SESSIONS_PER_HOST = 2
+    BURST_FRAMES = 1
+
+logger = logging.getLogger(__name__)
+
+
+def _kill_process_tree(pid: int):
+    """Kill process và các process con (process được tạo trong session riêng)"""
+    try:
+        if hasattr(os, "killpg"):
+            os.killpg(pid, signal.SIGKILL)
+        else:
+            os.kill(pid, signal.SIGTERM)
+    except ProcessLookupError:
+        pass
+
+
+def _frames_of(result: Any) -> List[np.ndarray]:
+    """Frame trong kết quả của grab_burst/PairSync.capture ((frames, reason)) hoặc take_burst (frames)"""
+    frames = result[0] if isinstance(result, tuple) else result
+    return list(frames or [])
+
+
+class _GroupSlots:
+    """
+    Slot giữ sẵn cho một nhóm camera chụp đồng bộ (cùng PairSync): semaphore của host và semaphore chung
+    được lấy một lần cho cả nhóm, và nhóm có executor riêng đủ thread cho mọi camera (barrier cần tất cả
+    cùng chạy). Tất cả được trả khi camera cuối cùng của nhóm chụp xong.
+    """
+
+    def __init__(self, members: int):
+        self.remaining = members
+        self.executor = ThreadPoolExecutor(max_workers=members, thread_name_prefix="AsyncPairCapture")
+        self._held: List[asyncio.Semaphore] = []
+
+    async def acquire(self, semaphore: asyncio.Semaphore, count: int):
+        for _ in range(count):
+            await semaphore.acquire()
+            self._held.append(semaphore)
+
+    async def leave(self):
+        self.remaining -= 1
+        if self.remaining <= 0:
+            self.release_all()
+
+    def release_all(self):
+        while self._held:
+            self._held.pop().release()
+        self.executor.shutdown(wait=False)
+
+
+class AsyncCaptureOrchestrator:
+    """
+    Mỗi camera là một coroutine (không chiếm OS thread khi chờ mạng):
+    - capture: ffmpeg lấy 1 frame qua pipe (backend "ffmpeg": chỉ giải mã keyframe;
+      backend "http": JPEG snapshot trên thread pool), có deadline riêng cho từng camera
+    - detect: decode ảnh + phát hiện QR trên thread pool CPU
+    - persist: ghi database trên thread pool riêng
+    Semaphore giới hạn số phiên RTSP đồng thời; cả lượt chạy bị giới hạn trong cửa sổ TIMEOUT_SECONDS.
+    """
+
+    def __init__(self, max_concurrent: int = ASYNC_MAX_CONCURRENT_CAPTURES,
+                 camera_deadline: float = ASYNC_CAMERA_DEADLINE_SECONDS,
+                 run_window: float = TIMEOUT_SECONDS,
+                 cpu_workers: int = ASYNC_CPU_WORKERS,
+                 persist_workers: int = ASYNC_PERSIST_WORKERS,
+                 capture_threads: int = ASYNC_CAPTURE_THREADS,
+                 ffmpeg_path: str = FFMPEG_PATH,
+                 burst_frames: int = BURST_FRAMES):
+        self.max_concurrent = max_concurrent
+        self.camera_deadline = camera_deadline
+        self.run_window = run_window
+        self.ffmpeg_path = ffmpeg_path
+        self.burst_frames = max(1, burst_frames)
+        self._cpu_executor = ThreadPoolExecutor(max_workers=cpu_workers, thread_name_prefix="AsyncDetect")
+        self._persist_executor = ThreadPoolExecutor(max_workers=persist_workers, thread_name_prefix="AsyncPersist")
+        # Capture blocking chạy trên pool riêng: camera treo không chiếm default executor của event loop
+        self._capture_executor = ThreadPoolExecutor(max_workers=capture_threads, thread_name_prefix="AsyncCapture")
+        self.last_stats: Dict[str, Any] = {}
+
+    async def _grab_frame_bytes(self, rtsp_url: str, keyframe_only: bool = False) -> Optional[bytes]:
+        """
+        Chạy ffmpeg lấy đúng 1 frame (BMP, không nén lại) qua stdout.
+        keyframe_only (backend "ffmpeg"): chỉ giải mã keyframe, bỏ qua các frame phụ thuộc.
+        """
+        process = await asyncio.create_subprocess_exec(
+            self.ffmpeg_path,
+            "-rtsp_transport", "tcp",
+            *(["-skip_frame", "nokey"] if keyframe_only else []),
+            "-i", rtsp_url,
+            "-frames:v", "1",
+            "-f", "image2pipe",
+            "-vcodec", "bmp",
+            "-loglevel", "error",
+            "-",
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+            start_new_session=True
+        )
+        try:
+            data, _ = await process.communicate()
+        finally:
+            # Bị huỷ do hết deadline -> kill ffmpeg để không để lại process treo
+            if process.returncode is None:
+                _kill_process_tree(process.pid)
+                await process.wait()
+        if process.returncode != 0 or not data:
+            return None
+        return data
+
+    def _offload_capture(self, fn: Callable[..., Any], *args,
+                         executor: Optional[ThreadPoolExecutor] = None) -> asyncio.Future:
+        """
+        Chạy hàm capture blocking trên executor capture. Hết deadline (asyncio.wait_for huỷ future)
+        không dừng được thread đang chạy: khi thread xong muộn, frame nó trả về được trả lại frame_pool;
+        job chưa kịp chạy thì bị huỷ luôn.
+        """
+        loop = asyncio.get_running_loop()
+        waiter = loop.create_future()
+        job = (executor or self._capture_executor).submit(fn, *args)
+
+        def deliver(done: Future):
+            if done.cancelled():
+                return
+            if waiter.done():
+                # Bên chờ đã bỏ (deadline/cancel): frame không còn ai dùng
+                if done.exception() is None:
+                    frame_pool.release(*_frames_of(done.result()))
+                return
+            if done.exception() is not None:
+                waiter.set_exception(done.exception())
+            else:
+                waiter.set_result(done.result())
+
+        def on_job_done(done: Future):
+            try:
+                loop.call_soon_threadsafe(deliver, done)
+            except RuntimeError:
+                # Event loop của lượt chạy đã đóng
+                if not done.cancelled() and done.exception() is None:
+                    frame_pool.release(*_frames_of(done.result()))
+
+        job.add_done_callback(on_job_done)
+        waiter.add_done_callback(lambda future: future.cancelled() and job.cancel())
+        return waiter
+
+    @staticmethod
+    def _decode_and_detect(data: bytes, camera_id: int):
+        frame = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if frame is None:
+            return None, []
+        return frame, thread_safe_rtsp_service.detect_qr_codes(frame, camera_id)
+
+    async def _process_camera(self, camera: Dict[str, Any], target: Tuple[CaptureBackend, str],
+                              semaphore: asyncio.Semaphore, host_semaphore: asyncio.Semaphore,
+                              scheduled_for: Optional[datetime],
+                              group: Optional[_GroupSlots] = None,
+                              warm_slots: Optional[Dict[int, str]] = None) -> Dict[str, Any]:
+        # Chờ tới thời điểm bắt đầu đã được rải trong cửa sổ
+        start_offset = camera.get('start_offset') or 0.0
+        if start_offset > 0:
+            await asyncio.sleep(start_offset)
+
+        loop = asyncio.get_running_loop()
+        camera_name = camera.get('name', 'N/A')
+        camera_id = camera.get('camera_id')
+        result = {
+            "success": False,
+            "camera_name": camera_name,
+            "camera_id": camera_id,
+            "frame_time": 0,
+            "qr_time": 0,
+            "persist_time": 0,
+        }
+        start_time = time.time()
+        # Buffer của frame chỉ được trả về pool khi không còn thread detect nào đọc chúng
+        frames, frames_in_use = [], False
+        try:
+            async with contextlib.AsyncExitStack() as slots:
+                warm_host = warm_slots.pop(id(camera), None) if warm_slots is not None else None
+                if warm_host is not None:
+                    # Phiên warm-up đã giữ slot của host (đã trừ khỏi semaphore host): trả cả hai khi chụp xong
+                    slots.callback(host_concurrency_limiter.release, warm_host)
+                    slots.callback(host_semaphore.release)
+                    await slots.enter_async_context(semaphore)
+                elif group is None:
+                    # Chờ slot của host trước để camera của một NVR đầy slot không giữ slot chung
+                    await slots.enter_async_context(host_semaphore)
+                    await slots.enter_async_context(semaphore)
+                else:
+                    # Slot đã được giữ cho cả nhóm
+                    slots.push_async_callback(group.leave)
+                frame_start_time = time.time()
+                backend, capture_url = target
+                data, reason = None, "Cannot get frame"
+                sync = camera.get('pair_sync')
+                if sync is not None:
+                    # Camera thuộc một cặp: mở phiên rồi chờ camera còn lại tại barrier trước khi đọc frame
+                    frames, reason = await asyncio.wait_for(
+                        self._offload_capture(sync.capture, camera['rtsp_url'], backend, capture_url,
+                                              self.burst_frames, executor=group.executor if group else None),
+                        timeout=self.camera_deadline
+                    )
+                else:
+                    if warm_host is not None:
+                        # Phiên đã được mở trước tick: chỉ đọc frame mới nhất
+                        frames = await asyncio.wait_for(
+                            self._offload_capture(capture_warmup_pool.take_burst, camera['rtsp_url'],
+                                                  self.burst_frames),
+                            timeout=self.camera_deadline
+                        )
+                    if not frames and (backend.name == "http" or self.burst_frames > 1):
+                        # HTTP snapshot (kết nối keep-alive) hoặc burst nhiều frame trên cùng phiên: chạy trên thread pool
+                        frames, reason = await asyncio.wait_for(
+                            self._offload_capture(backend.grab_burst, capture_url, self.burst_frames),
+                            timeout=self.camera_deadline
+                        )
+                    elif not frames:
+                        data = await asyncio.wait_for(
+                            self._grab_frame_bytes(capture_url, keyframe_only=backend.name == "ffmpeg"),
+                            timeout=self.camera_deadline
+                        )
+                result["frame_time"] = (time.time() - frame_start_time) * 1000
+            captured_at = (sync.captured_at if sync is not None else None) or datetime.now()
+            if not frames and data is None:
+                result["reason"] = reason or "Cannot get frame"
+                return result
+
+            qr_start_time = time.time()
+            burst_stats = None
+            frames_in_use = True
+            try:
+                if frames:
+                    # Các frame của burst được phát hiện song song rồi gộp tâm theo từng QR
+                    detections = await asyncio.wait_for(asyncio.gather(*[
+                        loop.run_in_executor(self._cpu_executor, thread_safe_rtsp_service.detect_qr_codes,
+                                             burst_frame, camera_id)
+                        for burst_frame in frames
+                    ]), timeout=CAMERA_DETECT_DEADLINE_SECONDS)
+                    frame, rois = frames[0], detections[0]
+                    if len(frames) > 1:
+                        rois, burst_stats = aggregate_detections(detections)
+                        result["burst_count"] = len(frames)
+                else:
+                    frame, rois = await asyncio.wait_for(
+                        loop.run_in_executor(self._cpu_executor, self._decode_and_detect, data, camera_id),
+                        timeout=CAMERA_DETECT_DEADLINE_SECONDS
+                    )
+            except asyncio.TimeoutError:
+                result["reason"] = "Detect deadline exceeded"
+                return result
+            finally:
+                result["qr_time"] = (time.time() - qr_start_time) * 1000
+            frames_in_use = False
+            if frame is None:
+                result["reason"] = "Cannot decode frame"
+                return result
+
+            persist_start_time = time.time()
+            # Nguồn dùng chung: ghi measurements cho từng camera, ảnh ROI chỉ lưu một lần
+            member_ids = [member["camera_id"] for member in camera.get('members', [])] or [camera_id]
+            for index, member_id in enumerate(member_ids):
+                await loop.run_in_executor(self._persist_executor, thread_safe_rtsp_service.save_detections_safe,
+                                           frame if index == 0 else None, rois, member_id, scheduled_for, captured_at,
+                                           burst_stats)
+            result["persist_time"] = (time.time() - persist_start_time) * 1000
+
+            result.update({"success": True, "qr_codes": rois, "qr_count": len(rois)})
+            return result
+        except asyncio.TimeoutError:
+            logger.error(f"⏰ Camera {camera_name} vượt quá deadline {self.camera_deadline}s")
+            result["reason"] = "Capture deadline exceeded"
+            return result
+        except asyncio.CancelledError:
+            result["reason"] = "Timeout"
+            raise
+        except Exception as e:
+            logger.error(f"❌ Lỗi khi xử lý Camera {camera_name}: {e}")
+            result["reason"] = str(e)
+            return result
+        finally:
+            if not frames_in_use:
+                frame_pool.release(*frames)
+            result["processing_time"] = (time.time() - start_time) * 1000
+
+    async def _process_group(self, group: List[Dict[str, Any]], targets: Dict[int, Tuple[CaptureBackend, str]],
+                             semaphore: asyncio.Semaphore, host_semaphores: Dict[str, asyncio.Semaphore],
+                             host_of, gate: asyncio.Lock, scheduled_for: Optional[datetime]) -> List[Dict[str, Any]]:
+        """
+        Chụp một nhóm camera đồng bộ như một đơn vị: chờ start_offset chung, giữ đủ slot cho cả nhóm
+        (nhóm cần nhiều phiên trên một host hơn MAX_SESSIONS_PER_HOST thì giữ toàn bộ slot của host đó)
+        rồi chạy các camera cùng lúc.
+        """
+        start_offset = min((camera.get('start_offset') or 0.0) for camera in group)
+        if start_offset > 0:
+            await asyncio.sleep(start_offset)
+        slots = _GroupSlots(len(group))
+        try:
+            # Từng nhóm lấy slot lần lượt để hai nhóm không giữ một phần slot của nhau
+            async with gate:
+                for host, count in Counter(host_of(camera) for camera in group).items():
+                    await slots.acquire(host_semaphores[host], min(count, MAX_SESSIONS_PER_HOST))
+                await slots.acquire(semaphore, min(len(group), self.max_concurrent))
+            return list(await asyncio.gather(*[
+                self._process_camera(dict(camera, start_offset=0.0), targets[id(camera)], semaphore,
+                                     host_semaphores[host_of(camera)], scheduled_for, group=slots)
+                for camera in group
+            ]))
+        finally:
+            slots.release_all()
+
+    async def _run_async(self, cameras: List[Dict[str, Any]],
+                         scheduled_for: Optional[datetime]) -> List[Dict[str, Any]]:
+        semaphore = asyncio.Semaphore(self.max_concurrent)
+        # Backend và URL lấy frame của từng camera (RTSP hoặc HTTP snapshot)
+        targets = {id(camera): resolve_backend(camera) for camera in cameras}
+
+        def host_of(camera):
+            return host_key(targets[id(camera)][1])
+
+        # Camera cùng PairSync được chụp như một đơn vị (một task cho cả nhóm)
+        groups: Dict[int, List[Dict[str, Any]]] = {}
+        for camera in cameras:
+            if camera.get('pair_sync') is not None:
+                groups.setdefault(id(camera['pair_sync']), []).append(camera)
+        # Semaphore của asyncio phục vụ theo thứ tự chờ, nên tạo task xen kẽ theo host
+        singles = interleave_by_host([camera for camera in cameras if camera.get('pair_sync') is None], host_of)
+        # Phiên warm-up đang giữ slot của host: camera dùng phiên nhận slot đó, host chỉ còn phần còn lại
+        # cho camera chụp lạnh (slot được cộng lại khi camera warm-up chụp xong)
+        warm_slots: Dict[int, str] = {}
+        for camera in singles:
+            warm_host = capture_warmup_pool.adopt(camera['rtsp_url'])
+            if warm_host is not None:
+                warm_slots[id(camera)] = warm_host
+        warm_per_host = Counter(host_of(camera) for camera in singles if id(camera) in warm_slots)
+        host_semaphores: Dict[str, asyncio.Semaphore] = {}
+        for camera in cameras:
+            host = host_of(camera)
+            host_semaphores.setdefault(host, asyncio.Semaphore(max(0, MAX_SESSIONS_PER_HOST - warm_per_host[host])))
+        gate = asyncio.Lock()
+        units = [
+            ([camera], asyncio.create_task(self._process_camera(camera, targets[id(camera)], semaphore,
+                                                                host_semaphores[host_of(camera)], scheduled_for,
+                                                                warm_slots=warm_slots)))
+            for camera in singles
+        ] + [
+            (group, asyncio.create_task(self._process_group(group, targets, semaphore, host_semaphores,
+                                                            host_of, gate, scheduled_for)))
+            for group in groups.values()
+        ]
+        tasks = [task for _, task in units]
+        run_window = self.run_window + max((camera.get('start_offset') or 0.0) for camera in cameras)
+        done, pending = await asyncio.wait(tasks, timeout=run_window)
+        for task in pending:
+            task.cancel()
+        if pending:
+            logger.warning(f"⏰ Hết cửa sổ {run_window:.1f}s, huỷ {len(pending)} camera chưa hoàn thành")
+            await asyncio.gather(*pending, return_exceptions=True)
+        # Camera bị huỷ trước khi tới lượt chụp: trả slot warm-up đã nhận
+        for warm_host in warm_slots.values():
+            host_concurrency_limiter.release(warm_host)
+
+        results = []
+        for unit, task in units:
+            if task in done and not task.cancelled() and task.exception() is None:
+                result = task.result()
+                results.extend(result if isinstance(result, list) else [result])
+                continue
+            for camera in unit:
+                results.append({
+                    "success": False,
+                    "camera_name": camera.get('name', 'N/A'),
+                    "camera_id": camera.get('camera_id'),
+                    "reason": "Timeout",
+                    "processing_time": run_window * 1000,
+                    "frame_time": 0,
+                    "qr_time": 0,
+                    "persist_time": 0,
+                })
+        return results
+
+    def run(self, cameras: List[Dict[str, Any]], scheduled_for: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """
+        Xử lý danh sách camera trong một event loop riêng (gọi từ thread của scheduler).
+        Camera có 'start_offset' (giây) bắt đầu sau khoảng trễ đó; scheduled_for là tracking_time của measurements.
+        """
+        valid_cameras = []
+        for camera in cameras:
+            if not camera.get('rtsp_url'):
+                logger.warning(f"Camera '{camera.get('name', 'N/A')}' không có rtsp_url. Bỏ qua.")
+                continue
+            valid_cameras.append(camera)
+        if not valid_cameras:
+            return []
+
+        start_time = time.time()
+        results = asyncio.run(self._run_async(valid_cameras, scheduled_for))
+        self.last_stats = {
+            "engine": "asyncio",
+            "cameras": len(valid_cameras),
+            "max_concurrent": self.max_concurrent,
+            "duration_ms": round((time.time() - start_time) * 1000, 2),
+            "succeeded": sum(1 for result in results if result["success"]),
+            "memory": {"rss_mb": current_rss_mb(), "peak_rss_mb": peak_rss_mb(), "frame_pool": frame_pool.snapshot()},
+            "archive": frame_archive_writer.snapshot(),
+        }
+        logger.info(f"📊 Asyncio orchestrator: {self.last_stats}")
+        return results
+
+
+# Tạo instance global
+async_capture_orchestrator = AsyncCaptureOrchestrator()
@@ -0,0 +1,91 @@
+"""
+Gộp kết quả phát hiện QR của nhiều frame đọc liên tiếp trên cùng một phiên (burst)
+thành một tâm ổn định cho mỗi QR, kèm độ phân tán giữa các frame
+"""
+import math
+from statistics import median
+from typing import Any, Dict, List, Tuple
+
+try:
+    from config.settings import BURST_AGGREGATE, BURST_TRIM_FRACTION, BURST_MATCH_TOLERANCE_PX
+except ImportError:
+    BURST_AGGREGATE = "median"
+    BURST_TRIM_FRACTION = 0.2
+    BURST_MATCH_TOLERANCE_PX = 25
+
+# QR không đọc được nội dung được đặt tên theo thứ tự phát hiện trong frame: f"{UNNAMED_QR_PREFIX}{camera_id}_{index}"
+UNNAMED_QR_PREFIX = "QR_Camera_"
+
+
+def unnamed_qr_name(camera_id: Any, index: int) -> str:
+    return f"{UNNAMED_QR_PREFIX}{camera_id}_{index}"
+
+
+def trimmed_mean(values: List[float], trim_fraction: float) -> float:
+    """Trung bình sau khi bỏ trim_fraction giá trị nhỏ nhất và lớn nhất mỗi phía"""
+    ordered = sorted(values)
+    trim = int(len(ordered) * trim_fraction)
+    kept = ordered[trim:len(ordered) - trim] or ordered
+    return sum(kept) / len(kept)
+
+
+def _match_unnamed(by_name: Dict[str, list], frame_rois: list, tolerance: float):
+    """
+    Ghép QR không tên của một frame vào nhóm có tâm (trung bình) gần nhất trong phạm vi tolerance pixel,
+    mỗi nhóm nhận tối đa một QR mỗi frame; không khớp nhóm nào thì tạo nhóm mới với tên chưa dùng.
+    """
+    used = set()
+    for roi in frame_rois:
+        best, best_distance = None, tolerance
+        for name, samples in by_name.items():
+            if name in used or not name.startswith(UNNAMED_QR_PREFIX):
+                continue
+            center_x = sum(sample[3] for sample in samples) / len(samples)
+            center_y = sum(sample[4] for sample in samples) / len(samples)
+            distance = math.hypot(roi[3] - center_x, roi[4] - center_y)
+            if distance <= best_distance:
+                best, best_distance = name, distance
+        if best is None:
+            best = roi[1]
+            prefix, index = best.rsplit("_", 1)[0], 0
+            while best in by_name:
+                best = f"{prefix}_{index}"
+                index += 1
+            by_name[best] = []
+        by_name[best].append(roi)
+        used.add(best)
+
+
+def aggregate_detections(detections: List[list], method: str = BURST_AGGREGATE,
+                         trim_fraction: float = BURST_TRIM_FRACTION,
+                         tolerance: float = BURST_MATCH_TOLERANCE_PX) -> Tuple[list, Dict[str, Dict[str, Any]]]:
+    """
+    detections: danh sách rois (rect, name, roi_width, center_x, center_y) của từng frame.
+    QR được ghép giữa các frame theo name; QR không đọc được nội dung (tên theo thứ tự phát hiện,
+    có thể khác nhau giữa các frame) được ghép theo tâm gần nhất trong phạm vi tolerance pixel.
+    Tâm gộp = median (mặc định) hoặc trimmed mean theo từng trục;
+    dispersion = RMS khoảng cách (pixel) từ tâm của từng frame tới tâm gộp.
+    Rect/roi_width lấy từ frame có tâm gần tâm gộp nhất.
+
+    Returns: (rois cùng format với detect_qr_codes, {name: {"sample_count", "dispersion"}})
+    """
+    by_name: Dict[str, list] = {}
+    for rois in detections:
+        for roi in rois:
+            if not roi[1].startswith(UNNAMED_QR_PREFIX):
+                by_name.setdefault(roi[1], []).append(roi)
+        _match_unnamed(by_name, [roi for roi in rois if roi[1].startswith(UNNAMED_QR_PREFIX)], tolerance)
+
+    center_of = median if method == "median" else (lambda values: trimmed_mean(values, trim_fraction))
+    aggregated, stats = [], {}
+    for name, samples in by_name.items():
+        center_x = center_of([roi[3] for roi in samples])
+        center_y = center_of([roi[4] for roi in samples])
+        distances = [math.hypot(roi[3] - center_x, roi[4] - center_y) for roi in samples]
+        nearest = samples[distances.index(min(distances))]
+        aggregated.append((nearest[0], name, nearest[2], round(center_x), round(center_y)))
+        stats[name] = {
+            "sample_count": len(samples),
+            "dispersion": round(math.sqrt(sum(d * d for d in distances) / len(distances)), 3),
+        }
+    return aggregated, stats
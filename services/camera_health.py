@@ -0,0 +1,227 @@
+"""
+Theo dõi tình trạng từng camera và circuit breaker: camera lỗi liên tiếp bị tạm bỏ qua
+với backoff tăng dần, trong thời gian đó chỉ được kiểm tra bằng probe TCP rẻ.
+Circuit nằm trong bộ nhớ của node chụp camera; snapshot được ghi vào bảng camera_health
+sau mỗi lượt chạy để API đọc được tình trạng của toàn cluster.
+"""
+import logging
+import socket
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Deque, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from services.thread_safe_db_service import thread_safe_db_service
+from services.capture_backends import resolve_backend
+from services.cluster_membership import cluster_membership
+
+try:
+    from config.settings import (HEALTH_FAILURE_THRESHOLD, HEALTH_BACKOFF_BASE_SECONDS, HEALTH_BACKOFF_MAX_SECONDS,
+                                 HEALTH_PROBE_TIMEOUT_SECONDS, HEALTH_HISTORY_SIZE)
+except ImportError:
+    HEALTH_FAILURE_THRESHOLD = 3
+    HEALTH_BACKOFF_BASE_SECONDS = 60
+    HEALTH_BACKOFF_MAX_SECONDS = 3600
+    HEALTH_PROBE_TIMEOUT_SECONDS = 2
+    HEALTH_HISTORY_SIZE = 20
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+_DEFAULT_PORTS = {"rtsp": 554, "rtsps": 322, "http": 80, "https": 443}
+
+
+class CameraHealth:
+    def __init__(self, camera_id: Any, camera_name: str, history_size: int):
+        self.camera_id = camera_id
+        self.camera_name = camera_name
+        self.state = CLOSED
+        self.history: Deque[Tuple[bool, float]] = deque(maxlen=history_size)  # (thành công, độ trễ ms)
+        self.consecutive_failures = 0
+        self.open_count = 0
+        self.open_until = 0.0
+        self.last_reason: Optional[str] = None
+        self.last_success_at: Optional[datetime] = None
+        self.last_failure_at: Optional[datetime] = None
+        self.probes = 0
+
+    def snapshot(self) -> Dict[str, Any]:
+        successes = [latency for ok, latency in self.history if ok]
+        return {
+            "camera_id": self.camera_id,
+            "camera_name": self.camera_name,
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "success_rate": round(len(successes) / len(self.history), 3) if self.history else None,
+            "avg_latency_ms": round(sum(successes) / len(successes), 2) if successes else None,
+            "recent_attempts": len(self.history),
+            "last_reason": self.last_reason,
+            "last_success_at": self.last_success_at,
+            "last_failure_at": self.last_failure_at,
+            "retry_after_seconds": round(max(0.0, self.open_until - time.time()), 1) if self.state == OPEN else 0,
+            "open_until": datetime.fromtimestamp(self.open_until) if self.state == OPEN else None,
+            "probes": self.probes,
+        }
+
+
+class CameraHealthRegistry:
+    """
+    - closed: camera được capture bình thường
+    - open: lỗi liên tiếp >= HEALTH_FAILURE_THRESHOLD, bị bỏ qua tới open_until;
+      backoff = base * 2^(số lần mở liên tiếp - 1), tối đa HEALTH_BACKOFF_MAX_SECONDS
+    - half_open: hết backoff, probe TCP tới host lấy frame (RTSP hoặc HTTP snapshot) thành công -> thử capture đầy đủ một lần;
+      thành công thì đóng circuit, thất bại thì mở lại với backoff dài hơn
+    """
+
+    def __init__(self, failure_threshold: int = HEALTH_FAILURE_THRESHOLD,
+                 backoff_base: float = HEALTH_BACKOFF_BASE_SECONDS,
+                 backoff_max: float = HEALTH_BACKOFF_MAX_SECONDS,
+                 probe_timeout: float = HEALTH_PROBE_TIMEOUT_SECONDS,
+                 history_size: int = HEALTH_HISTORY_SIZE):
+        self.failure_threshold = failure_threshold
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.probe_timeout = probe_timeout
+        self.history_size = history_size
+        self._lock = threading.Lock()
+        self._cameras: Dict[Any, CameraHealth] = {}
+        self._probe_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="HealthProbe")
+
+    def _get(self, camera: Dict[str, Any]) -> CameraHealth:
+        camera_id = camera.get('camera_id')
+        health = self._cameras.get(camera_id)
+        if health is None:
+            health = CameraHealth(camera_id, camera.get('name', 'N/A'), self.history_size)
+            self._cameras[camera_id] = health
+        return health
+
+    def probe(self, url: str) -> bool:
+        """Probe rẻ: chỉ mở kết nối TCP tới host:port của URL lấy frame, không handshake RTSP/giải mã"""
+        try:
+            parts = urlsplit(url)
+            port = parts.port or _DEFAULT_PORTS.get(parts.scheme, 554)
+            with socket.create_connection((parts.hostname, port), timeout=self.probe_timeout):
+                return True
+        except (OSError, ValueError):
+            return False
+
+    def filter(self, cameras: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """
+        Tách camera cần capture và camera bị bỏ qua (circuit đang mở).
+        Camera hết backoff được probe song song; probe lỗi thì kéo dài backoff.
+        """
+        now = time.time()
+        allowed, skipped, due = [], [], []
+        with self._lock:
+            for camera in cameras:
+                health = self._get(camera)
+                if health.state == CLOSED:
+                    allowed.append(camera)
+                elif now >= health.open_until:
+                    due.append((camera, health))
+                else:
+                    skipped.append(camera)
+
+        # Probe đúng URL mà backend sẽ dùng để capture (HTTP snapshot có thể ở host/port khác rtsp_url)
+        probe_results = list(self._probe_executor.map(lambda item: self.probe(resolve_backend(item[0])[1] or ''), due))
+        with self._lock:
+            for (camera, health), reachable in zip(due, probe_results):
+                health.probes += 1
+                if reachable:
+                    health.state = HALF_OPEN
+                    allowed.append(camera)
+                    logger.info(f"🩺 Camera {health.camera_name}: probe OK, thử capture lại (half-open)")
+                else:
+                    self._open(health, "Probe failed")
+                    skipped.append(camera)
+        return allowed, skipped
+
+    def _open(self, health: CameraHealth, reason: str):
+        health.open_count += 1
+        backoff = min(self.backoff_max, self.backoff_base * (2 ** (health.open_count - 1)))
+        health.state = OPEN
+        health.open_until = time.time() + backoff
+        health.last_reason = reason
+        logger.warning(f"🚫 Camera {health.camera_name}: circuit mở, bỏ qua trong {backoff:.0f}s ({reason})")
+
+    def record(self, results: List[Dict[str, Any]]):
+        """Cập nhật tình trạng camera từ kết quả của capture engine"""
+        with self._lock:
+            for result in results:
+                health = self._get(result)
+                health.camera_name = result.get("camera_name", health.camera_name)
+                if result.get("success"):
+                    if health.state != CLOSED:
+                        logger.info(f"✅ Camera {health.camera_name}: hoạt động lại, đóng circuit")
+                    health.history.append((True, result.get("frame_time") or 0.0))
+                    health.state = CLOSED
+                    health.consecutive_failures = 0
+                    health.open_count = 0
+                    health.last_reason = None
+                    health.last_success_at = datetime.now()
+                    continue
+
+                health.history.append((False, result.get("processing_time") or 0.0))
+                health.consecutive_failures += 1
+                health.last_reason = result.get("reason")
+                health.last_failure_at = datetime.now()
+                if health.state == HALF_OPEN or health.consecutive_failures >= self.failure_threshold:
+                    self._open(health, health.last_reason or "Unknown error")
+
+    def run(self, engine, cameras: List[Dict[str, Any]], scheduled_for: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """Chạy capture engine chỉ với camera có circuit đóng/half-open, camera bị bỏ qua có kết quả riêng"""
+        allowed, skipped = self.filter(cameras)
+        if skipped:
+            logger.info(f"🚫 Bỏ qua {len(skipped)} camera đang mở circuit")
+        results = engine.run(allowed, scheduled_for) if allowed else []
+        self.record(results)
+        self.persist(cameras)
+        for camera in skipped:
+            results.append({
+                "success": False,
+                "camera_name": camera.get('name', 'N/A'),
+                "camera_id": camera.get('camera_id'),
+                "reason": "Circuit open",
+                "skipped": True,
+                "processing_time": 0,
+                "frame_time": 0,
+                "qr_time": 0,
+                "persist_time": 0,
+            })
+        return results
+
+    def persist(self, cameras: List[Dict[str, Any]]):
+        """Ghi tình trạng các camera vừa chạy vào bảng camera_health (lỗi database chỉ được log)"""
+        camera_ids = {camera.get('camera_id') for camera in cameras}
+        with self._lock:
+            items = [health.snapshot() for camera_id, health in self._cameras.items()
+                     if camera_id is not None and camera_id in camera_ids]
+        if not thread_safe_db_service.save_camera_health_safe(cluster_membership.node_id, items):
+            logger.warning("⚠️ Không ghi được camera_health, API sẽ thấy tình trạng cũ")
+
+    def snapshot(self, state: Optional[str] = None) -> List[Dict[str, Any]]:
+        with self._lock:
+            items = [health.snapshot() for health in self._cameras.values()]
+        if state is not None:
+            items = [item for item in items if item["state"] == state]
+        return sorted(items, key=lambda item: (item["camera_id"] is None, item["camera_id"] or 0))
+
+    def is_open(self, camera_id: Any) -> bool:
+        """Camera đang trong backoff (chưa tới lúc probe lại)"""
+        with self._lock:
+            health = self._cameras.get(camera_id)
+            return health is not None and health.state == OPEN and time.time() < health.open_until
+
+    def open_count(self) -> int:
+        with self._lock:
+            return sum(1 for health in self._cameras.values() if health.state == OPEN)
+
+
+# Tạo instance global
+camera_health_registry = CameraHealthRegistry()
@@ -0,0 +1,349 @@
+"""
+Hàng đợi job capture bền vững trên bảng capture_jobs: scheduler tạo một job cho mỗi
+(run, camera), các worker claim job bằng lease và retry với backoff trong cửa sổ của lịch chụp
+"""
+import logging
+import threading
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from services.thread_safe_db_service import thread_safe_db_service
+from services.cluster_membership import cluster_membership
+from services.camera_health import camera_health_registry
+from services.stream_dedup import DedupedEngine
+from services.paired_capture import PairedCaptureEngine
+
+try:
+    from config.settings import (CAPTURE_QUEUE_POLL_SECONDS, CAPTURE_QUEUE_BATCH_SIZE, CAPTURE_QUEUE_LEASE_SECONDS,
+                                 CAPTURE_QUEUE_MAX_ATTEMPTS, CAPTURE_QUEUE_RETRY_BASE_SECONDS,
+                                 CAPTURE_QUEUE_WINDOW_SECONDS)
+except ImportError:
+    CAPTURE_QUEUE_POLL_SECONDS = 1.0
+    CAPTURE_QUEUE_BATCH_SIZE = 16
+    CAPTURE_QUEUE_LEASE_SECONDS = 60
+    CAPTURE_QUEUE_MAX_ATTEMPTS = 3
+    CAPTURE_QUEUE_RETRY_BASE_SECONDS = 5
+    CAPTURE_QUEUE_WINDOW_SECONDS = 120
+
+logger = logging.getLogger(__name__)
+
+
+class CaptureJobQueue:
+    """
+    - enqueue: INSERT IGNORE một job cho mỗi camera, available_at = bây giờ + start_offset
+      (độ lệch đã rải trong cửa sổ), deadline_at = bây giờ + cửa sổ của lịch chụp
+    - claim: SELECT ... FOR UPDATE SKIP LOCKED nên nhiều worker lấy các job khác nhau;
+      job 'leased' hết lease (worker chết giữa chừng) được claim lại
+    - camera cùng cặp (camera_pairs): các job có chung available_at và pair_leader_id, chỉ job
+      của camera leader được claim trực tiếp và kéo theo cả nhóm vào cùng một worker để chụp đồng bộ;
+      job thành viên chỉ được claim riêng (retry) khi job leader đã kết thúc
+    - thất bại: retry với backoff nếu còn lượt thử và còn trong cửa sổ, ngược lại đánh dấu 'failed'
+    Mọi mốc thời gian dùng NOW(6) của database để các worker trên nhiều máy so sánh cùng một đồng hồ.
+    """
+
+    def __init__(self, batch_size: int = CAPTURE_QUEUE_BATCH_SIZE,
+                 lease_seconds: int = CAPTURE_QUEUE_LEASE_SECONDS,
+                 max_attempts: int = CAPTURE_QUEUE_MAX_ATTEMPTS,
+                 retry_base_seconds: float = CAPTURE_QUEUE_RETRY_BASE_SECONDS,
+                 window_seconds: int = CAPTURE_QUEUE_WINDOW_SECONDS,
+                 poll_seconds: float = CAPTURE_QUEUE_POLL_SECONDS):
+        self.batch_size = batch_size
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.retry_base_seconds = retry_base_seconds
+        self.window_seconds = window_seconds
+        self.poll_seconds = poll_seconds
+        self.worker_id = cluster_membership.node_id
+        self._stop_event = threading.Event()
+        self._consumer: Optional[threading.Thread] = None
+        self._stats_lock = threading.Lock()
+        self.local_stats = {"claimed": 0, "done": 0, "retried": 0, "failed": 0, "lost_lease": 0}
+
+    # ==================== PRODUCER ====================
+
+    def enqueue(self, run_id: str, scheduled_for: Optional[datetime], cameras: List[Dict[str, Any]],
+                groups: Optional[Dict[Any, str]] = None) -> int:
+        """
+        Tạo job cho các camera của một lượt chạy, trả về số job mới.
+        groups: {camera_id: group_key} của các camera cùng cặp (pair_groups)
+        """
+        scheduled_for = scheduled_for or datetime.now().replace(microsecond=0)
+        cameras = [camera for camera in cameras if camera.get('camera_id') is not None]
+        members: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        for camera in cameras:
+            if groups and camera['camera_id'] in groups:
+                members[groups[camera['camera_id']]].append(camera)
+
+        # Cả nhóm dùng chung start_offset nhỏ nhất và leader là camera_id nhỏ nhất trong nhóm
+        leader_of: Dict[Any, Any] = {}
+        offset_of: Dict[Any, float] = {}
+        for group in members.values():
+            if len(group) < 2:
+                continue
+            leader_id = min(camera['camera_id'] for camera in group)
+            start_offset = min(camera.get('start_offset') or 0.0 for camera in group)
+            for camera in group:
+                leader_of[camera['camera_id']] = leader_id
+                offset_of[camera['camera_id']] = start_offset
+
+        rows = [
+            (run_id, camera['camera_id'], leader_of.get(camera['camera_id']), scheduled_for,
+             int(offset_of.get(camera['camera_id'], camera.get('start_offset') or 0.0) * 1_000_000),
+             self.window_seconds)
+            for camera in cameras
+        ]
+        if not rows:
+            return 0
+        with thread_safe_db_service.get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                query = """
+                INSERT IGNORE INTO capture_jobs (run_id, camera_id, pair_leader_id, scheduled_for, status,
+                                                 available_at, deadline_at, created_at)
+                VALUES (%s, %s, %s, %s, 'pending', NOW(6) + INTERVAL %s MICROSECOND,
+                        NOW(6) + INTERVAL %s SECOND, NOW(6))
+                """
+                inserted = cursor.executemany(query, rows)
+                conn.commit()
+        logger.info(f"📥 [run {run_id}] Đã tạo {inserted} job capture")
+        return inserted
+
+    # ==================== CONSUMER ====================
+
+    def claim(self) -> List[Dict[str, Any]]:
+        """
+        Claim tối đa batch_size job đã tới hạn (cộng các job cùng nhóm cặp của job leader);
+        job đã quá deadline được đánh dấu failed
+        """
+        with thread_safe_db_service.get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                SELECT j.job_id, j.run_id, j.camera_id, j.pair_leader_id, j.scheduled_for, j.attempts,
+                       j.deadline_at < NOW(6) AS expired
+                FROM capture_jobs j
+                LEFT JOIN capture_jobs leader
+                       ON leader.run_id = j.run_id AND leader.camera_id = j.pair_leader_id
+                WHERE ((j.status = 'pending' AND j.available_at <= NOW(6))
+                    OR (j.status = 'leased' AND j.lease_expires_at < NOW(6)))
+                  AND (j.pair_leader_id IS NULL OR j.pair_leader_id = j.camera_id
+                       OR leader.job_id IS NULL OR leader.status IN ('done', 'failed'))
+                ORDER BY j.available_at
+                LIMIT %s
+                FOR UPDATE OF j SKIP LOCKED
+                """, (self.batch_size,))
+                rows = list(cursor.fetchall())
+                if not rows:
+                    conn.commit()
+                    return []
+
+                # Job leader kéo theo các job còn lại của nhóm (kể cả job đang chờ backoff)
+                leaders = [(row['run_id'], row['camera_id']) for row in rows
+                           if row['pair_leader_id'] == row['camera_id'] and not row['expired']]
+                if leaders:
+                    placeholders = ", ".join(["(%s, %s)"] * len(leaders))
+                    cursor.execute(f"""
+                    SELECT job_id, run_id, camera_id, pair_leader_id, scheduled_for, attempts,
+                           deadline_at < NOW(6) AS expired
+                    FROM capture_jobs
+                    WHERE (run_id, pair_leader_id) IN ({placeholders}) AND camera_id <> pair_leader_id
+                      AND (status = 'pending' OR (status = 'leased' AND lease_expires_at < NOW(6)))
+                    FOR UPDATE
+                    """, [value for leader in leaders for value in leader])
+                    rows.extend(cursor.fetchall())
+
+                expired_ids = [row['job_id'] for row in rows if row['expired']]
+                jobs = [row for row in rows if not row['expired']]
+                if expired_ids:
+                    placeholders = ", ".join(["%s"] * len(expired_ids))
+                    cursor.execute(f"""
+                    UPDATE capture_jobs
+                    SET status = 'failed', finished_at = NOW(6), last_error = 'Schedule window exceeded',
+                        lease_owner = NULL, lease_expires_at = NULL
+                    WHERE job_id IN ({placeholders})
+                    """, expired_ids)
+                    self._count("failed", len(expired_ids))
+                    logger.warning(f"⌛ {len(expired_ids)} job đã hết cửa sổ lịch chụp, đánh dấu failed")
+
+                if jobs:
+                    job_ids = [job['job_id'] for job in jobs]
+                    placeholders = ", ".join(["%s"] * len(job_ids))
+                    cursor.execute(f"""
+                    UPDATE capture_jobs
+                    SET status = 'leased', lease_owner = %s, attempts = attempts + 1,
+                        lease_expires_at = NOW(6) + INTERVAL %s SECOND
+                    WHERE job_id IN ({placeholders})
+                    """, [self.worker_id, self.lease_seconds] + job_ids)
+
+                    camera_ids = sorted({job['camera_id'] for job in jobs})
+                    placeholders = ", ".join(["%s"] * len(camera_ids))
+                    cursor.execute(f"""
+                    SELECT camera_id, name, rtsp_url, capture_backend, snapshot_url
+                    FROM cameras WHERE camera_id IN ({placeholders})
+                    """, camera_ids)
+                    cameras = {camera['camera_id']: camera for camera in cursor.fetchall()}
+                    for job in jobs:
+                        job['attempts'] += 1
+                        job['camera'] = cameras.get(job['camera_id'])
+                conn.commit()
+
+        self._count("claimed", len(jobs))
+        return jobs
+
+    def _lost_lease(self, job: Dict[str, Any], outcome: str):
+        """Lease đã hết và job đã được worker khác claim lại: kết quả của lần chạy này bị bỏ"""
+        self._count("lost_lease")
+        logger.warning(f"⏳ Job {job['job_id']} (camera {job['camera_id']}) đã mất lease, "
+                       f"không ghi kết quả '{outcome}'")
+
+    def complete(self, job: Dict[str, Any]) -> bool:
+        """Đánh dấu job done; False nếu đã mất lease"""
+        with thread_safe_db_service.get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                # Chỉ cập nhật khi vẫn giữ lease (job chưa bị worker khác claim lại)
+                cursor.execute("""
+                UPDATE capture_jobs
+                SET status = 'done', finished_at = NOW(6), lease_owner = NULL, lease_expires_at = NULL
+                WHERE job_id = %s AND lease_owner = %s
+                """, (job['job_id'], self.worker_id))
+                updated = cursor.rowcount
+                conn.commit()
+        if not updated:
+            self._lost_lease(job, "done")
+            return False
+        self._count("done")
+        return True
+
+    def fail(self, job: Dict[str, Any], reason: str, retry: bool = True) -> bool:
+        """Retry với backoff nếu còn lượt thử và còn trong cửa sổ, ngược lại đánh dấu failed; False nếu đã mất lease"""
+        max_attempts = self.max_attempts if retry else 0
+        backoff = int(round(self.retry_base_seconds * (2 ** (job['attempts'] - 1))))
+        with thread_safe_db_service.get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                # MySQL gán SET từ trái sang phải, các cột sau thấy giá trị status mới
+                cursor.execute("""
+                UPDATE capture_jobs
+                SET status = IF(attempts < %s AND NOW(6) + INTERVAL %s SECOND < deadline_at, 'pending', 'failed'),
+                    available_at = NOW(6) + INTERVAL %s SECOND,
+                    finished_at = IF(status = 'failed', NOW(6), NULL),
+                    last_error = %s, lease_owner = NULL, lease_expires_at = NULL
+                WHERE job_id = %s AND lease_owner = %s
+                """, (max_attempts, backoff, backoff, (reason or "Unknown error")[:255],
+                      job['job_id'], self.worker_id))
+                updated = cursor.rowcount
+                status = None
+                if updated:
+                    # Trạng thái database thực sự ghi (job hết cửa sổ deadline thì failed dù còn lượt thử)
+                    cursor.execute("SELECT status FROM capture_jobs WHERE job_id = %s", (job['job_id'],))
+                    row = cursor.fetchone()
+                    status = row['status'] if row else None
+                conn.commit()
+        if not updated:
+            self._lost_lease(job, "failed")
+            return False
+        will_retry = status == 'pending'
+        self._count("retried" if will_retry else "failed")
+        logger.warning(f"🔁 Job {job['job_id']} (camera {job['camera_id']}, lần {job['attempts']}) thất bại: {reason}"
+                       + (f" - retry sau {backoff:.0f}s nếu còn trong cửa sổ" if will_retry else " - hết lượt thử"))
+        return True
+
+    def process(self, jobs: List[Dict[str, Any]], engine):
+        """Chạy các job đã claim qua capture engine, gom theo thời điểm lịch chụp"""
+        groups: Dict[datetime, List[Dict[str, Any]]] = defaultdict(list)
+        for job in jobs:
+            if job['camera'] is None or not job['camera'].get('rtsp_url'):
+                # Lỗi cấu hình, retry không có ích
+                self.fail(job, "Camera not found or no RTSP URL", retry=False)
+                continue
+            groups[job['scheduled_for']].append(job)
+
+        for scheduled_for, group in groups.items():
+            # Độ lệch đã được áp dụng qua available_at, engine không cần chờ thêm
+            cameras = [dict(job['camera'], start_offset=0.0) for job in group]
+            pairs = {job['camera_id']: f"pair:{job['pair_leader_id']}"
+                     for job in group if job.get('pair_leader_id') is not None}
+            paired_engine = DedupedEngine(PairedCaptureEngine(engine, pairs), pairs)
+            results = {result['camera_id']: result
+                       for result in camera_health_registry.run(paired_engine, cameras, scheduled_for)}
+            for job in group:
+                result = results.get(job['camera_id'])
+                if result is None:
+                    self.fail(job, "No result")
+                elif result['success']:
+                    self.complete(job)
+                else:
+                    # Camera đang mở circuit: không retry trong cửa sổ này
+                    self.fail(job, result.get('reason'), retry=not result.get('skipped'))
+
+    def _consume(self, engine_provider: Callable[[], Any]):
+        while not self._stop_event.is_set():
+            try:
+                jobs = self.claim()
+                if not jobs:
+                    self._stop_event.wait(self.poll_seconds)
+                    continue
+                self.process(jobs, engine_provider())
+            except Exception as e:
+                logger.error(f"❌ Lỗi khi xử lý hàng đợi capture: {e}")
+                self._stop_event.wait(self.poll_seconds)
+
+    def start_consumer(self, engine_provider: Callable[[], Any]):
+        if self._consumer is not None and self._consumer.is_alive():
+            return
+        self._stop_event.clear()
+        self._consumer = threading.Thread(target=self._consume, args=(engine_provider,),
+                                          name="CaptureQueueConsumer", daemon=True)
+        self._consumer.start()
+        logger.info(f"📤 Worker {self.worker_id} bắt đầu nhận job từ capture_jobs")
+
+    def stop_consumer(self, timeout: Optional[float] = None):
+        self._stop_event.set()
+        if self._consumer is not None:
+            self._consumer.join(timeout=timeout)
+            self._consumer = None
+
+    # ==================== STATS ====================
+
+    def _count(self, key: str, amount: int = 1):
+        with self._stats_lock:
+            self.local_stats[key] += amount
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Thống kê hàng đợi: số job theo trạng thái (24h), throughput và retry (5 phút), queue lag"""
+        with thread_safe_db_service.get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                SELECT status, COUNT(*) AS count FROM capture_jobs
+                WHERE created_at >= NOW(6) - INTERVAL 1 DAY
+                GROUP BY status
+                """)
+                by_status = {row['status']: row['count'] for row in cursor.fetchall()}
+
+                cursor.execute("""
+                SELECT COUNT(*) AS finished, COALESCE(SUM(status = 'done'), 0) AS done,
+                       COALESCE(SUM(attempts > 1), 0) AS retried
+                FROM capture_jobs
+                WHERE finished_at >= NOW(6) - INTERVAL 5 MINUTE
+                """)
+                recent = cursor.fetchone()
+
+                cursor.execute("""
+                SELECT COUNT(*) AS ready,
+                       TIMESTAMPDIFF(MICROSECOND, MIN(available_at), NOW(6)) / 1000 AS lag_ms
+                FROM capture_jobs
+                WHERE status = 'pending' AND available_at <= NOW(6)
+                """)
+                backlog = cursor.fetchone()
+
+        return {
+            "jobs_by_status_24h": by_status,
+            "done_per_minute": round(int(recent['done']) / 5, 2),
+            "finished_5m": int(recent['finished']),
+            "retried_5m": int(recent['retried']),
+            "ready_jobs": int(backlog['ready']),
+            "queue_lag_ms": float(backlog['lag_ms']) if backlog['lag_ms'] is not None else 0.0,
+            "worker": {"worker_id": self.worker_id, **self.local_stats},
+        }
+
+
+# Tạo instance global
+capture_job_queue = CaptureJobQueue()
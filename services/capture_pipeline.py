@@ -0,0 +1,513 @@
+"""
+Pipeline xử lý camera theo 3 stage (capture -> detect -> persist) với bounded queue giữa các stage
+"""
+import logging
+import queue
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError, wait as wait_futures
+from typing import Any, Dict, List, Optional
+
+from services.thread_safe_rtsp_service import thread_safe_rtsp_service
+from services.capture_watchdog import capture_watchdog
+from services.capture_warmup import capture_warmup_pool
+from services.capture_backends import resolve_backend
+from services.burst_sampling import aggregate_detections
+from services.worker_pool_sizer import CpuSampler, worker_pool_sizer
+from services.host_limiter import host_concurrency_limiter, host_key, interleave_by_host
+from services.frame_pool import current_rss_mb, frame_pool, peak_rss_mb
+from services.frame_archive import frame_archive_writer
+
+try:
+    from config.settings import (CAPTURE_STAGE_WORKERS, DETECT_STAGE_WORKERS, PERSIST_STAGE_WORKERS,
+                                 PIPELINE_QUEUE_SIZE, TIMEOUT_SECONDS, CAPTURE_ISOLATION,
+                                 CAMERA_DETECT_DEADLINE_SECONDS, DETECT_WORKERS_MAX, BURST_FRAMES)
+except ImportError:
+    CAPTURE_STAGE_WORKERS = 4
+    DETECT_STAGE_WORKERS = 2
+    PERSIST_STAGE_WORKERS = 2
+    PIPELINE_QUEUE_SIZE = 4
+    TIMEOUT_SECONDS = 30
+    CAPTURE_ISOLATION = True
+    CAMERA_DETECT_DEADLINE_SECONDS = 10
+    DETECT_WORKERS_MAX = 4
+    BURST_FRAMES = 1
+
+logger = logging.getLogger(__name__)
+
+# Đánh dấu kết thúc cho worker của stage tiếp theo
+_STOP = object()
+
+
+class StageStats:
+    """Thống kê của một stage trong một lần chạy: số item, độ trễ xử lý, thời gian chờ queue, RSS lớn nhất"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self.processed = 0
+        self.failed = 0
+        self.total_latency_ms = 0.0
+        self.max_latency_ms = 0.0
+        self.total_wait_ms = 0.0
+        self.max_queue_depth = 0
+        self.max_rss_mb: Optional[float] = None
+
+    def record(self, latency_ms: float, wait_ms: float, success: bool = True):
+        with self._lock:
+            self.processed += 1
+            if not success:
+                self.failed += 1
+            self.total_latency_ms += latency_ms
+            self.max_latency_ms = max(self.max_latency_ms, latency_ms)
+            self.total_wait_ms += wait_ms
+
+    def observe_queue_depth(self, depth: int):
+        with self._lock:
+            self.max_queue_depth = max(self.max_queue_depth, depth)
+
+    def observe_rss(self, rss_mb: Optional[float]):
+        if rss_mb is None:
+            return
+        with self._lock:
+            self.max_rss_mb = max(self.max_rss_mb or 0.0, rss_mb)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            processed = self.processed or 1
+            return {
+                "stage": self.name,
+                "processed": self.processed,
+                "failed": self.failed,
+                "avg_latency_ms": round(self.total_latency_ms / processed, 2),
+                "max_latency_ms": round(self.max_latency_ms, 2),
+                "avg_queue_wait_ms": round(self.total_wait_ms / processed, 2),
+                "max_queue_depth": self.max_queue_depth,
+                "max_rss_mb": self.max_rss_mb,
+            }
+
+
+class CapturePipeline:
+    """
+    Tách xử lý camera thành 3 stage, mỗi stage có số worker riêng:
+    - capture: mở RTSP và đọc frame (chờ mạng)
+    - detect: phát hiện QR trên frame (CPU)
+    - persist: ghi qr_codes/measurements và lưu ảnh (database/disk)
+    Queue giữa các stage có giới hạn, nên khi detect chậm thì capture bị chặn lại
+    (backpressure) thay vì giữ quá nhiều frame trong bộ nhớ.
+    """
+
+    def __init__(self, capture_workers: int = CAPTURE_STAGE_WORKERS,
+                 detect_workers: int = DETECT_STAGE_WORKERS,
+                 persist_workers: int = PERSIST_STAGE_WORKERS,
+                 queue_size: int = PIPELINE_QUEUE_SIZE,
+                 timeout_seconds: float = TIMEOUT_SECONDS,
+                 isolate_capture: bool = CAPTURE_ISOLATION,
+                 detect_deadline: float = CAMERA_DETECT_DEADLINE_SECONDS):
+        self.capture_workers = capture_workers
+        self.detect_workers = detect_workers
+        self.persist_workers = persist_workers
+        self.queue_size = queue_size
+        self.timeout_seconds = timeout_seconds
+        self.isolate_capture = isolate_capture
+        self.detect_deadline = detect_deadline
+        # Phát hiện QR chạy trên executor để detect worker có thể bỏ qua frame quá deadline
+        # (thread được tạo khi cần, nên giới hạn theo số detect worker tối đa khi tự điều chỉnh)
+        self._detect_executor = ThreadPoolExecutor(max_workers=max(detect_workers, DETECT_WORKERS_MAX) * 2,
+                                                   thread_name_prefix="DetectTask")
+        self.last_stats: Dict[str, Any] = {}
+
+    # ==================== STAGE HANDLERS ====================
+
+    def _grab(self, job: Dict[str, Any], count: int):
+        # Phiên đã được mở trước tick (warm-up): chỉ đọc frame mới nhất
+        frames = capture_warmup_pool.take_burst(job["rtsp_url"], count)
+        if frames:
+            return frames, None
+        if job["backend"].name != "opencv":
+            # ffmpeg/HTTP snapshot đã có timeout riêng, không cần process watchdog
+            return job["backend"].grab_burst(job["capture_url"], count)
+        if self.isolate_capture:
+            # Process riêng với deadline kết nối/đọc frame, bị kill nếu treo
+            return capture_watchdog.grab_burst(job["capture_url"], count)
+        if count > 1:
+            return job["backend"].grab_burst(job["capture_url"], count)
+        frame = thread_safe_rtsp_service.get_frame_from_rtsp(job["capture_url"])
+        return ([frame] if frame is not None else []), "Cannot get frame"
+
+    @staticmethod
+    def _adopt_warm_slot(job: Dict[str, Any]) -> bool:
+        """Nhận slot host của phiên warm-up cho job (được trả trong _capture như slot thường)"""
+        host = capture_warmup_pool.adopt(job["rtsp_url"])
+        if host is None:
+            return False
+        job["host"] = host
+        return True
+
+    def _capture(self, job: Dict[str, Any]) -> bool:
+        frame_start_time = time.time()
+        count = job["burst"]
+        sync = job.get("pair_sync")
+        try:
+            if sync is not None:
+                # Camera thuộc một cặp: mở phiên rồi chờ camera còn lại tại barrier trước khi đọc frame
+                # (không qua process watchdog vì barrier chỉ đồng bộ được giữa các thread)
+                frames, reason = sync.capture(job["rtsp_url"], job["backend"], job["capture_url"], count)
+            else:
+                frames, reason = self._grab(job, count)
+        finally:
+            # Trả slot của host (đã được giữ khi điều phối job vào stage capture)
+            host_concurrency_limiter.release(job["host"])
+        job["frame_time"] = (time.time() - frame_start_time) * 1000
+        job["captured_at"] = (sync.captured_at if sync is not None else None) or datetime.now()
+        if not frames:
+            job["reason"] = reason
+            return False
+        if len(frames) < count:
+            logger.warning(f"📸 Camera {job['camera_name']}: burst chỉ đọc được {len(frames)}/{count} frame ({reason})")
+        job["frame"] = frames[0]
+        if count > 1:
+            job["burst_frames"] = frames
+        return True
+
+    def _detect(self, job: Dict[str, Any]) -> bool:
+        qr_start_time = time.time()
+        if "burst_frames" in job:
+            return self._detect_burst(job, qr_start_time)
+        future = self._detect_executor.submit(thread_safe_rtsp_service.detect_qr_codes,
+                                              job["frame"], job["camera_id"])
+        try:
+            job["rois"] = future.result(timeout=self.detect_deadline)
+        except FutureTimeoutError:
+            # Không thể dừng thread đang decode; bỏ kết quả để camera này không giữ detect worker
+            # (thread đó vẫn đọc frame nên buffer không được trả về pool)
+            job["frames_in_use"] = True
+            job["reason"] = "Detect deadline exceeded"
+            return False
+        finally:
+            job["qr_time"] = (time.time() - qr_start_time) * 1000
+        return True
+
+    def _detect_burst(self, job: Dict[str, Any], qr_start_time: float) -> bool:
+        """Phát hiện QR song song trên các frame của burst, gộp tâm mỗi QR (frame quá deadline bị bỏ)"""
+        frames = job.pop("burst_frames")
+        futures = [self._detect_executor.submit(thread_safe_rtsp_service.detect_qr_codes, frame, job["camera_id"])
+                   for frame in frames]
+        done, _ = wait_futures(futures, timeout=self.detect_deadline)
+        job["qr_time"] = (time.time() - qr_start_time) * 1000
+        # Frame đầu còn được dùng để lưu ảnh ROI; các frame còn lại trả về pool nếu đã detect xong
+        frame_pool.release(*[frame for frame, future in zip(frames[1:], futures[1:]) if future in done])
+        if futures[0] not in done:
+            job["frames_in_use"] = True
+        detections = [future.result() for future in futures if future in done and future.exception() is None]
+        if not detections:
+            job["reason"] = "Detect deadline exceeded"
+            return False
+        job["rois"], job["burst_stats"] = aggregate_detections(detections)
+        job["burst_count"] = len(detections)
+        return True
+
+    def _persist(self, job: Dict[str, Any]) -> bool:
+        persist_start_time = time.time()
+        # Nguồn dùng chung: ghi measurements cho từng camera, ảnh ROI chỉ lưu một lần
+        for index, member_id in enumerate(job["member_ids"]):
+            thread_safe_rtsp_service.save_detections_safe(job["frame"] if index == 0 else None, job["rois"],
+                                                          member_id, job["tracking_time"], job.get("captured_at"),
+                                                          job.get("burst_stats"))
+        job["persist_time"] = (time.time() - persist_start_time) * 1000
+        return True
+
+    # ==================== PIPELINE ====================
+
+    def _handle(self, stage: StageStats, handler, job: Dict[str, Any], enqueued_at: float,
+                output_queue: Optional[queue.Queue], output_stats: Optional[StageStats], finish):
+        started_at = time.time()
+        wait_ms = (started_at - enqueued_at) * 1000
+        try:
+            success = handler(job)
+        except Exception as e:
+            logger.error(f"[{threading.current_thread().name}] ❌ Lỗi stage {stage.name} cho Camera {job['camera_name']}: {e}")
+            job["reason"] = str(e)
+            success = False
+        stage.record((time.time() - started_at) * 1000, wait_ms, success)
+        stage.observe_rss(current_rss_mb())
+
+        if success and output_queue is not None:
+            output_queue.put((job, time.time()))
+            output_stats.observe_queue_depth(output_queue.qsize())
+        else:
+            # Job kết thúc (thành công ở stage cuối hoặc thất bại ở stage bất kỳ): trả buffer về pool
+            frames = [job.pop("frame", None), *job.pop("burst_frames", [])]
+            if not job.pop("frames_in_use", False):
+                frame_pool.release(*frames)
+            finish(job, success)
+
+    def _stage_worker(self, stage: StageStats, handler, input_queue: queue.Queue,
+                      output_queue: Optional[queue.Queue], output_stats: Optional[StageStats], finish):
+        while True:
+            item = input_queue.get()
+            if item is _STOP:
+                return
+            job, enqueued_at = item
+            self._handle(stage, handler, job, enqueued_at, output_queue, output_stats, finish)
+
+    def _start_stage(self, name: str, worker_count: int, stats: StageStats, handler,
+                     input_queue: queue.Queue, output_queue: Optional[queue.Queue],
+                     output_stats: Optional[StageStats], finish) -> List[threading.Thread]:
+        threads = []
+        for index in range(max(1, worker_count)):
+            thread = threading.Thread(
+                target=self._stage_worker,
+                args=(stats, handler, input_queue, output_queue, output_stats, finish),
+                name=f"{name.capitalize()}Worker-{index}",
+                daemon=True
+            )
+            thread.start()
+            threads.append(thread)
+        return threads
+
+    def run(self, cameras: List[Dict[str, Any]], scheduled_for: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """
+        Xử lý danh sách camera qua pipeline, trả về kết quả của từng camera
+        (success, camera_name, camera_id, qr_codes/qr_count hoặc reason, processing/frame/qr/persist_time theo ms).
+        Camera có 'start_offset' (giây) chỉ được đưa vào stage capture sau khoảng trễ đó;
+        scheduled_for được ghi làm tracking_time của measurements.
+        Các camera cùng 'pair_sync' được điều phối như một đơn vị: giữ đủ slot host cho cả nhóm
+        rồi chụp trên thread riêng của nhóm (ngoài capture worker) để barrier không phải chờ worker rảnh.
+        """
+        capture_stats = StageStats("capture")
+        detect_stats = StageStats("detect")
+        persist_stats = StageStats("persist")
+
+        capture_queue: queue.Queue = queue.Queue()
+        detect_queue: queue.Queue = queue.Queue(maxsize=self.queue_size)
+        persist_queue: queue.Queue = queue.Queue(maxsize=self.queue_size)
+
+        results: Dict[int, Dict[str, Any]] = {}
+        results_lock = threading.Lock()
+        all_done = threading.Event()
+        jobs = []
+
+        def finish(job: Dict[str, Any], success: bool):
+            result = {
+                "success": success,
+                "camera_name": job["camera_name"],
+                "camera_id": job["camera_id"],
+                "processing_time": (time.time() - job["start_time"]) * 1000,
+                "frame_time": job.get("frame_time", 0),
+                "qr_time": job.get("qr_time", 0),
+                "persist_time": job.get("persist_time", 0),
+            }
+            if success:
+                result["qr_codes"] = job.get("rois", [])
+                result["qr_count"] = len(result["qr_codes"])
+                if "burst_count" in job:
+                    result["burst_count"] = job["burst_count"]
+            else:
+                result["reason"] = job.get("reason", "Unknown error")
+            with results_lock:
+                results[job["index"]] = result
+                if len(results) == len(jobs):
+                    all_done.set()
+
+        for index, camera in enumerate(cameras):
+            camera_name = camera.get('name', 'N/A')
+            if not camera.get('rtsp_url'):
+                logger.warning(f"Camera '{camera_name}' không có rtsp_url. Bỏ qua.")
+                continue
+            backend, capture_url = resolve_backend(camera)
+            job = {
+                "index": index,
+                "camera_name": camera_name,
+                "camera_id": camera.get('camera_id'),
+                "member_ids": [member["camera_id"] for member in camera.get('members', [])]
+                              or [camera.get('camera_id')],
+                "rtsp_url": camera.get('rtsp_url'),
+                "backend": backend,
+                "capture_url": capture_url,
+                "host": host_key(capture_url),
+                "start_offset": max(0.0, camera.get('start_offset') or 0.0),
+                "burst": max(1, BURST_FRAMES),
+                "pair_sync": camera.get('pair_sync'),
+                "tracking_time": scheduled_for,
+                "start_time": time.time(),
+            }
+            jobs.append(job)
+
+        if not jobs:
+            return []
+
+        max_offset = max(job["start_offset"] for job in jobs)
+        run_started_at = time.time()
+        cpu_sampler = CpuSampler()
+        cancelled = threading.Event()
+
+        # Nhóm camera chụp đồng bộ (cùng PairSync) được điều phối như một đơn vị
+        groups: Dict[int, List[Dict[str, Any]]] = {}
+        for job in jobs:
+            if job["pair_sync"] is not None:
+                groups.setdefault(id(job["pair_sync"]), []).append(job)
+        group_threads: List[threading.Thread] = []
+
+        def start_group(group: List[Dict[str, Any]]):
+            started_at = time.time()
+            for job in group:
+                job["start_time"] = started_at
+                thread = threading.Thread(
+                    target=self._handle,
+                    args=(capture_stats, self._capture, job, started_at, detect_queue, detect_stats, finish),
+                    name=f"PairCapture-{job['camera_id']}",
+                    daemon=True
+                )
+                thread.start()
+                group_threads.append(thread)
+
+        def enqueue(job: Dict[str, Any]):
+            job["start_time"] = time.time()
+            capture_queue.put((job, job["start_time"]))
+            capture_stats.observe_queue_depth(capture_queue.qsize())
+
+        # Đưa camera vào stage capture khi tới thời điểm đã rải trong cửa sổ và host còn slot;
+        # camera được xen kẽ theo host để một NVR đầy slot không chặn các host khác
+        def dispatch():
+            pending = interleave_by_host(sorted([job for job in jobs if job["pair_sync"] is None],
+                                                key=lambda j: j["start_offset"]), lambda j: j["host"])
+            pending_groups = sorted(groups.values(), key=lambda group: group[0]["start_offset"])
+            while (pending or pending_groups) and not cancelled.is_set():
+                now = time.time()
+                due = [job for job in pending if run_started_at + job["start_offset"] <= now]
+                due_groups = [group for group in pending_groups if run_started_at + group[0]["start_offset"] <= now]
+                not_due = [run_started_at + job["start_offset"] - now
+                           for job in pending + [group[0] for group in pending_groups]
+                           if run_started_at + job["start_offset"] > now]
+                wait = min(not_due) if not_due else 1.0
+                if not due and not due_groups:
+                    cancelled.wait(wait)
+                    continue
+
+                # Camera có phiên warm-up dùng luôn slot host mà phiên đang giữ, không lấy slot mới
+                warm = [job for job in due if self._adopt_warm_slot(job)]
+                if warm:
+                    for job in warm:
+                        pending.remove(job)
+                        enqueue(job)
+                    continue
+
+                # Nhóm cặp được xét trước; host của nhóm đang chờ slot không nhận thêm camera lẻ
+                # để nhóm không bị camera lẻ chiếm slot mãi
+                blocked_hosts = set()
+                started = None
+                for group in due_groups:
+                    counts = Counter(job["host"] for job in group)
+                    if host_concurrency_limiter.acquire_many(counts, timeout=0):
+                        started = group
+                        break
+                    blocked_hosts.update(counts)
+                if started is not None:
+                    pending_groups.remove(started)
+                    start_group(started)
+                    continue
+
+                candidates = [job for job in due if job["host"] not in blocked_hosts]
+                if not candidates:
+                    # Chỉ còn nhóm chờ slot: chờ tới khi các host của nhóm đầu tiên đủ slot
+                    group = due_groups[0]
+                    if host_concurrency_limiter.acquire_many(Counter(job["host"] for job in group), timeout=wait):
+                        pending_groups.remove(group)
+                        start_group(group)
+                    continue
+                # Có nhóm đang chờ thì chỉ chờ ngắn để nhóm được xét lại ngay khi có slot trả về
+                job = host_concurrency_limiter.acquire_first(candidates, lambda j: j["host"],
+                                                             timeout=min(wait, 0.05) if blocked_hosts else wait)
+                if job is None:
+                    continue
+                pending.remove(job)
+                enqueue(job)
+            shutdown()
+
+        capture_threads = self._start_stage("capture", self.capture_workers, capture_stats, self._capture,
+                                            capture_queue, detect_queue, detect_stats, finish)
+        detect_threads = self._start_stage("detect", self.detect_workers, detect_stats, self._detect,
+                                           detect_queue, persist_queue, persist_stats, finish)
+        persist_threads = self._start_stage("persist", self.persist_workers, persist_stats, self._persist,
+                                            persist_queue, None, None, finish)
+
+        # Dừng từng stage theo thứ tự khi stage trước đã xong
+        def shutdown():
+            for _ in capture_threads:
+                capture_queue.put(_STOP)
+            for thread in capture_threads + group_threads:
+                thread.join()
+            for _ in detect_threads:
+                detect_queue.put(_STOP)
+            for thread in detect_threads:
+                thread.join()
+            for _ in persist_threads:
+                persist_queue.put(_STOP)
+
+        threading.Thread(target=dispatch, name="PipelineDispatch", daemon=True).start()
+
+        run_timeout = self.timeout_seconds + max_offset
+        if not all_done.wait(timeout=run_timeout):
+            # Camera chưa được điều phối sẽ không được capture nữa
+            cancelled.set()
+            logger.warning(f"⏰ Pipeline timeout sau {run_timeout:.1f}s, "
+                           f"{len(jobs) - len(results)} camera chưa hoàn thành")
+
+        with results_lock:
+            ordered = []
+            for job in jobs:
+                result = results.get(job["index"])
+                if result is None:
+                    result = {
+                        "success": False,
+                        "camera_name": job["camera_name"],
+                        "camera_id": job["camera_id"],
+                        "reason": "Timeout",
+                        "processing_time": (time.time() - job["start_time"]) * 1000,
+                        "frame_time": job.get("frame_time", 0),
+                        "qr_time": job.get("qr_time", 0),
+                        "persist_time": 0,
+                    }
+                ordered.append(result)
+
+        cpu = cpu_sampler.utilization()
+        active_seconds = max(0.0, time.time() - run_started_at - max_offset)
+        self.last_stats = {
+            "cameras": len(jobs),
+            "capture_workers": self.capture_workers,
+            "detect_workers": self.detect_workers,
+            "hosts": len({job["host"] for job in jobs}),
+            "host_sessions": host_concurrency_limiter.snapshot(),
+            "cpu_utilization": round(cpu, 3),
+            "stages": [capture_stats.snapshot(), detect_stats.snapshot(), persist_stats.snapshot()],
+            "memory": {"rss_mb": current_rss_mb(), "peak_rss_mb": peak_rss_mb(), "frame_pool": frame_pool.snapshot()},
+            "archive": frame_archive_writer.snapshot(),
+        }
+        self._log_stats()
+        # Điều chỉnh số worker cho lượt chạy tiếp theo
+        sizing = worker_pool_sizer.adjust(self, ordered, active_seconds, cpu)
+        if sizing is not None:
+            self.last_stats["sizing"] = sizing
+        return ordered
+
+    def _log_stats(self):
+        logger.info("📊 Thống kê pipeline theo stage:")
+        for stage in self.last_stats.get("stages", []):
+            logger.info(
+                f"  [{stage['stage']}] xử lý: {stage['processed']} (lỗi: {stage['failed']}), "
+                f"trung bình: {stage['avg_latency_ms']:.2f}ms, max: {stage['max_latency_ms']:.2f}ms, "
+                f"chờ queue trung bình: {stage['avg_queue_wait_ms']:.2f}ms, "
+                f"queue depth max: {stage['max_queue_depth']}, RSS max: {stage['max_rss_mb']}MB"
+            )
+        memory = self.last_stats.get("memory", {})
+        pool = memory.get("frame_pool", {})
+        logger.info(f"🧠 RSS: {memory.get('rss_mb')}MB (peak {memory.get('peak_rss_mb')}MB), "
+                    f"frame pool: cấp phát {pool.get('allocated')}, dùng lại {pool.get('reused')}, "
+                    f"đang giữ {pool.get('pooled_mb')}MB")
+
+
+# Tạo instance global
+capture_pipeline = CapturePipeline()
@@ -0,0 +1,83 @@
+"""
+Rải thời điểm bắt đầu capture của các camera trong một cửa sổ sau capture_time,
+tránh việc toàn bộ camera bị mở RTSP trong cùng một giây
+"""
+import logging
+import threading
+import zlib
+from typing import Any, Dict, List
+
+try:
+    from config.settings import CAPTURE_SPREAD_POLICY, CAPTURE_SPREAD_WINDOW_SECONDS
+except ImportError:
+    CAPTURE_SPREAD_POLICY = "none"
+    CAPTURE_SPREAD_WINDOW_SECONDS = 20
+
+logger = logging.getLogger(__name__)
+
+SPREAD_POLICIES = ("none", "hash", "latency")
+
+# Trọng số của lần đo mới nhất khi cập nhật độ trễ capture trung bình (EWMA)
+_LATENCY_SMOOTHING = 0.3
+
+
+class CaptureSpreadPlanner:
+    """
+    Tính độ lệch (giây) so với capture_time cho từng camera:
+    - none: tất cả bắt đầu ngay
+    - hash: vị trí cố định theo hash của camera_id, phân bố đều trong cửa sổ
+    - latency: sắp xếp theo độ trễ capture đã quan sát, mỗi camera bắt đầu khi phần tải
+      của các camera trước nó đã được rải hết, nên tải đồng thời xấp xỉ không đổi trong cửa sổ
+    """
+
+    def __init__(self, policy: str = CAPTURE_SPREAD_POLICY, window_seconds: float = CAPTURE_SPREAD_WINDOW_SECONDS):
+        if policy not in SPREAD_POLICIES:
+            raise ValueError(f"CAPTURE_SPREAD_POLICY không hợp lệ: {policy}")
+        self.policy = policy
+        self.window_seconds = window_seconds
+        self._lock = threading.Lock()
+        self._latency_ms: Dict[Any, float] = {}
+
+    def plan(self, cameras: List[Dict[str, Any]]) -> List[float]:
+        """Trả về offset (giây) theo đúng thứ tự danh sách camera"""
+        if self.policy == "none" or self.window_seconds <= 0 or not cameras:
+            return [0.0] * len(cameras)
+        if self.policy == "hash":
+            return [self._hash_offset(camera) for camera in cameras]
+        return self._latency_offsets(cameras)
+
+    def _hash_offset(self, camera: Dict[str, Any]) -> float:
+        key = str(camera.get('camera_id', camera.get('name', ''))).encode("utf-8")
+        return (zlib.crc32(key) % 10000) / 10000 * self.window_seconds
+
+    def _latency_offsets(self, cameras: List[Dict[str, Any]]) -> List[float]:
+        with self._lock:
+            known = list(self._latency_ms.values())
+            default_latency = sum(known) / len(known) if known else 1000.0
+            latencies = [self._latency_ms.get(camera.get('camera_id'), default_latency) for camera in cameras]
+
+        total = sum(latencies) or 1.0
+        offsets = [0.0] * len(cameras)
+        elapsed = 0.0
+        # Camera chậm đi trước để phần đuôi cửa sổ không bị dồn các phiên dài
+        for index in sorted(range(len(cameras)), key=lambda i: latencies[i], reverse=True):
+            offsets[index] = elapsed / total * self.window_seconds
+            elapsed += latencies[index]
+        return offsets
+
+    def observe(self, results: List[Dict[str, Any]]):
+        """Cập nhật độ trễ capture của từng camera từ kết quả lượt chạy"""
+        with self._lock:
+            for result in results:
+                camera_id = result.get("camera_id")
+                frame_time = result.get("frame_time")
+                if camera_id is None or not frame_time:
+                    continue
+                previous = self._latency_ms.get(camera_id)
+                self._latency_ms[camera_id] = frame_time if previous is None else (
+                    _LATENCY_SMOOTHING * frame_time + (1 - _LATENCY_SMOOTHING) * previous
+                )
+
+
+# Tạo instance global
+capture_spread_planner = CaptureSpreadPlanner()
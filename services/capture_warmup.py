@@ -0,0 +1,208 @@
+"""
+Mở trước phiên RTSP vài giây trước capture_time: bước kết nối nằm ngoài thời điểm chụp,
+frame cũ trong buffer được bỏ liên tục và frame được lấy ngay tại tick
+"""
+import logging
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import cv2
+import numpy as np
+
+from services.host_limiter import HostConcurrencyLimiter, host_concurrency_limiter, host_key
+from services.stream_dedup import normalize_rtsp_url
+from services.frame_pool import frame_pool
+
+try:
+    from config.settings import (WARMUP_SECONDS, WARMUP_MAX_SESSIONS,
+                                 CAMERA_CONNECT_DEADLINE_SECONDS, CAMERA_READ_DEADLINE_SECONDS, TIMEOUT_SECONDS)
+except ImportError:
+    WARMUP_SECONDS = 5
+    WARMUP_MAX_SESSIONS = 32
+    CAMERA_CONNECT_DEADLINE_SECONDS = 10
+    CAMERA_READ_DEADLINE_SECONDS = 5
+    TIMEOUT_SECONDS = 30
+
+logger = logging.getLogger(__name__)
+
+
+class WarmSession:
+    """
+    Một phiên RTSP được mở trước. Thread nền gọi cap.grab() liên tục (không decode)
+    để buffer luôn chỉ còn frame mới nhất; take() lấy frame kế tiếp rồi đóng phiên.
+    Phiên giữ một slot của host trong limiter cho tới khi đóng, trừ khi slot đã được adopt()
+    cho camera dùng phiên (khi đó bên nhận trả slot sau khi chụp xong).
+    """
+
+    def __init__(self, rtsp_url: str, expires_at: float, host: str, limiter: HostConcurrencyLimiter):
+        self.rtsp_url = rtsp_url
+        self.expires_at = expires_at
+        self.host = host
+        self._limiter = limiter
+        self._holds_slot = True
+        self.ready = threading.Event()
+        self.closed = threading.Event()
+        self.drained_frames = 0
+        self._lock = threading.Lock()
+        self._taken = False
+        self._cap = None
+        self._thread = threading.Thread(target=self._run, name="WarmSession", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        try:
+            cap = cv2.VideoCapture(self.rtsp_url, cv2.CAP_FFMPEG, [
+                cv2.CAP_PROP_OPEN_TIMEOUT_MSEC, int(CAMERA_CONNECT_DEADLINE_SECONDS * 1000),
+                cv2.CAP_PROP_READ_TIMEOUT_MSEC, int(CAMERA_READ_DEADLINE_SECONDS * 1000),
+            ])
+            cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+            if not cap.isOpened():
+                cap.release()
+                logger.warning(f"🔥 Warm-up không mở được stream: {self.rtsp_url}")
+                return
+            with self._lock:
+                if self._taken:
+                    # Tick đã tới trước khi kết nối xong: bên gọi đã capture theo cách thường
+                    cap.release()
+                    return
+                self._cap = cap
+            self.ready.set()
+
+            # Bỏ frame cũ cho tới khi được take() hoặc hết hạn
+            while time.time() < self.expires_at:
+                with self._lock:
+                    if self._taken:
+                        return
+                    if not cap.grab():
+                        break
+                    self.drained_frames += 1
+            logger.info(f"🔥 Phiên warm-up hết hạn mà chưa được dùng: {self.rtsp_url}")
+        except Exception as e:
+            logger.error(f"🔥 Lỗi warm-up {self.rtsp_url}: {e}")
+        finally:
+            self._release()
+
+    def _release(self):
+        with self._lock:
+            if self._cap is not None:
+                self._cap.release()
+                self._cap = None
+            if not self._taken:
+                # Phiên hết hạn/lỗi mà chưa được dùng; phiên đã take() thì slot được trả trong take()
+                self._release_slot()
+            self.closed.set()
+
+    def _release_slot(self):
+        # Gọi khi đang giữ self._lock
+        if self._holds_slot:
+            self._holds_slot = False
+            self._limiter.release(self.host)
+
+    def adopt(self) -> Optional[str]:
+        """Chuyển slot của host sang bên gọi (trả về host, bên gọi phải release); None nếu phiên đã đóng"""
+        with self._lock:
+            if not self._holds_slot:
+                return None
+            self._holds_slot = False
+            return self.host
+
+    def take(self, count: int = 1) -> List[np.ndarray]:
+        """Đọc count frame liên tiếp từ thời điểm gọi; rỗng nếu phiên chưa sẵn sàng/đã đóng"""
+        with self._lock:
+            if self._taken:
+                return []
+            self._taken = True
+            cap, self._cap = self._cap, None
+        frames = []
+        try:
+            if cap is not None:
+                for _ in range(count):
+                    frame = frame_pool.read(cap)
+                    if frame is None:
+                        break
+                    frames.append(frame)
+            return frames
+        finally:
+            if cap is not None:
+                cap.release()
+            with self._lock:
+                self._release_slot()
+
+
+class CaptureWarmupPool:
+    """
+    Phiên được mở trước cho tối đa WARMUP_MAX_SESSIONS nguồn; mỗi phiên giữ một slot của host
+    trong host_concurrency_limiter nên phiên warm-up và capture thường cùng không vượt MAX_SESSIONS_PER_HOST
+    (host đã hết slot thì không warm-up). Camera không được warm-up vẫn capture như cũ.
+    """
+
+    def __init__(self, lead_seconds: float = WARMUP_SECONDS, max_sessions: int = WARMUP_MAX_SESSIONS,
+                 ttl_seconds: float = TIMEOUT_SECONDS, limiter: HostConcurrencyLimiter = host_concurrency_limiter):
+        self.lead_seconds = lead_seconds
+        self.max_sessions = max_sessions
+        self.limiter = limiter
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._sessions: Dict[str, WarmSession] = {}
+        self.last_stats: Dict[str, Any] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.lead_seconds > 0 and self.max_sessions > 0
+
+    def open(self, cameras: List[Dict[str, Any]]) -> int:
+        """Mở trước phiên cho các camera; phiên tự đóng nếu không được dùng sau lead + TTL giây"""
+        expires_at = time.time() + self.lead_seconds + self.ttl_seconds
+        opened = 0
+        with self._lock:
+            # Bỏ các phiên của lượt trước đã đóng
+            self._sessions = {key: session for key, session in self._sessions.items() if not session.closed.is_set()}
+            for camera in cameras:
+                url = camera.get('rtsp_url')
+                key = normalize_rtsp_url(url)
+                host = host_key(url)
+                if not key or key in self._sessions:
+                    continue
+                if len(self._sessions) >= self.max_sessions:
+                    continue
+                if not self.limiter.acquire_many({host: 1}, timeout=0):
+                    continue
+                self._sessions[key] = WarmSession(url, expires_at, host, self.limiter)
+                opened += 1
+        self.last_stats = {"opened": opened, "requested": len(cameras), "taken": 0, "missed": 0}
+        logger.info(f"🔥 Warm-up {opened}/{len(cameras)} phiên RTSP trước tick {self.lead_seconds}s")
+        return opened
+
+    def has(self, rtsp_url: Optional[str]) -> bool:
+        with self._lock:
+            session = self._sessions.get(normalize_rtsp_url(rtsp_url))
+            return session is not None and not session.closed.is_set()
+
+    def adopt(self, rtsp_url: Optional[str]) -> Optional[str]:
+        """
+        Nhận slot host của phiên warm-up cho camera sắp chụp (bên điều phối không lấy slot mới);
+        trả về host để release() sau khi chụp xong, None nếu không có phiên còn mở.
+        """
+        with self._lock:
+            session = self._sessions.get(normalize_rtsp_url(rtsp_url))
+        return session.adopt() if session is not None else None
+
+    def take_burst(self, rtsp_url: Optional[str], count: int) -> List[np.ndarray]:
+        """
+        count frame liên tiếp từ phiên đã mở trước; rỗng thì bên gọi capture bình thường.
+        Slot của phiên được trả sau khi đọc, trừ khi đã được adopt().
+        """
+        with self._lock:
+            session = self._sessions.pop(normalize_rtsp_url(rtsp_url), None)
+        if session is None:
+            return []
+        frames = session.take(count)
+        outcome = "taken" if frames else "missed"
+        with self._lock:
+            self.last_stats[outcome] = self.last_stats.get(outcome, 0) + 1
+        return frames
+
+
+# Tạo instance global
+capture_warmup_pool = CaptureWarmupPool()
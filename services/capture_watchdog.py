@@ -0,0 +1,192 @@
+"""
+Watchdog cho capture: mở RTSP và đọc frame trong một process riêng có thể kill,
+với deadline riêng cho bước kết nối và bước đọc frame
+"""
+import logging
+import multiprocessing
+import threading
+import time
+from typing import List, Optional, Tuple
+
+import numpy as np
+from multiprocessing.connection import BufferTooShort
+
+from services.frame_pool import frame_pool, readonly
+
+try:
+    from config.settings import CAMERA_CONNECT_DEADLINE_SECONDS, CAMERA_READ_DEADLINE_SECONDS
+except ImportError:
+    CAMERA_CONNECT_DEADLINE_SECONDS = 10
+    CAMERA_READ_DEADLINE_SECONDS = 5
+
+logger = logging.getLogger(__name__)
+
+_CONNECTED = "connected"
+_FRAME = "frame"
+_ERROR = "error"
+
+
+def _capture_child(rtsp_url: str, connect_timeout_ms: int, read_timeout_ms: int, conn, count: int = 1):
+    """
+    Chạy trong process con: báo 'connected' sau khi mở stream, sau đó gửi lần lượt count frame
+    đọc liên tiếp trên cùng phiên. Nếu process bị treo trong OpenCV/FFmpeg, process cha sẽ kill nó khi hết deadline.
+    """
+    import cv2
+
+    cap = None
+    try:
+        cap = cv2.VideoCapture(rtsp_url, cv2.CAP_FFMPEG, [
+            cv2.CAP_PROP_OPEN_TIMEOUT_MSEC, connect_timeout_ms,
+            cv2.CAP_PROP_READ_TIMEOUT_MSEC, read_timeout_ms,
+        ])
+        cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        if not cap.isOpened():
+            conn.send((_ERROR, "Cannot open RTSP stream"))
+            return
+        conn.send((_CONNECTED, None))
+
+        for _ in range(count):
+            ret, frame = cap.read()
+            if not ret or frame is None:
+                conn.send((_ERROR, "Cannot read frame"))
+                return
+
+            # Chuyển đổi frame sang BGR nếu cần (đảm bảo format nhất quán)
+            if len(frame.shape) == 2:
+                frame = cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR)
+            elif frame.shape[2] == 4:
+                frame = cv2.cvtColor(frame, cv2.COLOR_RGBA2BGR)
+
+            conn.send((_FRAME, (frame.shape, frame.dtype.str)))
+            # Gửi dạng mảng byte phẳng: memoryview nhiều chiều bị cắt theo chiều đầu tiên khi gửi
+            conn.send_bytes(memoryview(np.ascontiguousarray(frame)).cast("B"))
+    except Exception as e:
+        try:
+            conn.send((_ERROR, str(e)))
+        except Exception:
+            pass
+    finally:
+        if cap is not None:
+            cap.release()
+        conn.close()
+
+
+class CaptureWatchdog:
+    """
+    Mỗi lần capture chạy trong một process con. Process cha chờ từng bước với deadline riêng
+    (kết nối, đọc frame) và kill process con khi quá hạn, nên một camera treo trong
+    cv2.VideoCapture không giữ thread của pipeline và không làm chậm các camera khác.
+    """
+
+    def __init__(self, connect_deadline: float = CAMERA_CONNECT_DEADLINE_SECONDS,
+                 read_deadline: float = CAMERA_READ_DEADLINE_SECONDS):
+        self.connect_deadline = connect_deadline
+        self.read_deadline = read_deadline
+        self._context = None
+        self._context_lock = threading.Lock()
+        self.killed_count = 0
+
+    def _get_context(self):
+        # forkserver: fork từ một server đơn luồng (an toàn hơn fork từ process nhiều thread);
+        # Windows chỉ hỗ trợ spawn
+        with self._context_lock:
+            if self._context is None:
+                methods = multiprocessing.get_all_start_methods()
+                if "forkserver" in methods:
+                    self._context = multiprocessing.get_context("forkserver")
+                    self._context.set_forkserver_preload(["cv2", "numpy", "services.capture_watchdog"])
+                else:
+                    self._context = multiprocessing.get_context("spawn")
+            return self._context
+
+    def grab(self, rtsp_url: str) -> Tuple[Optional[np.ndarray], Optional[str]]:
+        """
+        Lấy một frame với deadline cho từng bước.
+        Returns: (frame, None) nếu thành công, (None, lý do) nếu thất bại/quá hạn.
+        """
+        frames, reason = self.grab_burst(rtsp_url, 1)
+        return (frames[0], None) if frames else (None, reason)
+
+    def grab_burst(self, rtsp_url: str, count: int) -> Tuple[List[np.ndarray], Optional[str]]:
+        """
+        Đọc count frame liên tiếp trên cùng một phiên, mỗi frame có deadline đọc riêng.
+        Returns: (các frame đọc được, lý do dừng nếu chưa đủ count frame).
+        """
+        context = self._get_context()
+        parent_conn, child_conn = context.Pipe(duplex=False)
+        process = context.Process(
+            target=_capture_child,
+            args=(rtsp_url, int(self.connect_deadline * 1000), int(self.read_deadline * 1000), child_conn, count),
+            daemon=True
+        )
+        process.start()
+        child_conn.close()
+
+        frames: List[np.ndarray] = []
+        try:
+            # Bước 1: kết nối
+            if not parent_conn.poll(self.connect_deadline):
+                return frames, self._kill(process, "Connect deadline exceeded")
+            kind, payload = parent_conn.recv()
+            if kind == _ERROR:
+                return frames, payload
+
+            # Bước 2: đọc từng frame
+            while len(frames) < count:
+                if not parent_conn.poll(self.read_deadline):
+                    return frames, self._kill(process, "Read deadline exceeded")
+                kind, payload = parent_conn.recv()
+                if kind == _ERROR:
+                    return frames, payload
+
+                shape, dtype = payload
+                # Dữ liệu frame theo ngay sau header
+                if not parent_conn.poll(self.read_deadline):
+                    return frames, self._kill(process, "Read deadline exceeded")
+                frame = self._recv_frame(parent_conn, tuple(shape), np.dtype(dtype))
+                if frame is None:
+                    return frames, "Frame size mismatch"
+                frames.append(frame)
+            return frames, None
+        except EOFError:
+            return frames, "Capture process exited unexpectedly"
+        finally:
+            parent_conn.close()
+            process.join(timeout=1)
+            if process.is_alive():
+                process.kill()
+                process.join()
+
+    @staticmethod
+    def _recv_frame(conn, shape: Tuple[int, ...], dtype: np.dtype) -> Optional[np.ndarray]:
+        """
+        Nhận dữ liệu frame thẳng vào buffer của frame_pool (recv_bytes_into), để frame qua watchdog
+        cũng được trả về pool khi camera xử lý xong. Trả về view chỉ đọc, None nếu kích thước không khớp.
+        """
+        if not frame_pool.enabled or dtype != np.uint8:
+            data = conn.recv_bytes()
+            return readonly(np.frombuffer(data, dtype=dtype).reshape(shape))
+        buffer = frame_pool.acquire(shape)
+        try:
+            received = conn.recv_bytes_into(memoryview(buffer).cast("B"))
+        except BufferTooShort:
+            received = -1
+        except BaseException:
+            frame_pool.release(buffer)
+            raise
+        if received != buffer.nbytes:
+            frame_pool.release(buffer)
+            return None
+        return readonly(buffer)
+
+    def _kill(self, process, reason: str) -> str:
+        started_at = time.time()
+        process.kill()
+        process.join()
+        self.killed_count += 1
+        logger.warning(f"🔪 Đã kill capture process bị treo ({reason}) sau {(time.time() - started_at) * 1000:.0f}ms")
+        return reason
+
+
+# Tạo instance global
+capture_watchdog = CaptureWatchdog()
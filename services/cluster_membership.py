@@ -0,0 +1,109 @@
+"""
+Chia camera giữa các node chạy scheduler (uvicorn worker / replica) thông qua database,
+để mỗi camera chỉ được chụp bởi đúng một node
+"""
+import hashlib
+import json
+import logging
+import os
+import socket
+import threading
+import uuid
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from services.thread_safe_db_service import thread_safe_db_service
+
+try:
+    from config.settings import CLUSTER_MODE, CLUSTER_NODE_ID, CLUSTER_NODE_TTL_SECONDS
+except ImportError:
+    CLUSTER_MODE = True
+    CLUSTER_NODE_ID = None
+    CLUSTER_NODE_TTL_SECONDS = 30
+
+logger = logging.getLogger(__name__)
+
+
+def _default_node_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+
+class ClusterMembership:
+    """
+    Mỗi node ghi heartbeat vào bảng scheduler_nodes. Khi tới lượt chạy, node đọc danh sách
+    node còn sống và giữ lại các camera mà rendezvous hashing gán cho mình:
+    - các node cùng danh sách node sẽ chọn ra các tập camera rời nhau, phủ hết camera
+    - khi một node tham gia/rời đi, chỉ camera của node đó được chia lại cho node khác
+    """
+
+    def __init__(self, enabled: bool = CLUSTER_MODE, node_id: Optional[str] = CLUSTER_NODE_ID,
+                 node_ttl: int = CLUSTER_NODE_TTL_SECONDS):
+        self.enabled = enabled
+        self.node_id = node_id or _default_node_id()
+        self.node_ttl = node_ttl
+        self.started_at = datetime.now()
+        self.role = "api"
+        # Hàm trả về thống kê của node, được ghi kèm heartbeat (liveness cho API / giám sát)
+        self.stats_provider: Optional[Callable[[], Dict[str, Any]]] = None
+        self._lock = threading.Lock()
+        self._last_nodes: List[str] = []
+
+    def heartbeat(self) -> bool:
+        """Luôn ghi heartbeat (liveness), kể cả khi không chia camera theo cluster"""
+        stats = None
+        if self.stats_provider is not None:
+            try:
+                stats = json.dumps(self.stats_provider(), default=str)
+            except Exception as e:
+                logger.error(f"Error collecting node stats: {e}")
+        return thread_safe_db_service.heartbeat_node_safe(self.node_id, socket.gethostname(), os.getpid(),
+                                                          self.started_at, self.role, stats)
+
+    def leave(self):
+        """Xoá node khỏi cluster để các node khác nhận lại camera ngay, không phải chờ hết TTL"""
+        if thread_safe_db_service.remove_node_safe(self.node_id):
+            logger.info(f"👋 Node {self.node_id} đã rời cluster")
+
+    def live_nodes(self) -> Optional[List[str]]:
+        nodes = thread_safe_db_service.get_live_nodes_safe(self.node_ttl)
+        if nodes is None:
+            return None
+        if self.node_id not in nodes:
+            nodes.append(self.node_id)
+        return sorted(nodes)
+
+    @staticmethod
+    def owner_of(camera_key: Any, nodes: List[str]) -> str:
+        """Rendezvous (highest random weight) hashing"""
+        return max(nodes, key=lambda node: hashlib.sha1(f"{node}:{camera_key}".encode("utf-8")).digest())
+
+    def select_cameras(self, cameras: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Trả về phần camera mà node này phụ trách"""
+        if not self.enabled:
+            return cameras
+
+        self.heartbeat()
+        nodes = self.live_nodes()
+        with self._lock:
+            if nodes is None:
+                # Không chụp toàn bộ camera (các node khác vẫn chụp phần của mình -> chụp trùng):
+                # dùng danh sách node đọc được lần gần nhất, chưa có thì bỏ qua lượt này
+                if not self._last_nodes:
+                    logger.warning("⚠️ Không đọc được scheduler_nodes và chưa có danh sách node trước đó, "
+                                   "bỏ qua camera ở lượt này")
+                    return []
+                nodes = self._last_nodes
+                logger.warning(f"⚠️ Không đọc được scheduler_nodes, dùng danh sách {len(nodes)} node gần nhất")
+            elif nodes != self._last_nodes:
+                logger.info(f"🔀 Cluster thay đổi: {len(self._last_nodes)} -> {len(nodes)} node, chia lại camera")
+                self._last_nodes = nodes
+
+        # Camera có 'shard_key' (ví dụ các camera của một cặp chụp đồng bộ) luôn về cùng một node
+        selected = [camera for camera in cameras
+                    if self.owner_of(camera.get('shard_key', camera.get('camera_id')), nodes) == self.node_id]
+        logger.info(f"🧩 Node {self.node_id} phụ trách {len(selected)}/{len(cameras)} camera ({len(nodes)} node)")
+        return selected
+
+
+# Tạo instance global
+cluster_membership = ClusterMembership()
@@ -0,0 +1,243 @@
+"""
+Streaming export service cho bảng measurements (NDJSON / CSV / Parquet / Arrow IPC)
+"""
+import csv
+import io
+import json
+import logging
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from db.database import get_streaming_connection
+
+try:
+    from config.settings import EXPORT_FETCH_SIZE, EXPORT_PARQUET_ROW_GROUP
+except ImportError:
+    EXPORT_FETCH_SIZE = 5000
+    EXPORT_PARQUET_ROW_GROUP = 50000
+
+logger = logging.getLogger(__name__)
+
+EXPORT_COLUMNS = ["measurement_id", "qr_code_id", "camera_id", "x", "y", "tracking_time"]
+
+EXPORT_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+
+
+class _ChunkSink(io.RawIOBase):
+    """
+    File-like object giữ lại các byte vừa được ghi để generator có thể
+    yield ra ngay rồi xoá, tránh giữ toàn bộ file trong bộ nhớ.
+    """
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        chunk = bytes(data)
+        self._chunks.append(chunk)
+        self._position += len(chunk)
+        return len(chunk)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+class MeasurementExportService:
+    """
+    Export measurements bằng server-side cursor (SSDictCursor): các dòng được đọc
+    theo từng batch và ghi thẳng ra output, bộ nhớ không phụ thuộc số dòng.
+    """
+
+    def __init__(self, fetch_size: int = EXPORT_FETCH_SIZE):
+        self.fetch_size = fetch_size
+
+    def build_query(self, qr_code_id: Optional[int] = None, camera_id: Optional[int] = None,
+                    time_from: Optional[datetime] = None, time_to: Optional[datetime] = None,
+                    columns: Optional[List[str]] = None, order: str = "asc",
+                    after: Optional[Tuple[datetime, int]] = None,
+                    limit: Optional[int] = None) -> Tuple[str, List[Any]]:
+        """
+        Tạo câu query measurements cùng tham số theo các filter, sắp xếp theo (tracking_time, measurement_id).
+        Dùng chung cho export và GET /measurements: after là khoá (tracking_time, measurement_id)
+        của dòng cuối trang trước (keyset pagination), limit là số dòng tối đa.
+        """
+        conditions = []
+        params: List[Any] = []
+        if qr_code_id is not None:
+            conditions.append("qr_code_id = %s")
+            params.append(qr_code_id)
+        if camera_id is not None:
+            conditions.append("camera_id = %s")
+            params.append(camera_id)
+        if time_from is not None:
+            conditions.append("tracking_time >= %s")
+            params.append(time_from)
+        if time_to is not None:
+            conditions.append("tracking_time <= %s")
+            params.append(time_to)
+        comparison, direction = (">", "ASC") if order == "asc" else ("<", "DESC")
+        if after is not None:
+            after_time, after_id = after
+            conditions.append(
+                f"(tracking_time {comparison} %s OR (tracking_time = %s AND measurement_id {comparison} %s))"
+            )
+            params.extend([after_time, after_time, after_id])
+
+        query = f"SELECT {', '.join(columns or EXPORT_COLUMNS)} FROM measurements"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += f" ORDER BY tracking_time {direction}, measurement_id {direction}"
+        if limit is not None:
+            query += " LIMIT %s"
+            params.append(limit)
+        return query, params
+
+    def iter_batches(self, **filters) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Đọc measurements theo từng batch từ server-side cursor.
+        Connection được đóng khi generator kết thúc hoặc bị huỷ (client ngắt kết nối).
+        """
+        query, params = self.build_query(**filters)
+        conn = get_streaming_connection()
+        if conn is None:
+            raise Exception("Cannot establish database connection")
+
+        total_rows = 0
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(query, params)
+                while True:
+                    rows = cursor.fetchmany(self.fetch_size)
+                    if not rows:
+                        break
+                    total_rows += len(rows)
+                    yield rows
+            logger.info(f"📦 Export hoàn thành: {total_rows} measurements")
+        finally:
+            conn.close()
+
+    def iter_ndjson(self, **filters) -> Iterator[bytes]:
+        """Mỗi measurement là một dòng JSON"""
+        for rows in self.iter_batches(**filters):
+            lines = []
+            for row in rows:
+                record = dict(row)
+                record["tracking_time"] = _format_time(record["tracking_time"])
+                lines.append(json.dumps(record, ensure_ascii=False))
+            yield ("\n".join(lines) + "\n").encode("utf-8")
+
+    def iter_csv(self, **filters) -> Iterator[bytes]:
+        """CSV với header ở dòng đầu tiên"""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(EXPORT_COLUMNS)
+        yield buffer.getvalue().encode("utf-8")
+
+        for rows in self.iter_batches(**filters):
+            buffer.seek(0)
+            buffer.truncate()
+            for row in rows:
+                writer.writerow([
+                    _format_time(row[column]) if column == "tracking_time" else row[column]
+                    for column in EXPORT_COLUMNS
+                ])
+            yield buffer.getvalue().encode("utf-8")
+
+    @staticmethod
+    def _arrow_schema():
+        import pyarrow as pa
+
+        return pa.schema([
+            ("measurement_id", pa.int64()),
+            ("qr_code_id", pa.int64()),
+            ("camera_id", pa.int64()),
+            ("x", pa.int32()),
+            ("y", pa.int32()),
+            ("tracking_time", pa.timestamp("us")),
+        ])
+
+    def iter_arrow(self, **filters) -> Iterator[bytes]:
+        """Arrow IPC stream: mỗi batch từ cursor là một record batch"""
+        import pyarrow as pa
+
+        schema = self._arrow_schema()
+        sink = _ChunkSink()
+        writer = pa.ipc.new_stream(sink, schema)
+        try:
+            for rows in self.iter_batches(**filters):
+                writer.write_batch(pa.RecordBatch.from_pylist(rows, schema=schema))
+                yield sink.drain()
+        finally:
+            writer.close()
+        yield sink.drain()
+
+    def iter_parquet(self, row_group_size: int = EXPORT_PARQUET_ROW_GROUP, **filters) -> Iterator[bytes]:
+        """
+        Parquet được ghi theo từng row group; byte của mỗi row group được yield
+        ngay sau khi ghi, footer được ghi ở cuối.
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        schema = self._arrow_schema()
+
+        sink = _ChunkSink()
+        writer = pq.ParquetWriter(sink, schema)
+        pending: List[Dict[str, Any]] = []
+        try:
+            for rows in self.iter_batches(**filters):
+                pending.extend(rows)
+                if len(pending) >= row_group_size:
+                    writer.write_table(pa.Table.from_pylist(pending, schema=schema))
+                    pending = []
+                    yield sink.drain()
+            if pending:
+                writer.write_table(pa.Table.from_pylist(pending, schema=schema))
+        finally:
+            writer.close()
+        yield sink.drain()
+
+    def stream(self, export_format: str, **filters) -> Iterator[bytes]:
+        """Chọn generator theo định dạng export"""
+        if export_format == "ndjson":
+            return self.iter_ndjson(**filters)
+        if export_format == "csv":
+            return self.iter_csv(**filters)
+        if export_format == "parquet":
+            return self.iter_parquet(**filters)
+        if export_format == "arrow":
+            return self.iter_arrow(**filters)
+        raise ValueError(f"Định dạng export không hỗ trợ: {export_format}")
+
+    @staticmethod
+    def is_format_available(export_format: str) -> bool:
+        """Parquet và Arrow cần pyarrow (dependency tuỳ chọn)"""
+        if export_format not in ("parquet", "arrow"):
+            return True
+        try:
+            import pyarrow.parquet  # noqa: F401
+            return True
+        except ImportError:
+            return False
+
+
+def _format_time(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+# Tạo instance global
+measurement_export_service = MeasurementExportService()
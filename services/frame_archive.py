@@ -0,0 +1,159 @@
+"""
+Ghi ảnh lưu trữ (frame có vẽ ROI, frame debug, ảnh crop ROI) bằng pool thread nền:
+worker capture/persist chỉ đưa ảnh vào queue có giới hạn, việc vẽ, encode và ghi đĩa
+không nằm trên đường xử lý camera nên tốc độ đĩa không ảnh hưởng tới thời gian chụp.
+"""
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import cv2
+import numpy as np
+
+try:
+    from config.settings import (ARCHIVE_WRITER_WORKERS, ARCHIVE_QUEUE_SIZE, ARCHIVE_DROP_POLICY,
+                                 ARCHIVE_FORMAT, ARCHIVE_QUALITY, ARCHIVE_MAX_WIDTH)
+except ImportError:
+    ARCHIVE_WRITER_WORKERS = 2
+    ARCHIVE_QUEUE_SIZE = 32
+    ARCHIVE_DROP_POLICY = "drop_oldest"
+    ARCHIVE_FORMAT = "jpg"
+    ARCHIVE_QUALITY = 95
+    ARCHIVE_MAX_WIDTH = 0
+
+logger = logging.getLogger(__name__)
+
+DROP_POLICIES = ("drop_oldest", "drop_newest")
+_QUALITY_FLAGS = {"jpg": cv2.IMWRITE_JPEG_QUALITY, "webp": cv2.IMWRITE_WEBP_QUALITY}
+
+
+class FrameArchiveWriter:
+    """
+    Queue giới hạn queue_size ảnh chờ ghi. Khi queue đầy:
+    - drop_oldest: bỏ ảnh cũ nhất đang chờ để nhận ảnh mới
+    - drop_newest: bỏ ảnh vừa gửi
+    Ảnh được thu nhỏ về chiều rộng tối đa max_width (0 = giữ nguyên) và encode theo image_format/quality.
+    """
+
+    def __init__(self, workers: int = ARCHIVE_WRITER_WORKERS, queue_size: int = ARCHIVE_QUEUE_SIZE,
+                 drop_policy: str = ARCHIVE_DROP_POLICY, image_format: str = ARCHIVE_FORMAT,
+                 quality: int = ARCHIVE_QUALITY, max_width: int = ARCHIVE_MAX_WIDTH):
+        if drop_policy not in DROP_POLICIES:
+            logger.warning(f"ARCHIVE_DROP_POLICY không hợp lệ '{drop_policy}', dùng drop_oldest")
+            drop_policy = "drop_oldest"
+        image_format = image_format.lower().lstrip(".").replace("jpeg", "jpg")
+        if image_format not in _QUALITY_FLAGS:
+            logger.warning(f"ARCHIVE_FORMAT không hợp lệ '{image_format}', dùng jpg")
+            image_format = "jpg"
+        self.workers = max(1, workers)
+        self.drop_policy = drop_policy
+        self.image_format = image_format
+        self.quality = quality
+        self.max_width = max_width
+        self._queue: queue.Queue = queue.Queue(maxsize=max(1, queue_size))
+        self._lock = threading.Lock()
+        self._threads: List[threading.Thread] = []
+        self.stats = {"submitted": 0, "written": 0, "dropped": 0, "failed": 0, "total_write_ms": 0.0}
+
+    def _count(self, key: str, amount: float = 1):
+        with self._lock:
+            self.stats[key] += amount
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._threads:
+                return
+            for index in range(self.workers):
+                thread = threading.Thread(target=self._worker, name=f"ArchiveWriter-{index}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, directory: str, name: str, render: Callable[[], np.ndarray]) -> Optional[str]:
+        """
+        Đưa một ảnh vào queue ghi. render() chạy trên thread ghi và trả về ảnh cần lưu
+        (vẽ ROI trên bản copy của frame, hoặc trả thẳng ảnh crop).
+        Returns: đường dẫn file sẽ được ghi, hoặc None nếu ảnh bị bỏ vì queue đầy.
+        """
+        self._ensure_started()
+        path = os.path.join(directory, f"{name}.{self.image_format}")
+        item = (path, render)
+        self._count("submitted")
+        try:
+            self._queue.put_nowait(item)
+            return path
+        except queue.Full:
+            pass
+
+        if self.drop_policy == "drop_oldest":
+            try:
+                dropped_path, _ = self._queue.get_nowait()
+                self._queue.task_done()
+                self._count("dropped")
+                logger.warning(f"🗑️ Queue ghi ảnh đầy, bỏ ảnh cũ nhất: {dropped_path}")
+                self._queue.put_nowait(item)
+                return path
+            except (queue.Empty, queue.Full):
+                pass
+        self._count("dropped")
+        logger.warning(f"🗑️ Queue ghi ảnh đầy, bỏ ảnh: {path}")
+        return None
+
+    def _worker(self):
+        while True:
+            path, render = self._queue.get()
+            try:
+                self._write(path, render)
+            except Exception as e:
+                self._count("failed")
+                logger.error(f"❌ Lỗi khi ghi ảnh {path}: {e}")
+            finally:
+                self._queue.task_done()
+
+    def _write(self, path: str, render: Callable[[], np.ndarray]):
+        started_at = time.time()
+        image = render()
+        height, width = image.shape[:2]
+        if self.max_width and width > self.max_width:
+            image = cv2.resize(image, (self.max_width, max(1, round(height * self.max_width / width))),
+                               interpolation=cv2.INTER_AREA)
+        if cv2.imwrite(path, image, [_QUALITY_FLAGS[self.image_format], int(self.quality)]):
+            self._count("written")
+            self._count("total_write_ms", (time.time() - started_at) * 1000)
+            logger.info(f"💾 Đã lưu ảnh: {path}")
+        else:
+            self._count("failed")
+            logger.error(f"❌ Không thể lưu ảnh: {path}")
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Chờ các ảnh đang trong queue được ghi xong; False nếu hết timeout"""
+        deadline = None if timeout is None else time.time() + timeout
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._queue.all_tasks_done.wait(remaining)
+        return True
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            written = self.stats["written"] or 1
+            return {
+                "format": self.image_format,
+                "quality": self.quality,
+                "max_width": self.max_width,
+                "drop_policy": self.drop_policy,
+                "queue_depth": self._queue.qsize(),
+                "submitted": self.stats["submitted"],
+                "written": self.stats["written"],
+                "dropped": self.stats["dropped"],
+                "failed": self.stats["failed"],
+                "avg_write_ms": round(self.stats["total_write_ms"] / written, 2),
+            }
+
+
+# Tạo instance global
+frame_archive_writer = FrameArchiveWriter()
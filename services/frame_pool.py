@@ -0,0 +1,148 @@
+"""
+Pool buffer frame dùng lại theo độ phân giải: cap.read() ghi thẳng vào mảng đã cấp phát sẵn
+thay vì tạo mảng mới mỗi lần đọc. Frame được chuyển giữa các stage dưới dạng view chỉ đọc,
+chỉ bước vẽ ROI mới tạo bản copy.
+"""
+import logging
+import threading
+import weakref
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+try:
+    from config.settings import FRAME_POOL_ENABLED, FRAME_POOL_MAX_PER_SHAPE
+except ImportError:
+    FRAME_POOL_ENABLED = True
+    FRAME_POOL_MAX_PER_SHAPE = 8
+
+logger = logging.getLogger(__name__)
+
+Shape = Tuple[int, ...]
+
+
+def readonly(frame: np.ndarray) -> np.ndarray:
+    """View chỉ đọc của frame (không copy dữ liệu); vẽ lên view này sẽ báo lỗi"""
+    view = frame.view()
+    view.flags.writeable = False
+    return view
+
+
+def _root(frame: np.ndarray) -> np.ndarray:
+    """Mảng gốc sở hữu dữ liệu của một view"""
+    while isinstance(frame.base, np.ndarray):
+        frame = frame.base
+    return frame
+
+
+def current_rss_mb() -> Optional[float]:
+    """RSS hiện tại của process (MB), None nếu không đọc được (không phải Linux)"""
+    try:
+        with open("/proc/self/statm") as statm:
+            pages = int(statm.read().split()[1])
+        return round(pages * resource.getpagesize() / (1024 * 1024), 1)
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+def peak_rss_mb() -> Optional[float]:
+    """RSS lớn nhất từ khi process khởi động (MB)"""
+    if resource is None:
+        return None
+    # ru_maxrss tính bằng KB trên Linux
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+class FramePool:
+    """
+    Mỗi độ phân giải (height, width, channels) giữ tối đa max_per_shape buffer rảnh.
+    Buffer do pool cấp được trả lại bằng release() khi camera đã xử lý xong; frame không do pool cấp
+    (HTTP snapshot, frame đã chuyển màu) bị bỏ qua khi release. Frame từ process watchdog
+    (CAPTURE_ISOLATION) được nhận thẳng vào buffer của pool.
+    """
+
+    def __init__(self, enabled: bool = FRAME_POOL_ENABLED, max_per_shape: int = FRAME_POOL_MAX_PER_SHAPE):
+        self.enabled = enabled
+        self.max_per_shape = max_per_shape
+        self._lock = threading.Lock()
+        self._free: Dict[Shape, List[np.ndarray]] = defaultdict(list)
+        # Buffer đang được cấp phát, theo id (weakref để buffer bị bỏ quên vẫn được giải phóng bình thường)
+        self._issued: "weakref.WeakValueDictionary[int, np.ndarray]" = weakref.WeakValueDictionary()
+        self.allocated = 0
+        self.reused = 0
+
+    def acquire(self, shape: Shape) -> np.ndarray:
+        """Buffer uint8 có kích thước shape: lấy lại từ pool nếu có, không thì cấp phát mới"""
+        with self._lock:
+            free = self._free.get(shape)
+            if free:
+                buffer = free.pop()
+                self.reused += 1
+            else:
+                buffer = np.empty(shape, dtype=np.uint8)
+                self.allocated += 1
+            self._issued[id(buffer)] = buffer
+            return buffer
+
+    def release(self, *frames: Optional[np.ndarray]):
+        """Trả buffer (hoặc view của buffer) về pool; mỗi buffer chỉ được trả một lần"""
+        if not self.enabled:
+            return
+        with self._lock:
+            for frame in frames:
+                if not isinstance(frame, np.ndarray):
+                    continue
+                buffer = _root(frame)
+                if self._issued.get(id(buffer)) is not buffer:
+                    continue
+                del self._issued[id(buffer)]
+                free = self._free[buffer.shape]
+                if len(free) < self.max_per_shape:
+                    free.append(buffer)
+
+    def read(self, cap: cv2.VideoCapture) -> Optional[np.ndarray]:
+        """
+        cap.read() vào buffer của pool theo độ phân giải của luồng.
+        Returns: view chỉ đọc của frame BGR, hoặc None nếu không đọc được.
+        """
+        buffer = None
+        if self.enabled:
+            width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+            height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+            if width > 0 and height > 0:
+                buffer = self.acquire((height, width, 3))
+
+        ret, frame = cap.read(buffer) if buffer is not None else cap.read()
+        if buffer is not None and (not ret or frame is not buffer):
+            # Đọc lỗi, hoặc luồng trả về kích thước/định dạng khác (OpenCV đã cấp phát mảng mới)
+            self.release(buffer)
+        if not ret or frame is None:
+            return None
+        if len(frame.shape) == 2:
+            frame = cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR)
+        elif frame.shape[2] == 4:
+            frame = cv2.cvtColor(frame, cv2.COLOR_RGBA2BGR)
+        return readonly(frame)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            pooled_bytes = sum(buffer.nbytes for free in self._free.values() for buffer in free)
+            return {
+                "enabled": self.enabled,
+                "allocated": self.allocated,
+                "reused": self.reused,
+                "in_use": len(self._issued),
+                "pooled_mb": round(pooled_bytes / (1024 * 1024), 1),
+                "shapes": [list(shape) for shape, free in self._free.items() if free],
+            }
+
+
+# Tạo instance global
+frame_pool = FramePool()
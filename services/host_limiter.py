@@ -0,0 +1,118 @@
+"""
+Giới hạn số phiên RTSP đồng thời tới cùng một host (NVR có nhiều kênh camera)
+"""
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Any, Callable, Dict, List, Optional, TypeVar
+from urllib.parse import urlsplit
+
+try:
+    from config.settings import MAX_SESSIONS_PER_HOST
+except ImportError:
+    MAX_SESSIONS_PER_HOST = 2
+
+T = TypeVar("T")
+
+_DEFAULT_PORTS = {"rtsp": 554, "rtsps": 322, "http": 80, "https": 443}
+
+
+def host_key(url: Optional[str]) -> str:
+    """host:port của stream (các kênh của cùng một NVR có cùng key)"""
+    try:
+        parts = urlsplit(url or "")
+        port = parts.port or _DEFAULT_PORTS.get(parts.scheme, 554)
+        return f"{(parts.hostname or '').lower()}:{port}"
+    except ValueError:
+        return url or ""
+
+
+def interleave_by_host(items: List[T], host_of: Callable[[T], str]) -> List[T]:
+    """
+    Sắp xếp xen kẽ theo host (round-robin), giữ thứ tự tương đối trong từng host:
+    [A1, A2, A3, B1, C1] -> [A1, B1, C1, A2, A3]
+    """
+    groups: Dict[str, deque] = {}
+    for item in items:
+        groups.setdefault(host_of(item), deque()).append(item)
+    ordered = []
+    while groups:
+        for host in list(groups):
+            ordered.append(groups[host].popleft())
+            if not groups[host]:
+                del groups[host]
+    return ordered
+
+
+class HostConcurrencyLimiter:
+    """
+    Đếm số phiên đang mở theo host. Bên điều phối chọn camera đầu tiên (trong danh sách
+    đã xen kẽ theo host) có host còn slot, nên một NVR đầy slot không chặn camera của host khác.
+    """
+
+    def __init__(self, per_host: int = MAX_SESSIONS_PER_HOST):
+        self.per_host = per_host
+        self._cond = threading.Condition()
+        self._active: Dict[str, int] = defaultdict(int)
+        self._peak: Dict[str, int] = defaultdict(int)
+
+    def acquire_first(self, items: List[T], host_of: Callable[[T], str], timeout: float) -> Optional[T]:
+        """
+        Giữ một slot cho item đầu tiên có host chưa đầy và trả về item đó;
+        chờ tối đa timeout giây cho tới khi có slot được trả, không có thì trả về None.
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                for item in items:
+                    host = host_of(item)
+                    if self._active.get(host, 0) < self.per_host:
+                        self._active[host] += 1
+                        self._peak[host] = max(self._peak[host], self._active[host])
+                        return item
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+
+    def acquire_many(self, counts: Dict[str, int], timeout: float) -> bool:
+        """
+        Giữ cùng lúc counts[host] slot trên mỗi host cho một nhóm camera chụp đồng bộ (tất cả hoặc không).
+        Nhóm cần nhiều phiên trên một host hơn per_host thì chờ host rảnh hoàn toàn rồi giữ riêng host đó
+        (vượt per_host, vì các camera của nhóm phải mở phiên cùng lúc).
+        Trả slot bằng release() cho từng camera. False nếu hết timeout.
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                if all(self._active.get(host, 0) + count <= self.per_host
+                       or (count > self.per_host and self._active.get(host, 0) == 0)
+                       for host, count in counts.items()):
+                    for host, count in counts.items():
+                        self._active[host] += count
+                        self._peak[host] = max(self._peak[host], self._active[host])
+                    return True
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+
+    def release(self, host: str):
+        with self._cond:
+            if self._active[host] > 0:
+                self._active[host] -= 1
+            if self._active[host] == 0:
+                del self._active[host]
+            self._cond.notify_all()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "max_sessions_per_host": self.per_host,
+                "active": dict(self._active),
+                "peak": dict(self._peak),
+            }
+
+
+# Tạo instance global
+host_concurrency_limiter = HostConcurrencyLimiter()
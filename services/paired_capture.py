@@ -0,0 +1,138 @@
+"""
+Chụp đồng bộ các camera trong một cặp tính độ lún (QR di động / QR cố định):
+mỗi camera mở phiên trước, chờ nhau tại một barrier rồi mới đọc frame,
+nên hai frame cách nhau trong khoảng một frame thay vì vài giây
+"""
+import logging
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from services.capture_warmup import capture_warmup_pool
+
+try:
+    from config.settings import PAIR_SYNC_TIMEOUT_SECONDS
+except ImportError:
+    PAIR_SYNC_TIMEOUT_SECONDS = 10
+
+logger = logging.getLogger(__name__)
+
+
+def pair_groups(pairs: List[Dict[str, Any]]) -> Dict[Any, str]:
+    """
+    Gom các cặp có chung camera thành nhóm (ví dụ một camera mốc dùng cho nhiều camera di động).
+    Returns: {camera_id: group_key}
+    """
+    parent: Dict[Any, Any] = {}
+
+    def find(camera_id):
+        parent.setdefault(camera_id, camera_id)
+        while parent[camera_id] != camera_id:
+            parent[camera_id] = parent[parent[camera_id]]
+            camera_id = parent[camera_id]
+        return camera_id
+
+    for pair in pairs:
+        root_movable, root_fixed = find(pair['camera_id_movable']), find(pair['camera_id_fixed'])
+        if root_movable != root_fixed:
+            parent[max(root_movable, root_fixed)] = min(root_movable, root_fixed)
+    return {camera_id: f"pair:{find(camera_id)}" for camera_id in parent}
+
+
+class PairSync:
+    """
+    Barrier cho một nhóm camera trong một lượt chạy. Thread cuối cùng tới barrier ghi thời điểm
+    chung (captured_at) cho cả nhóm. Camera lỗi trước khi tới barrier gọi abort() để các camera
+    còn lại không phải chờ hết timeout; khi đó chúng đọc frame không đồng bộ.
+    """
+
+    def __init__(self, key: str, parties: int, timeout: float = PAIR_SYNC_TIMEOUT_SECONDS):
+        self.key = key
+        self.parties = parties
+        self.captured_at: Optional[datetime] = None
+        self._barrier = threading.Barrier(parties, action=self._release, timeout=timeout)
+
+    def _release(self):
+        self.captured_at = datetime.now()
+
+    @property
+    def broken(self) -> bool:
+        return self._barrier.broken
+
+    def capture(self, rtsp_url: str, backend, capture_url: str, count: int = 1) -> Tuple[List[np.ndarray], Optional[str]]:
+        """
+        Lấy frame cho một camera của nhóm: phiên warm-up (nếu có) hoặc mở phiên mới,
+        chờ barrier, rồi đọc count frame. Mỗi camera chỉ chờ barrier một lần.
+        """
+        waited = False
+
+        def wait_for_group():
+            nonlocal waited
+            if waited:
+                return
+            waited = True
+            try:
+                self._barrier.wait()
+            except threading.BrokenBarrierError:
+                logger.warning(f"🔗 Nhóm {self.key}: không đủ {self.parties} camera tới barrier, chụp không đồng bộ")
+
+        try:
+            if capture_warmup_pool.has(rtsp_url):
+                wait_for_group()
+                frames = capture_warmup_pool.take_burst(rtsp_url, count)
+                if frames:
+                    return frames, None
+            return backend.grab_burst(capture_url, count, before_read=wait_for_group)
+        finally:
+            if not waited:
+                # Lỗi trước khi tới barrier (không mở được phiên): giải phóng các camera đang chờ
+                self._barrier.abort()
+
+
+class PairedCaptureEngine:
+    """
+    Bọc capture engine: camera thuộc một nhóm cặp (camera_pairs) được gắn PairSync ('pair_sync')
+    và cùng start_offset nhỏ nhất của nhóm để được điều phối vào capture cùng lúc.
+    Engine nhận camera đại diện sau khi gộp nguồn trùng (DedupedEngine), nên số bên của barrier
+    là số nguồn RTSP thực sự được chụp; nhóm chỉ còn một nguồn thì không cần đồng bộ.
+    Engine bên trong điều phối cả nhóm như một đơn vị (giữ đủ slot host, thread riêng cho nhóm),
+    nên nhóm lớn hơn số capture worker vẫn tới được barrier.
+    """
+
+    def __init__(self, engine, groups: Dict[Any, str], sync_timeout: float = PAIR_SYNC_TIMEOUT_SECONDS):
+        self.engine = engine
+        self.groups = groups
+        self.sync_timeout = sync_timeout
+
+    @property
+    def last_stats(self):
+        return self.engine.last_stats
+
+    def run(self, cameras: List[Dict[str, Any]], scheduled_for: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        groups = self.groups
+        members: Dict[str, List[Dict[str, Any]]] = {}
+        for camera in cameras:
+            camera_ids = [member["camera_id"] for member in camera.get('members', [])] or [camera.get('camera_id')]
+            key = next((groups[camera_id] for camera_id in camera_ids if camera_id in groups), None)
+            if key is not None:
+                members.setdefault(key, []).append(camera)
+
+        for key, group in members.items():
+            if len(group) < 2:
+                continue
+            sync = PairSync(key, len(group), timeout=self.sync_timeout)
+            start_offset = min(camera.get('start_offset') or 0.0 for camera in group)
+            for camera in group:
+                camera['pair_sync'] = sync
+                camera['start_offset'] = start_offset
+            logger.info(f"🔗 Nhóm {key}: chụp đồng bộ {len(group)} camera")
+
+        results = self.engine.run(cameras, scheduled_for)
+        synced = {camera.get('camera_id'): camera['pair_sync'] for camera in cameras if 'pair_sync' in camera}
+        for result in results:
+            sync = synced.get(result.get("camera_id"))
+            if sync is not None:
+                result["pair_synced"] = sync.captured_at is not None and not sync.broken
+        return results
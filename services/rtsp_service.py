@@ -4,6 +4,7 @@ from typing import Optional, Tuple, Dict, Any
 import logging
 import time
 from services.database_service import database_service
+from services.capture_backends import resolve_backend
 # Cấu hình logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -14,57 +15,32 @@ class RTSPService:
         self.current_frame = None
         self.rois = []
     
-    def get_frame_from_rtsp(self, rtsp_url: str) -> Optional[np.ndarray]:
-    
+    def get_frame_from_rtsp(self, rtsp_url: str, camera: Optional[Dict[str, Any]] = None) -> Optional[np.ndarray]:
+        """
+        Lấy một frame qua capture backend của camera (resolve_backend: opencv/ffmpeg/HTTP snapshot,
+        có timeout kết nối/đọc). camera là bản ghi cameras (capture_backend, snapshot_url) nếu có.
+        """
         try:
-            # Tạo VideoCapture object
-            self.cap = cv2.VideoCapture(rtsp_url)
-            
-            # Thiết lập timeout cho RTSP
-            self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
-            
-            # Kiểm tra xem stream có được mở thành công không
-            if not self.cap.isOpened():
-                logger.error(f"Không thể mở RTSP stream: {rtsp_url}")
-                return None
-            
-            # Đọc frame với timeout
-            ret, frame = self.cap.read()
-            
-            if not ret or frame is None:
-                logger.error("Không thể đọc frame từ RTSP stream")
+            backend, capture_url = resolve_backend(dict(camera or {}, rtsp_url=rtsp_url))
+            frame, reason = backend.grab(capture_url)
+            if frame is None:
+                logger.error(f"Không thể lấy frame từ {capture_url} (backend {backend.name}): {reason}")
                 return None
-            
-            # Chuyển đổi frame sang BGR nếu cần (đảm bảo format nhất quán)
-            if len(frame.shape) == 2:
-                # Nếu là grayscale, chuyển sang BGR
-                frame = cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR)
-            elif frame.shape[2] == 4:
-                # Nếu là RGBA, chuyển sang BGR
-                frame = cv2.cvtColor(frame, cv2.COLOR_RGBA2BGR)
-            
+
             # Cập nhật thông tin frame hiện tại
             self.current_frame = frame
-           
 
-            
             # Log thông tin frame
             height, width = frame.shape[:2]
-            logger.info(f"✅ Đã lấy frame thành công từ: {rtsp_url}")
+            logger.info(f"✅ Đã lấy frame thành công từ: {capture_url}")
             logger.info(f"📊 Thông tin frame: {width}x{height}, Channels: {frame.shape[2] if len(frame.shape) > 2 else 1}")
-            
+
             return frame
-            
+
         except Exception as e:
             logger.error(f"❌ Lỗi khi lấy frame từ RTSP: {str(e)}")
             return None
-        finally:
-            # Đóng stream sau khi đọc frame
-            if self.cap is not None:
-                self.cap.release()
-                self.cap = None
 
-   
     def qr_detection_saveToDb(self, frame_to_process: np.ndarray):
         """
         Phát hiện QR codes từ một frame được cung cấp và lưu vào database.
@@ -456,7 +432,8 @@ class RTSPService:
         print(f"Tổng số QR codes phát hiện trong lần chạy này: {len(detected_qr_codes)}")
 
         return new_rois  # <-- Trả về danh sách các tuple (rect, name, roi_width, center_x, center_y)
-    def process_unit_conversion(self, rtsp_url: str, input_size_value: float):
+    def process_unit_conversion(self, rtsp_url: str, input_size_value: float,
+                                camera: Optional[Dict[str, Any]] = None):
         """
         Lấy frame từ RTSP, phát hiện QR codes và tính toán hệ số chuyển đổi.
         
@@ -464,13 +441,14 @@ class RTSPService:
             rtsp_url (str): URL của RTSP stream
             input_size_value (float): Kích thước thực tế của QR code (mm)
             target_unit (str): Đơn vị đích (mặc định "mm")
+            camera (dict): capture_backend / snapshot_url của camera để lấy frame đúng backend
         """
         print(f"🔄 Đang xử lý chuyển đổi đơn vị...")
         print(f"RTSP URL: {rtsp_url}")
         print(f"Input size value: {input_size_value} mm")
         
         # 1. Lấy frame từ RTSP
-        frame = self.get_frame_from_rtsp(rtsp_url)
+        frame = self.get_frame_from_rtsp(rtsp_url, camera)
         if frame is None:
             print("❌ Không thể lấy frame từ RTSP stream")
             return None
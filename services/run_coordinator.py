@@ -0,0 +1,118 @@
+"""
+Điều phối các lượt capture theo lịch: mỗi thời điểm chỉ một lượt chạy,
+lượt đến khi lượt trước chưa xong được xử lý theo policy skip / queue / coalesce
+"""
+import logging
+import threading
+import uuid
+from collections import deque
+from datetime import datetime
+from typing import Callable, Deque, Dict, Optional, Tuple
+
+from services.thread_safe_db_service import thread_safe_db_service
+
+try:
+    from config.settings import RUN_OVERLAP_POLICY, RUN_QUEUE_MAX
+except ImportError:
+    RUN_OVERLAP_POLICY = "coalesce"
+    RUN_QUEUE_MAX = 3
+
+logger = logging.getLogger(__name__)
+
+OVERLAP_POLICIES = ("skip", "queue", "coalesce")
+
+# (run_id, scheduled_for, trigger_source)
+PendingRun = Tuple[str, datetime, str]
+
+
+class RunCoordinator:
+    """
+    - skip: bỏ lượt mới nếu đang có lượt chạy
+    - queue: xếp hàng tối đa max_queued lượt, chạy lần lượt sau lượt hiện tại
+    - coalesce: chỉ giữ một lượt chờ, lượt mới thay thế lượt chờ cũ (chạy với thời điểm mới nhất)
+    Lượt chờ được chạy tiếp trên chính thread vừa kết thúc lượt trước,
+    nên thread của cron trigger đến sau luôn trả về ngay.
+    Mỗi lượt có run_id và được ghi vào bảng capture_runs (kể cả lượt bị bỏ/gộp).
+    """
+
+    def __init__(self, runner: Callable[[str, datetime], Optional[Dict[str, int]]],
+                 policy: str = RUN_OVERLAP_POLICY, max_queued: int = RUN_QUEUE_MAX,
+                 node_id: Optional[str] = None):
+        if policy not in OVERLAP_POLICIES:
+            raise ValueError(f"RUN_OVERLAP_POLICY không hợp lệ: {policy}")
+        self.runner = runner
+        self.policy = policy
+        self.max_queued = max_queued
+        self.node_id = node_id
+        self._lock = threading.Lock()
+        self._active: Optional[PendingRun] = None
+        self._pending: Deque[PendingRun] = deque()
+
+    @staticmethod
+    def new_run_id() -> str:
+        return uuid.uuid4().hex[:12]
+
+    @property
+    def active_run_id(self) -> Optional[str]:
+        with self._lock:
+            return self._active[0] if self._active else None
+
+    def submit(self, scheduled_for: datetime, trigger_source: str = "cron") -> Optional[str]:
+        """
+        Yêu cầu một lượt chạy cho thời điểm lịch scheduled_for.
+        Returns: run_id nếu lượt được chạy/xếp hàng, None nếu bị bỏ.
+        """
+        run = (self.new_run_id(), scheduled_for, trigger_source)
+        with self._lock:
+            if self._active is not None:
+                return self._handle_overlap(run)
+            self._active = run
+
+        self._drain(run)
+        return run[0]
+
+    def _handle_overlap(self, run: PendingRun) -> Optional[str]:
+        """Gọi khi đang giữ _lock và có lượt đang chạy"""
+        run_id, scheduled_for, trigger_source = run
+        active_run_id = self._active[0]
+
+        if self.policy == "skip" or (self.policy == "queue" and len(self._pending) >= self.max_queued):
+            logger.warning(f"⏭️ [run {run_id}] Bỏ lượt {scheduled_for:%H:%M}: lượt {active_run_id} chưa hoàn thành")
+            thread_safe_db_service.record_capture_run_safe(run_id, scheduled_for, trigger_source, "skipped",
+                                                   self.node_id)
+            return None
+
+        if self.policy == "coalesce" and self._pending:
+            replaced_id, replaced_time, replaced_source = self._pending.popleft()
+            logger.info(f"🔗 [run {replaced_id}] Lượt chờ {replaced_time:%H:%M} được gộp vào lượt {run_id}")
+            thread_safe_db_service.record_capture_run_safe(replaced_id, replaced_time, replaced_source,
+                                                   "coalesced", self.node_id)
+
+        self._pending.append(run)
+        logger.info(f"⏳ [run {run_id}] Lượt {scheduled_for:%H:%M} chờ lượt {active_run_id} hoàn thành "
+                    f"(policy: {self.policy}, đang chờ: {len(self._pending)})")
+        return run_id
+
+    def _drain(self, run: PendingRun):
+        """Chạy lượt hiện tại rồi lần lượt các lượt đang chờ"""
+        while run is not None:
+            self._execute(run)
+            with self._lock:
+                run = self._pending.popleft() if self._pending else None
+                self._active = run
+
+    def _execute(self, run: PendingRun):
+        run_id, scheduled_for, trigger_source = run
+        thread_safe_db_service.record_capture_run_safe(run_id, scheduled_for, trigger_source, "running",
+                                               self.node_id)
+        try:
+            summary = self.runner(run_id, scheduled_for)
+            if summary is None:
+                thread_safe_db_service.finish_capture_run_safe(run_id, "failed")
+                return
+            thread_safe_db_service.finish_capture_run_safe(run_id, "completed",
+                                                           summary.get("camera_count", 0),
+                                                           summary.get("success_count", 0))
+        except Exception as e:
+            logger.error(f"❌ [run {run_id}] Lượt chạy thất bại: {e}")
+            thread_safe_db_service.finish_capture_run_safe(run_id, "failed")
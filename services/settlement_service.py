@@ -0,0 +1,41 @@
+"""
+Công thức tính độ lún dùng chung cho biểu đồ và stream realtime
+"""
+from typing import Dict, Optional
+
+
+def compute_settlement(ym, yr, ym0, yr0, Sb, Sa) -> float:
+    """
+    Độ lún = (ym - ym0) * Sb - (yr - yr0) * Sa
+    - ym, ym0: y hiện tại / ban đầu của QR di động (camera có hệ số Sb)
+    - yr, yr0: y hiện tại / ban đầu của QR cố định (camera có hệ số Sa)
+    """
+    # Ép kiểu float để tránh lỗi Decimal * float
+    delta_ym = float(ym) - float(ym0)
+    delta_yr = float(yr) - float(yr0)
+    return delta_ym * float(Sb) - delta_yr * float(Sa)
+
+
+def load_pair_context(cursor, qr_code_id_movable: int, qr_code_id_fixed: int,
+                      camera_id_movable: int, camera_id_fixed: int) -> Optional[Dict]:
+    """
+    Lấy conversion_rate của 2 camera và initial_y của 2 QR.
+    Trả về None nếu thiếu thông tin.
+    """
+    cursor.execute("SELECT camera_id, conversion_rate FROM cameras WHERE camera_id IN (%s, %s)",
+                   (camera_id_movable, camera_id_fixed))
+    rates = {row['camera_id']: float(row['conversion_rate']) for row in cursor.fetchall()}
+
+    cursor.execute("SELECT qr_code_id, initial_y FROM qr_codes WHERE qr_code_id IN (%s, %s)",
+                   (qr_code_id_movable, qr_code_id_fixed))
+    initials = {row['qr_code_id']: row['initial_y'] for row in cursor.fetchall()}
+
+    context = {
+        "Sb": rates.get(camera_id_movable),
+        "Sa": rates.get(camera_id_fixed),
+        "ym0": initials.get(qr_code_id_movable),
+        "yr0": initials.get(qr_code_id_fixed),
+    }
+    if any(value is None for value in context.values()):
+        return None
+    return context
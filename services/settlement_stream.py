@@ -0,0 +1,222 @@
+"""
+Pub/sub hub đẩy điểm độ lún mới tới client (SSE) ngay khi pipeline ghi measurement.
+Measurement do process khác ghi (worker chạy riêng, node khác trong cluster) được nhận
+qua việc poll latest_measurements của các QR đang có subscriber.
+"""
+import asyncio
+import logging
+import threading
+import time
+from typing import Any, Dict, Optional, Set, Tuple
+
+from services.settlement_service import compute_settlement, load_pair_context
+from services.thread_safe_db_service import thread_safe_db_service
+
+logger = logging.getLogger(__name__)
+
+try:
+    from config.settings import SETTLEMENT_STREAM_QUEUE_SIZE, SETTLEMENT_STREAM_POLL_SECONDS
+except ImportError:
+    SETTLEMENT_STREAM_QUEUE_SIZE = 100
+    SETTLEMENT_STREAM_POLL_SECONDS = 2
+
+# (qr_code_id_movable, qr_code_id_fixed, camera_id_movable, camera_id_fixed)
+PairKey = Tuple[int, int, int, int]
+
+
+class _Subscriber:
+    def __init__(self, loop: asyncio.AbstractEventLoop, maxsize: int):
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+
+    def deliver(self, event: Dict[str, Any]):
+        """Chạy trên event loop của subscriber; bỏ event cũ nhất nếu client đọc chậm"""
+        if self.queue.full():
+            try:
+                self.queue.get_nowait()
+            except asyncio.QueueEmpty:
+                pass
+        self.queue.put_nowait(event)
+
+
+class _PairState:
+    def __init__(self, key: PairKey, context: Dict):
+        self.key = key
+        self.context = context
+        self.ym = context["ym0"]
+        self.yr = context["yr0"]
+        # measurement_id mới nhất đã áp dụng của từng QR (bỏ event trùng giữa publish và poll)
+        self.last_ids: Dict[int, int] = {}
+        self.subscribers: Set[_Subscriber] = set()
+
+
+class SettlementStreamHub:
+    """
+    Mỗi cặp (movable, fixed, cameras) có một state chung. Khi measurement của một
+    trong hai QR được ghi, độ lún được tính một lần rồi gửi tới mọi subscriber của cặp đó.
+    Nguồn measurement:
+    - publish_measurement: pipeline trong cùng process vừa ghi measurement
+    - thread poll: mỗi poll_seconds đọc latest_measurements của các QR đang được subscribe
+      (measurement do process/node khác ghi); chỉ giá trị mới nhất của mỗi QR được đẩy
+    """
+
+    def __init__(self, queue_size: int = SETTLEMENT_STREAM_QUEUE_SIZE,
+                 poll_seconds: float = SETTLEMENT_STREAM_POLL_SECONDS):
+        self.queue_size = queue_size
+        self.poll_seconds = poll_seconds
+        self._lock = threading.Lock()
+        self._pairs: Dict[PairKey, _PairState] = {}
+        self._pairs_by_qr: Dict[int, Set[PairKey]] = {}
+        self._poller: Optional[threading.Thread] = None
+
+    def _load_state(self, key: PairKey) -> Optional[_PairState]:
+        """Đọc hệ số camera, initial_y và giá trị mới nhất của 2 QR từ database"""
+        qr_code_id_movable, qr_code_id_fixed, camera_id_movable, camera_id_fixed = key
+        with thread_safe_db_service.get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                context = load_pair_context(cursor, qr_code_id_movable, qr_code_id_fixed,
+                                            camera_id_movable, camera_id_fixed)
+                if context is None:
+                    return None
+                state = _PairState(key, context)
+                cursor.execute(
+                    "SELECT qr_code_id, measurement_id, y FROM latest_measurements WHERE qr_code_id IN (%s, %s)",
+                    (qr_code_id_movable, qr_code_id_fixed)
+                )
+                for row in cursor.fetchall():
+                    if row["qr_code_id"] == qr_code_id_movable:
+                        state.ym = row["y"]
+                    if row["qr_code_id"] == qr_code_id_fixed:
+                        state.yr = row["y"]
+                    state.last_ids[row["qr_code_id"]] = row["measurement_id"]
+        return state
+
+    def subscribe(self, key: PairKey, loop: asyncio.AbstractEventLoop) -> Optional[_Subscriber]:
+        """
+        Đăng ký nhận điểm độ lún của một cặp; event được đưa vào queue trên loop truyền vào.
+        Có thể đọc database nên nên gọi qua asyncio.to_thread.
+        Trả về None nếu cặp không hợp lệ.
+        """
+        with self._lock:
+            state = self._pairs.get(key)
+        if state is None:
+            state = self._load_state(key)
+            if state is None:
+                return None
+
+        subscriber = _Subscriber(loop, self.queue_size)
+        with self._lock:
+            # Một subscriber khác có thể đã tạo state trong lúc đọc database
+            state = self._pairs.setdefault(key, state)
+            state.subscribers.add(subscriber)
+            self._pairs_by_qr.setdefault(key[0], set()).add(key)
+            self._pairs_by_qr.setdefault(key[1], set()).add(key)
+            self._ensure_poller()
+        logger.info(f"📡 Subscriber mới cho cặp {key} ({len(state.subscribers)} subscriber)")
+        return subscriber
+
+    def unsubscribe(self, key: PairKey, subscriber: _Subscriber):
+        """Huỷ đăng ký; xoá state của cặp khi không còn subscriber"""
+        with self._lock:
+            state = self._pairs.get(key)
+            if state is None:
+                return
+            state.subscribers.discard(subscriber)
+            if not state.subscribers:
+                del self._pairs[key]
+                for qr_code_id in (key[0], key[1]):
+                    keys = self._pairs_by_qr.get(qr_code_id)
+                    if keys is not None:
+                        keys.discard(key)
+                        if not keys:
+                            del self._pairs_by_qr[qr_code_id]
+
+    def current_point(self, key: PairKey) -> Optional[Dict[str, Any]]:
+        """Điểm độ lún hiện tại của cặp (từ giá trị mới nhất đã biết)"""
+        with self._lock:
+            state = self._pairs.get(key)
+            if state is None:
+                return None
+            return {
+                "settlement": compute_settlement(state.ym, state.yr, **state.context)
+            }
+
+    def publish_measurement(self, measurement: Dict[str, Any]):
+        """
+        Gọi từ worker thread của pipeline sau khi ghi measurement (hoặc từ thread poll).
+        Tính độ lún một lần cho mỗi cặp liên quan và phát tới các event loop của subscriber;
+        measurement đã áp dụng (cùng hoặc cũ hơn measurement_id đã thấy) bị bỏ qua.
+        """
+        qr_code_id = measurement.get("qr_code_id")
+        measurement_id = measurement.get("measurement_id")
+        with self._lock:
+            keys = list(self._pairs_by_qr.get(qr_code_id, ()))
+            deliveries = []
+            for key in keys:
+                state = self._pairs[key]
+                last_id = state.last_ids.get(qr_code_id)
+                if measurement_id is not None and last_id is not None and measurement_id <= last_id:
+                    continue
+                if measurement_id is not None:
+                    state.last_ids[qr_code_id] = measurement_id
+                if qr_code_id == key[0]:
+                    state.ym = measurement["y"]
+                if qr_code_id == key[1]:
+                    state.yr = measurement["y"]
+                tracking_time = measurement.get("tracking_time")
+                event = {
+                    "time": tracking_time.isoformat() if tracking_time is not None else None,
+                    "settlement": compute_settlement(state.ym, state.yr, **state.context),
+                    "qr_code_id": qr_code_id,
+                }
+                deliveries.extend((subscriber, event) for subscriber in state.subscribers)
+
+        for subscriber, event in deliveries:
+            try:
+                subscriber.loop.call_soon_threadsafe(subscriber.deliver, event)
+            except RuntimeError:
+                # Event loop đã đóng (client/app đã dừng)
+                pass
+
+    # ==================== POLL ====================
+
+    def _ensure_poller(self):
+        """Khởi động thread poll khi có subscriber đầu tiên (gọi khi đang giữ _lock)"""
+        if self._poller is not None and self._poller.is_alive():
+            return
+        self._poller = threading.Thread(target=self._poll_loop, name="SettlementStreamPoller", daemon=True)
+        self._poller.start()
+
+    def poll_once(self):
+        """Đọc latest_measurements của các QR đang được subscribe và phát measurement mới"""
+        with self._lock:
+            qr_code_ids = sorted(self._pairs_by_qr)
+        if not qr_code_ids:
+            return
+        placeholders = ", ".join(["%s"] * len(qr_code_ids))
+        with thread_safe_db_service.get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(f"""
+                SELECT qr_code_id, measurement_id, y, tracking_time
+                FROM latest_measurements WHERE qr_code_id IN ({placeholders})
+                """, qr_code_ids)
+                rows = cursor.fetchall()
+        for row in rows:
+            self.publish_measurement(row)
+
+    def _poll_loop(self):
+        while True:
+            time.sleep(self.poll_seconds)
+            with self._lock:
+                if not self._pairs:
+                    # Không còn subscriber: dừng thread, subscriber mới sẽ khởi động lại
+                    self._poller = None
+                    return
+            try:
+                self.poll_once()
+            except Exception as e:
+                logger.error(f"❌ Lỗi khi poll latest_measurements cho SSE: {e}")
+
+
+# Tạo instance global
+settlement_stream_hub = SettlementStreamHub()
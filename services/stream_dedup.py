@@ -0,0 +1,110 @@
+"""
+Gộp các camera cùng trỏ tới một luồng RTSP: mỗi nguồn chỉ được capture và phát hiện QR
+một lần mỗi lượt, kết quả được gán cho từng camera tham chiếu tới nguồn đó
+"""
+import logging
+from datetime import datetime
+from typing import Any, Collection, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from services.capture_backends import resolve_backend
+
+logger = logging.getLogger(__name__)
+
+_DEFAULT_PORTS = {"rtsp": 554, "rtsps": 322, "http": 80, "https": 443}
+
+
+def normalize_rtsp_url(url: Optional[str]) -> str:
+    """
+    Chuẩn hoá URL để so sánh nguồn: scheme/host chữ thường, thêm port mặc định,
+    bỏ thông tin đăng nhập, bỏ '/' cuối path và sắp xếp query string.
+    """
+    if not url:
+        return ""
+    try:
+        parts = urlsplit(url.strip())
+        scheme = parts.scheme.lower()
+        port = parts.port or _DEFAULT_PORTS.get(scheme)
+        netloc = (parts.hostname or "").lower() + (f":{port}" if port else "")
+        path = parts.path.rstrip("/") or "/"
+        query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+        return urlunsplit((scheme, netloc, path, query, ""))
+    except ValueError:
+        return url.strip()
+
+
+def _member(camera: Dict[str, Any]) -> Dict[str, Any]:
+    return {"camera_id": camera.get('camera_id'), "name": camera.get('name', 'N/A')}
+
+
+def source_key(camera: Dict[str, Any]) -> Optional[Tuple[str, str, str]]:
+    """
+    Khoá của nguồn: URL RTSP đã chuẩn hoá, backend capture và snapshot_url.
+    Hai camera cùng rtsp_url nhưng khác backend/snapshot_url lấy frame theo cách khác nhau nên không gộp.
+    """
+    url = normalize_rtsp_url(camera.get('rtsp_url'))
+    if not url:
+        return None
+    backend, _ = resolve_backend(camera)
+    return url, backend.name, normalize_rtsp_url(camera.get('snapshot_url'))
+
+
+class DedupedEngine:
+    """
+    Bọc một capture engine: gom camera theo nguồn (source_key), chạy engine với một camera
+    đại diện cho mỗi nguồn (kèm danh sách 'members'), rồi nhân kết quả cho từng camera.
+    Engine ghi measurements cho mọi member từ cùng một frame và cùng kết quả detect.
+    paired: camera_id thuộc một cặp chụp đồng bộ; camera đó được ưu tiên làm đại diện của nguồn.
+    """
+
+    def __init__(self, engine, paired: Collection[Any] = ()):
+        self.engine = engine
+        self.paired = paired
+
+    @property
+    def last_stats(self):
+        return self.engine.last_stats
+
+    @staticmethod
+    def group_by_source(cameras: List[Dict[str, Any]], paired: Collection[Any] = ()) -> List[Dict[str, Any]]:
+        groups: Dict[Tuple[str, str, str], int] = {}
+        representatives = []
+        for camera in cameras:
+            key = source_key(camera)
+            if key is None:
+                # Không có URL: để engine tự báo lỗi như trước
+                representatives.append(dict(camera, members=[_member(camera)]))
+                continue
+            index = groups.get(key)
+            if index is None:
+                groups[key] = len(representatives)
+                representatives.append(dict(camera, members=[_member(camera)]))
+                continue
+            representative = representatives[index]
+            representative['members'].append(_member(camera))
+            if camera.get('camera_id') in paired and representative.get('camera_id') not in paired:
+                # Camera của cặp làm đại diện để PairSync, start_offset và shard_key theo camera đó
+                representatives[index] = dict(camera, members=representative['members'])
+        return representatives
+
+    def run(self, cameras: List[Dict[str, Any]], scheduled_for: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        representatives = self.group_by_source(cameras, self.paired)
+        shared = len(cameras) - len(representatives)
+        if shared:
+            logger.info(f"🔗 {len(cameras)} camera dùng {len(representatives)} nguồn RTSP, bỏ {shared} lần capture trùng")
+
+        results = self.engine.run(representatives, scheduled_for)
+        members_by_id = {representative.get('camera_id'): representative['members']
+                         for representative in representatives}
+
+        expanded = []
+        for result in results:
+            members = members_by_id.get(result.get("camera_id")) or [
+                {"camera_id": result.get("camera_id"), "name": result.get("camera_name")}
+            ]
+            for member in members:
+                member_result = dict(result, camera_id=member["camera_id"], camera_name=member["name"])
+                if len(members) > 1:
+                    member_result["shared_source"] = True
+                expanded.append(member_result)
+        return expanded
@@ -4,7 +4,7 @@ Thread-safe database service for concurrent camera processing
 import threading
 import logging
 from contextlib import contextmanager
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Tuple
 from db.database import get_connection
 from datetime import datetime, time
 logger = logging.getLogger(__name__)
@@ -89,34 +89,342 @@ class ThreadSafeDatabaseService:
             logger.error(f"Error getting QR code by ID: {e}")
             return None
     
-    def create_measurement_safe(self, x: int, y: int, qr_code_id: int) -> Optional[Dict[str, Any]]:
+    def create_measurement_safe(self, x: int, y: int, qr_code_id: int,
+                                camera_id: Optional[int] = None,
+                                tracking_time: Optional[datetime] = None,
+                                captured_at: Optional[datetime] = None,
+                                sample_count: Optional[int] = None,
+                                center_dispersion: Optional[float] = None) -> Optional[Dict[str, Any]]:
         """
         Thread-safe method to create measurement
+        tracking_time: thời điểm logic của lịch chụp (mặc định: hiện tại)
+        captured_at: thời điểm thực tế lấy frame (mặc định: hiện tại)
+        sample_count/center_dispersion: số frame và độ phân tán tâm (pixel) khi (x, y) được gộp từ burst
         """
         try:
             with self.get_db_connection() as conn:
                 with conn.cursor() as cursor:
-                    current_time = datetime.now()
+                    now = datetime.now()
+                    current_time = tracking_time or now
+                    captured_at = captured_at or now
                     query = """
-                    INSERT INTO measurements (x, y, qr_code_id,tracking_time)
-                    VALUES (%s, %s, %s, %s)
+                    INSERT INTO measurements (x, y, qr_code_id, camera_id, tracking_time, captured_at,
+                                              sample_count, center_dispersion)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
                     """
-                    cursor.execute(query, (x, y, qr_code_id,current_time))
-                    conn.commit()
+                    cursor.execute(query, (x, y, qr_code_id, camera_id, current_time, captured_at,
+                                           sample_count, center_dispersion))
                     
                     # Lấy ID của measurement vừa tạo
                     measurement_id = cursor.lastrowid
+
+                    # Cập nhật giá trị mới nhất của QR trong cùng transaction
+                    self._upsert_latest_measurement(cursor, measurement_id, x, y, qr_code_id,
+                                                    camera_id, current_time)
+                    conn.commit()
                     
                     return {
                         "measurement_id": measurement_id,
                         "x": x,
                         "y": y,
-                        "qr_code_id": qr_code_id
+                        "qr_code_id": qr_code_id,
+                        "camera_id": camera_id,
+                        "tracking_time": current_time,
+                        "captured_at": captured_at,
+                        "sample_count": sample_count,
+                        "center_dispersion": center_dispersion
                     }
         except Exception as e:
             logger.error(f"Error creating measurement: {e}")
             return None
     
+    @staticmethod
+    def _upsert_latest_measurement(cursor, measurement_id: int, x: int, y: int, qr_code_id: int,
+                                   camera_id: Optional[int], tracking_time: datetime):
+        """
+        Ghi đè dòng latest_measurements của QR nếu measurement mới hơn dòng hiện có
+        """
+        query = """
+        INSERT INTO latest_measurements (qr_code_id, measurement_id, camera_id, x, y, tracking_time)
+        VALUES (%s, %s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            measurement_id = IF(VALUES(tracking_time) >= tracking_time, VALUES(measurement_id), measurement_id),
+            camera_id = IF(VALUES(tracking_time) >= tracking_time, VALUES(camera_id), camera_id),
+            x = IF(VALUES(tracking_time) >= tracking_time, VALUES(x), x),
+            y = IF(VALUES(tracking_time) >= tracking_time, VALUES(y), y),
+            tracking_time = GREATEST(tracking_time, VALUES(tracking_time))
+        """
+        cursor.execute(query, (qr_code_id, measurement_id, camera_id, x, y, tracking_time))
+
+    def get_latest_measurements_safe(self) -> List[Dict[str, Any]]:
+        """
+        Lấy giá trị đo mới nhất của tất cả QR codes trong một lần đọc
+        """
+        try:
+            with self.get_db_connection() as conn:
+                with conn.cursor() as cursor:
+                    query = """
+                    SELECT q.qr_code_id, q.name_roi, q.initial_x, q.initial_y,
+                           l.measurement_id, l.camera_id, l.x, l.y, l.tracking_time,
+                           c.conversion_rate
+                    FROM qr_codes q
+                    LEFT JOIN latest_measurements l ON l.qr_code_id = q.qr_code_id
+                    LEFT JOIN cameras c ON c.camera_id = l.camera_id
+                    ORDER BY q.qr_code_id
+                    """
+                    cursor.execute(query)
+                    return list(cursor.fetchall())
+        except Exception as e:
+            logger.error(f"Error getting latest measurements: {e}")
+            raise
+
+    def get_active_schedules_safe(self) -> Optional[List[Dict[str, Any]]]:
+        """
+        Thread-safe method to get active capture schedules
+        """
+        try:
+            with self.get_db_connection() as conn:
+                with conn.cursor() as cursor:
+                    query = "SELECT schedule_time_id, capture_time, is_active FROM schedule_times WHERE is_active = TRUE"
+                    cursor.execute(query)
+                    return list(cursor.fetchall())
+        except Exception as e:
+            logger.error(f"Error getting active schedules: {e}")
+            return None
+
+    def get_schedule_fingerprint_safe(self) -> Optional[Tuple[int, int]]:
+        """
+        Thread-safe method to get a cheap fingerprint (count, checksum) of active capture schedules,
+        đổi khi lịch chụp được thêm/xoá/bật/tắt hoặc đổi giờ
+        """
+        try:
+            with self.get_db_connection() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute("""
+                    SELECT COUNT(*) AS count,
+                           COALESCE(BIT_XOR(CRC32(CONCAT_WS(':', schedule_time_id, capture_time))), 0) AS checksum
+                    FROM schedule_times WHERE is_active = TRUE
+                    """)
+                    row = cursor.fetchone()
+                    return int(row['count']), int(row['checksum'])
+        except Exception as e:
+            logger.error(f"Error getting schedule fingerprint: {e}")
+            return None
+
+    def get_cameras_safe(self) -> Optional[List[Dict[str, Any]]]:
+        """
+        Thread-safe method to get all cameras
+        """
+        try:
+            with self.get_db_connection() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute("SELECT name, rtsp_url, capture_backend, snapshot_url, camera_id FROM cameras")
+                    return list(cursor.fetchall())
+        except Exception as e:
+            logger.error(f"Error getting cameras: {e}")
+            return None
+
+    def get_camera_pairs_safe(self) -> Optional[List[Dict[str, Any]]]:
+        """
+        Thread-safe method to get active camera pairs (movable/fixed)
+        """
+        try:
+            with self.get_db_connection() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute("""
+                    SELECT pair_id, camera_id_movable, camera_id_fixed
+                    FROM camera_pairs WHERE is_active = TRUE
+                    """)
+                    return list(cursor.fetchall())
+        except Exception as e:
+            logger.error(f"Error getting camera pairs: {e}")
+            return None
+
+    def record_capture_run_safe(self, run_id: str, scheduled_for: datetime, trigger_source: str,
+                                status: str, node_id: Optional[str] = None) -> bool:
+        """
+        Thread-safe method to record a capture run (started_at = now for running runs)
+        """
+        try:
+            with self.get_db_connection() as conn:
+                with conn.cursor() as cursor:
+                    query = """
+                    INSERT INTO capture_runs (run_id, node_id, scheduled_for, trigger_source, status, started_at)
+                    VALUES (%s, %s, %s, %s, %s, %s)
+                    """
+                    started_at = datetime.now() if status == "running" else None
+                    cursor.execute(query, (run_id, node_id, scheduled_for, trigger_source, status, started_at))
+                    conn.commit()
+                    return True
+        except Exception as e:
+            logger.error(f"Error recording capture run: {e}")
+            return False
+
+    def finish_capture_run_safe(self, run_id: str, status: str, camera_count: int = 0,
+                                success_count: int = 0) -> bool:
+        """
+        Thread-safe method to close a capture run
+        """
+        try:
+            with self.get_db_connection() as conn:
+                with conn.cursor() as cursor:
+                    query = """
+                    UPDATE capture_runs
+                    SET status = %s, camera_count = %s, success_count = %s, finished_at = %s
+                    WHERE run_id = %s
+                    """
+                    cursor.execute(query, (status, camera_count, success_count, datetime.now(), run_id))
+                    conn.commit()
+                    return True
+        except Exception as e:
+            logger.error(f"Error finishing capture run: {e}")
+            return False
+
+    def get_capture_run_times_safe(self, since: datetime) -> Optional[set]:
+        """
+        Thread-safe method to get scheduled times that already have a run (any status) since a time
+        """
+        try:
+            with self.get_db_connection() as conn:
+                with conn.cursor() as cursor:
+                    query = "SELECT DISTINCT scheduled_for FROM capture_runs WHERE scheduled_for >= %s"
+                    cursor.execute(query, (since,))
+                    return {row["scheduled_for"] for row in cursor.fetchall()}
+        except Exception as e:
+            logger.error(f"Error getting capture run times: {e}")
+            return None
+
+    def heartbeat_node_safe(self, node_id: str, hostname: str, pid: int, started_at: datetime,
+                            role: str = "api", stats: Optional[str] = None) -> bool:
+        """
+        Thread-safe method to upsert a scheduler node heartbeat (heartbeat_at theo giờ của database)
+        """
+        try:
+            with self.get_db_connection() as conn:
+                with conn.cursor() as cursor:
+                    query = """
+                    INSERT INTO scheduler_nodes (node_id, hostname, pid, role, started_at, heartbeat_at, stats)
+                    VALUES (%s, %s, %s, %s, %s, NOW(6), %s)
+                    ON DUPLICATE KEY UPDATE heartbeat_at = NOW(6), stats = VALUES(stats)
+                    """
+                    cursor.execute(query, (node_id, hostname, pid, role, started_at, stats))
+                    conn.commit()
+                    return True
+        except Exception as e:
+            logger.error(f"Error sending node heartbeat: {e}")
+            return False
+
+    def get_live_nodes_safe(self, ttl_seconds: int) -> Optional[List[str]]:
+        """
+        Thread-safe method to get node ids with a heartbeat within ttl_seconds
+        """
+        try:
+            with self.get_db_connection() as conn:
+                with conn.cursor() as cursor:
+                    query = """
+                    SELECT node_id FROM scheduler_nodes
+                    WHERE heartbeat_at >= NOW(6) - INTERVAL %s SECOND
+                    ORDER BY node_id
+                    """
+                    cursor.execute(query, (ttl_seconds,))
+                    return [row["node_id"] for row in cursor.fetchall()]
+        except Exception as e:
+            logger.error(f"Error getting live nodes: {e}")
+            return None
+
+    def get_nodes_safe(self, ttl_seconds: int) -> List[Dict[str, Any]]:
+        """
+        Lấy tất cả scheduler node kèm trạng thái còn sống và thống kê gần nhất
+        """
+        try:
+            with self.get_db_connection() as conn:
+                with conn.cursor() as cursor:
+                    query = """
+                    SELECT node_id, hostname, pid, role, started_at, heartbeat_at, stats,
+                           heartbeat_at >= NOW(6) - INTERVAL %s SECOND AS alive
+                    FROM scheduler_nodes
+                    ORDER BY node_id
+                    """
+                    cursor.execute(query, (ttl_seconds,))
+                    return list(cursor.fetchall())
+        except Exception as e:
+            logger.error(f"Error getting scheduler nodes: {e}")
+            raise
+
+    def save_camera_health_safe(self, node_id: str, items: List[Dict[str, Any]]) -> bool:
+        """
+        Thread-safe method to upsert camera health snapshots (camera_health) written by the node capturing them
+        """
+        if not items:
+            return True
+        try:
+            with self.get_db_connection() as conn:
+                with conn.cursor() as cursor:
+                    query = """
+                    INSERT INTO camera_health (camera_id, camera_name, node_id, state, consecutive_failures,
+                                               success_rate, avg_latency_ms, recent_attempts, last_reason,
+                                               last_success_at, last_failure_at, open_until, probes, updated_at)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, NOW(6))
+                    ON DUPLICATE KEY UPDATE camera_name = VALUES(camera_name), node_id = VALUES(node_id),
+                        state = VALUES(state), consecutive_failures = VALUES(consecutive_failures),
+                        success_rate = VALUES(success_rate), avg_latency_ms = VALUES(avg_latency_ms),
+                        recent_attempts = VALUES(recent_attempts), last_reason = VALUES(last_reason),
+                        last_success_at = VALUES(last_success_at), last_failure_at = VALUES(last_failure_at),
+                        open_until = VALUES(open_until), probes = VALUES(probes), updated_at = NOW(6)
+                    """
+                    cursor.executemany(query, [
+                        (item["camera_id"], item["camera_name"], node_id, item["state"],
+                         item["consecutive_failures"], item["success_rate"], item["avg_latency_ms"],
+                         item["recent_attempts"], (item["last_reason"] or "")[:255] or None,
+                         item["last_success_at"], item["last_failure_at"], item["open_until"], item["probes"])
+                        for item in items
+                    ])
+                    conn.commit()
+                    return True
+        except Exception as e:
+            logger.error(f"Error saving camera health: {e}")
+            return False
+
+    def get_camera_health_safe(self, state: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Lấy tình trạng camera đã được các node ghi (retry_after_seconds theo giờ của database)
+        """
+        try:
+            with self.get_db_connection() as conn:
+                with conn.cursor() as cursor:
+                    query = """
+                    SELECT camera_id, camera_name, node_id, state, consecutive_failures, success_rate,
+                           avg_latency_ms, recent_attempts, last_reason, last_success_at, last_failure_at,
+                           IF(state = 'open' AND open_until > NOW(6),
+                              ROUND(TIMESTAMPDIFF(MICROSECOND, NOW(6), open_until) / 1000000, 1), 0)
+                               AS retry_after_seconds,
+                           probes, updated_at
+                    FROM camera_health
+                    """
+                    params = []
+                    if state is not None:
+                        query += " WHERE state = %s"
+                        params.append(state)
+                    cursor.execute(query + " ORDER BY camera_id", params)
+                    return list(cursor.fetchall())
+        except Exception as e:
+            logger.error(f"Error getting camera health: {e}")
+            raise
+
+    def remove_node_safe(self, node_id: str) -> bool:
+        """
+        Thread-safe method to remove a scheduler node (khi node dừng)
+        """
+        try:
+            with self.get_db_connection() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute("DELETE FROM scheduler_nodes WHERE node_id = %s", (node_id,))
+                    conn.commit()
+                    return True
+        except Exception as e:
+            logger.error(f"Error removing node: {e}")
+            return False
+
     def check_camera_roi_exists_safe(self, camera_id: int) -> bool:
         """
         Thread-safe method to check if camera ROI exists
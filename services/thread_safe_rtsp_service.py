@@ -4,13 +4,28 @@ Thread-safe RTSP service for concurrent camera processing
 import cv2
 import zxingcpp
 import numpy as np
-from typing import Optional, Tuple, Dict, Any
+from typing import Optional, Tuple, Dict, Any, List
 import logging
 import time
 import threading
 import os
+import re
 from datetime import datetime
 from services.thread_safe_db_service import thread_safe_db_service
+from services.settlement_stream import settlement_stream_hub
+from services.frame_pool import frame_pool
+from services.frame_archive import frame_archive_writer
+from services.burst_sampling import unnamed_qr_name
+
+try:
+    from config.settings import (DETECT_DOWNSCALE_MAX_WIDTH, DETECT_REFINE_MARGIN, DETECT_FULLRES_FALLBACK,
+                                 ARCHIVE_ROI_ONLY, ARCHIVE_ROI_PADDING)
+except ImportError:
+    DETECT_DOWNSCALE_MAX_WIDTH = 1280
+    DETECT_REFINE_MARGIN = 0.25
+    DETECT_FULLRES_FALLBACK = True
+    ARCHIVE_ROI_ONLY = False
+    ARCHIVE_ROI_PADDING = 32
 
 # Cấu hình logging
 logging.basicConfig(level=logging.INFO)
@@ -64,28 +79,20 @@ class ThreadSafeRTSPService:
             frame_dt = datetime.fromtimestamp(frame_start_time)
             logger.info(f"[{thread_id}] 📸 Bắt đầu chụp frame lúc: {frame_dt.strftime('%H:%M:%S')}.{frame_dt.microsecond//1000:03d}ms")
             
-            # Đọc frame với timeout
-            ret, frame = cap.read()
+            # Đọc frame vào buffer của pool (view chỉ đọc, đã chuyển sang BGR)
+            frame = frame_pool.read(cap)
             
             # Thời gian hoàn thành đọc frame
             frame_end_time = time.time()
             frame_duration = (frame_end_time - frame_start_time) * 1000
             
-            if not ret or frame is None:
+            if frame is None:
                 logger.error(f"[{thread_id}] ❌ Không thể đọc frame từ RTSP stream")
                 logger.error(f"[{thread_id}] ⏰ Thời gian đọc frame thất bại: {frame_duration:.2f}ms")
                 return None
             
             logger.info(f"[{thread_id}] ✅ Đọc frame thành công sau: {frame_duration:.2f}ms")
             
-            # Chuyển đổi frame sang BGR nếu cần (đảm bảo format nhất quán)
-            if len(frame.shape) == 2:
-                # Nếu là grayscale, chuyển sang BGR
-                frame = cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR)
-            elif frame.shape[2] == 4:
-                # Nếu là RGBA, chuyển sang BGR
-                frame = cv2.cvtColor(frame, cv2.COLOR_RGBA2BGR)
-            
             # Log thông tin frame và thời gian tổng
             height, width = frame.shape[:2]
             total_duration = (frame_end_time - rtsp_start_time) * 1000
@@ -111,67 +118,40 @@ class ThreadSafeRTSPService:
                 cleanup_dt = datetime.fromtimestamp(cleanup_time)
                 logger.info(f"[{thread_id}] 🧹 Đóng RTSP connection lúc: {cleanup_dt.strftime('%H:%M:%S')}.{cleanup_dt.microsecond//1000:03d}ms")
     
-    def qr_detection_saveToDb_safe(self, frame_to_process: np.ndarray, camera_id: int):
+    def detect_qr_codes(self, frame_to_process: np.ndarray, camera_id: int):
         """
-        Thread-safe QR detection and database saving
+        Phát hiện QR codes trên frame (chỉ xử lý CPU, không ghi database).
+
+        Returns:
+            list: Các tuple (rect, name, roi_width, center_x, center_y) của QR codes được phát hiện.
         """
         if frame_to_process is None:
             logger.error("Đã nhận frame rỗng để xử lý QR.")
             return []
 
         thread_id = threading.current_thread().name
-        
-        # Thời gian bắt đầu QR detection
-        qr_start_time = time.time()
-        qr_dt = datetime.fromtimestamp(qr_start_time)
-        logger.info(f"[{thread_id}] 🔍 Bắt đầu QR detection lúc: {qr_dt.strftime('%H:%M:%S')}.{qr_dt.microsecond//1000:03d}ms")
-        logger.info(f"[{thread_id}] 📝 Đã vào hàm qr_detection_saveToDb_safe với camera_id: {camera_id}")
-        
-        frame_copy = frame_to_process.copy()
 
         # Thời gian bắt đầu đọc barcodes
         barcode_start_time = time.time()
         barcode_dt = datetime.fromtimestamp(barcode_start_time)
         logger.info(f"[{thread_id}] 🔍 Bắt đầu đọc barcodes lúc: {barcode_dt.strftime('%H:%M:%S')}.{barcode_dt.microsecond//1000:03d}ms")
         
-        # Sử dụng zxingcpp để đọc barcodes
-        results = zxingcpp.read_barcodes(frame_copy)
+        # Tìm QR trên ảnh thu nhỏ, tính tọa độ chính xác trên vùng full-resolution
+        # (chỉ đọc frame nên dùng trực tiếp view chỉ đọc, không copy)
+        qr_codes = self._locate_qr_codes(frame_to_process)
         
         # Thời gian hoàn thành đọc barcodes
         barcode_end_time = time.time()
         barcode_duration = (barcode_end_time - barcode_start_time) * 1000
         logger.info(f"[{thread_id}] ✅ Đọc barcodes hoàn thành sau: {barcode_duration:.2f}ms")
-        logger.info(f"[{thread_id}] 📊 Tìm thấy {len(results)} barcode(s)")
-        
-        qr_codes = []
+        logger.info(f"[{thread_id}] 📊 Tìm thấy {len(qr_codes)} QR code(s)")
 
-        for result in results:
-            if result.format != zxingcpp.BarcodeFormat.QRCode or not result.position:
-                continue
-
-            # Convert position to points with rounding
-            pts = [
-                (round(result.position.top_left.x), round(result.position.top_left.y)),
-                (round(result.position.top_right.x), round(result.position.top_right.y)),
-                (round(result.position.bottom_right.x), round(result.position.bottom_right.y)),
-                (round(result.position.bottom_left.x), round(result.position.bottom_left.y))
-            ]
-
-            qr_codes.append((result.text, pts))
-
-        # Thời gian bắt đầu xử lý database
-        db_start_time = time.time()
-        db_dt = datetime.fromtimestamp(db_start_time)
-        logger.info(f"[{thread_id}] 💾 Bắt đầu xử lý database lúc: {db_dt.strftime('%H:%M:%S')}.{db_dt.microsecond//1000:03d}ms")
-        
         # Mảng để lưu QR codes đã được phát hiện (tránh trùng lặp)
         detected_qr_codes = []
         new_rois = []
 
         # Xử lý từng QR code được phát hiện
         for text, points in qr_codes:
-            pts = np.array(points, dtype=np.int32)
-
             # Tính toán điểm trung tâm
             center_x = round(sum(pt[0] for pt in points) / 4)
             center_y = round(sum(pt[1] for pt in points) / 4)
@@ -205,64 +185,11 @@ class ThreadSafeRTSPService:
 
                 # Tạo ROI rectangle
                 rect = (x_min, y_min, x_max, y_max)
-                name = text or f"QR_Camera_{camera_id}_{len(detected_qr_codes)}"
-
-                # ==================== LOGIC LƯU VÀO DATABASE ====================
-                db_operation_start = time.time()
-                db_op_dt = datetime.fromtimestamp(db_operation_start)
-                print(f"\n[{thread_id}] 🔍 Xử lý QR code: {name} (Camera ID: {camera_id})")
-                print(f"[{thread_id}]    - Center: ({center_x}, {center_y})")
-                print(f"[{thread_id}]    - ROI: ({x_min}, {y_min}, {x_max}, {y_max})")
-                print(f"[{thread_id}]    - Bắt đầu DB operation lúc: {db_op_dt.strftime('%H:%M:%S')}.{db_op_dt.microsecond//1000:03d}ms")
-                
-                # Kiểm tra xem QR name đã tồn tại trong database chưa
-                # Sử dụng name của QR code để kiểm tra, không phải camera_id
-                qr_exists = thread_safe_db_service.check_qr_name_exists_safe(name)
-                print(f"[{thread_id}] QR '{name}' exists: {qr_exists}")
-                
-                if not qr_exists:
-                    # QR name chưa tồn tại -> insert vào bảng qr_codes
-                    print(f"[{thread_id}]    📝 QR name '{name}' chưa tồn tại -> Thêm vào bảng qr_codes")
-                    qr_code = thread_safe_db_service.create_qr_code_safe(
-                        name_roi=name,
-                        initial_x=center_x,
-                        initial_y=center_y
-                    )
-                    
-                    if qr_code:
-                        print(f"[{thread_id}]    ✅ Đã thêm QR code vào database: ID {qr_code['qr_code_id']}")
-                    else:
-                        print(f"[{thread_id}]    ❌ Không thể thêm QR code vào database")
-                else:
-                    # QR name đã tồn tại -> insert vào bảng measurements
-                    print(f"[{thread_id}]    📊 QR name '{name}' đã tồn tại -> Thêm vào bảng measurements")
-                    
-                    # Lấy QR code ID từ database bằng name
-                    qr_code = thread_safe_db_service.get_qr_code_by_name_safe(name)
-                    if qr_code:
-                        measurement = thread_safe_db_service.create_measurement_safe(
-                            x=center_x,
-                            y=center_y,
-                            qr_code_id=qr_code['qr_code_id']
-                        )
-                        
-                        if measurement:
-                            print(f"[{thread_id}]    ✅ Đã thêm measurement vào database: ID {measurement['measurement_id']}")
-                        else:
-                            print(f"[{thread_id}]    ❌ Không thể thêm measurement vào database")
-                    else:
-                        print(f"[{thread_id}]    ❌ Không thể lấy QR code ID từ database")
-                
-                db_operation_end = time.time()
-                db_operation_duration = (db_operation_end - db_operation_start) * 1000
-                print(f"[{thread_id}]    ⏰ DB operation hoàn thành sau: {db_operation_duration:.2f}ms")
-                
-                # ==================== KẾT THÚC LOGIC DATABASE ====================
+                name = text or unnamed_qr_name(camera_id, len(detected_qr_codes))
 
                 # Thêm thông tin đầy đủ vào danh sách với roi_width và center coordinates
                 new_rois.append((rect, name, roi_width, center_x, center_y))
-                print(f"[{thread_id}] center_x: {center_x}, center_y: {center_y}")
-                
+
                 # In ra thông tin QR code
                 print(f"[{thread_id}] QR Text: {text}")
                 print(f"[{thread_id}]   Center: (x={center_x}, y={center_y})")
@@ -270,22 +197,177 @@ class ThreadSafeRTSPService:
                 print(f"[{thread_id}]   Name: {name}")
                 print(f"[{thread_id}]" + "-" * 40)
 
+        print(f"[{thread_id}] Tổng số QR codes phát hiện trong lần chạy này: {len(detected_qr_codes)}")
+        return new_rois
+
+    @staticmethod
+    def _read_qr_points(image: np.ndarray) -> List[Tuple[str, List[Tuple[int, int]]]]:
+        """Đọc QR codes bằng zxingcpp, trả về (text, 4 góc) theo tọa độ của image"""
+        qr_codes = []
+        for result in zxingcpp.read_barcodes(image):
+            if result.format != zxingcpp.BarcodeFormat.QRCode or not result.position:
+                continue
+
+            # Convert position to points with rounding
+            pts = [
+                (round(result.position.top_left.x), round(result.position.top_left.y)),
+                (round(result.position.top_right.x), round(result.position.top_right.y)),
+                (round(result.position.bottom_right.x), round(result.position.bottom_right.y)),
+                (round(result.position.bottom_left.x), round(result.position.bottom_left.y))
+            ]
+            qr_codes.append((result.text, pts))
+        return qr_codes
+
+    def _locate_qr_codes(self, frame: np.ndarray) -> List[Tuple[str, List[Tuple[int, int]]]]:
+        """
+        Tìm QR trên ảnh thu nhỏ (chiều rộng tối đa DETECT_DOWNSCALE_MAX_WIDTH), sau đó đọc lại
+        từng QR trên vùng full-resolution quanh vị trí tìm được để tọa độ tâm giữ độ chính xác pixel.
+        Không tìm thấy QR nào trên ảnh thu nhỏ thì đọc lại cả frame (QR quá nhỏ khi thu nhỏ).
+        """
+        height, width = frame.shape[:2]
+        if not DETECT_DOWNSCALE_MAX_WIDTH or width <= DETECT_DOWNSCALE_MAX_WIDTH:
+            return self._read_qr_points(frame)
+
+        scale = DETECT_DOWNSCALE_MAX_WIDTH / width
+        small = cv2.resize(frame, (DETECT_DOWNSCALE_MAX_WIDTH, max(1, round(height * scale))),
+                           interpolation=cv2.INTER_AREA)
+        coarse = self._read_qr_points(small)
+        if not coarse:
+            return self._read_qr_points(frame) if DETECT_FULLRES_FALLBACK else []
+
+        qr_codes = []
+        for text, points in coarse:
+            xs = [x / scale for x, _ in points]
+            ys = [y / scale for _, y in points]
+            margin = max(16, round(max(max(xs) - min(xs), max(ys) - min(ys)) * DETECT_REFINE_MARGIN))
+            x0, y0 = max(0, int(min(xs)) - margin), max(0, int(min(ys)) - margin)
+            x1, y1 = min(width, int(max(xs)) + margin + 1), min(height, int(max(ys)) + margin + 1)
+
+            refined = [pts for crop_text, pts in self._read_qr_points(np.ascontiguousarray(frame[y0:y1, x0:x1]))
+                       if crop_text == text]
+            if refined:
+                qr_codes.append((text, [(x + x0, y + y0) for x, y in refined[0]]))
+            else:
+                # Không đọc lại được trên vùng full-resolution: dùng tọa độ từ ảnh thu nhỏ
+                logger.warning(f"QR '{text}': không đọc lại được ở full-resolution, dùng tọa độ ảnh thu nhỏ")
+                qr_codes.append((text, [(round(x), round(y)) for x, y in zip(xs, ys)]))
+        return qr_codes
+
+    def save_detections_safe(self, frame: Optional[np.ndarray], rois: list, camera_id: int,
+                             tracking_time: Optional[datetime] = None, captured_at: Optional[datetime] = None,
+                             burst_stats: Optional[Dict[str, Dict[str, Any]]] = None):
+        """
+        Lưu kết quả phát hiện QR vào database:
+        - Nếu QR name chưa có trong bảng qr_codes: insert vào qr_codes
+        - Nếu QR name đã có: insert vào bảng measurements (tracking_time là thời điểm logic của lịch chụp,
+          captured_at là thời điểm lấy frame; burst_stats[name] có sample_count/dispersion khi tâm được gộp từ burst)
+        Sau đó lưu frame với ROI (nếu có frame).
+        """
+        thread_id = threading.current_thread().name
+
+        # Thời gian bắt đầu xử lý database
+        db_start_time = time.time()
+        db_dt = datetime.fromtimestamp(db_start_time)
+        logger.info(f"[{thread_id}] 💾 Bắt đầu xử lý database lúc: {db_dt.strftime('%H:%M:%S')}.{db_dt.microsecond//1000:03d}ms")
+
+        for rect, name, roi_width, center_x, center_y in rois:
+            x_min, y_min, x_max, y_max = rect
+
+            # ==================== LOGIC LƯU VÀO DATABASE ====================
+            db_operation_start = time.time()
+            db_op_dt = datetime.fromtimestamp(db_operation_start)
+            print(f"\n[{thread_id}] 🔍 Xử lý QR code: {name} (Camera ID: {camera_id})")
+            print(f"[{thread_id}]    - Center: ({center_x}, {center_y})")
+            print(f"[{thread_id}]    - ROI: ({x_min}, {y_min}, {x_max}, {y_max})")
+            print(f"[{thread_id}]    - Bắt đầu DB operation lúc: {db_op_dt.strftime('%H:%M:%S')}.{db_op_dt.microsecond//1000:03d}ms")
+            
+            # Kiểm tra xem QR name đã tồn tại trong database chưa
+            # Sử dụng name của QR code để kiểm tra, không phải camera_id
+            qr_exists = thread_safe_db_service.check_qr_name_exists_safe(name)
+            print(f"[{thread_id}] QR '{name}' exists: {qr_exists}")
+            
+            if not qr_exists:
+                # QR name chưa tồn tại -> insert vào bảng qr_codes
+                print(f"[{thread_id}]    📝 QR name '{name}' chưa tồn tại -> Thêm vào bảng qr_codes")
+                qr_code = thread_safe_db_service.create_qr_code_safe(
+                    name_roi=name,
+                    initial_x=center_x,
+                    initial_y=center_y
+                )
+                
+                if qr_code:
+                    print(f"[{thread_id}]    ✅ Đã thêm QR code vào database: ID {qr_code['qr_code_id']}")
+                else:
+                    print(f"[{thread_id}]    ❌ Không thể thêm QR code vào database")
+            else:
+                # QR name đã tồn tại -> insert vào bảng measurements
+                print(f"[{thread_id}]    📊 QR name '{name}' đã tồn tại -> Thêm vào bảng measurements")
+                
+                # Lấy QR code ID từ database bằng name
+                qr_code = thread_safe_db_service.get_qr_code_by_name_safe(name)
+                if qr_code:
+                    sample = (burst_stats or {}).get(name, {})
+                    measurement = thread_safe_db_service.create_measurement_safe(
+                        x=center_x,
+                        y=center_y,
+                        qr_code_id=qr_code['qr_code_id'],
+                        camera_id=camera_id,
+                        tracking_time=tracking_time,
+                        captured_at=captured_at,
+                        sample_count=sample.get("sample_count"),
+                        center_dispersion=sample.get("dispersion")
+                    )
+                    
+                    if measurement:
+                        print(f"[{thread_id}]    ✅ Đã thêm measurement vào database: ID {measurement['measurement_id']}")
+                        # Đẩy điểm độ lún mới tới các client đang subscribe
+                        settlement_stream_hub.publish_measurement(measurement)
+                    else:
+                        print(f"[{thread_id}]    ❌ Không thể thêm measurement vào database")
+                else:
+                    print(f"[{thread_id}]    ❌ Không thể lấy QR code ID từ database")
+            
+            db_operation_end = time.time()
+            db_operation_duration = (db_operation_end - db_operation_start) * 1000
+            print(f"[{thread_id}]    ⏰ DB operation hoàn thành sau: {db_operation_duration:.2f}ms")
+            
+            # ==================== KẾT THÚC LOGIC DATABASE ====================
+
+        db_duration = (time.time() - db_start_time) * 1000
+        logger.info(f"[{thread_id}] ⏰ Tổng thời gian xử lý database: {db_duration:.2f}ms")
+
+        # Lưu frame với ROI nếu có QR codes được phát hiện
+        if rois and frame is not None:
+            saved_file = self.save_frame_with_roi(frame, rois, camera_id, thread_id)
+            if saved_file:
+                logger.info(f"[{thread_id}] 📸 Frame với ROI đã được đưa vào queue ghi: {saved_file}")
+
+    def qr_detection_saveToDb_safe(self, frame_to_process: np.ndarray, camera_id: int):
+        """
+        Thread-safe QR detection and database saving
+        """
+        if frame_to_process is None:
+            logger.error("Đã nhận frame rỗng để xử lý QR.")
+            return []
+
+        thread_id = threading.current_thread().name
+        
+        # Thời gian bắt đầu QR detection
+        qr_start_time = time.time()
+        qr_dt = datetime.fromtimestamp(qr_start_time)
+        logger.info(f"[{thread_id}] 🔍 Bắt đầu QR detection lúc: {qr_dt.strftime('%H:%M:%S')}.{qr_dt.microsecond//1000:03d}ms")
+        logger.info(f"[{thread_id}] 📝 Đã vào hàm qr_detection_saveToDb_safe với camera_id: {camera_id}")
+
+        new_rois = self.detect_qr_codes(frame_to_process, camera_id)
+        print(f"[{thread_id}] New rois found: ", new_rois)
+
+        self.save_detections_safe(frame_to_process, new_rois, camera_id)
+
         # Thời gian kết thúc toàn bộ QR detection
         qr_end_time = time.time()
         qr_end_dt = datetime.fromtimestamp(qr_end_time)
-        
-        # Tính toán thời gian các phần
         total_qr_duration = (qr_end_time - qr_start_time) * 1000
         
-        print(f"[{thread_id}] New rois found: ", new_rois)
-        print(f"[{thread_id}] Tổng số QR codes phát hiện trong lần chạy này: {len(detected_qr_codes)}")
-        
-        # Lưu frame với ROI nếu có QR codes được phát hiện
-        if new_rois:
-            saved_file = self.save_frame_with_roi(frame_to_process, new_rois, camera_id, thread_id)
-            if saved_file:
-                logger.info(f"[{thread_id}] 📸 Frame với ROI đã được lưu: {saved_file}")
-        
         logger.info(f"[{thread_id}] ⏰ Tổng thời gian QR detection: {total_qr_duration:.2f}ms")
         logger.info(f"[{thread_id}] ⏰ Kết thúc QR detection lúc: {qr_end_dt.strftime('%H:%M:%S')}.{qr_end_dt.microsecond//1000:03d}ms")
         
@@ -293,14 +375,45 @@ class ThreadSafeRTSPService:
 
     def save_frame_with_roi(self, frame: np.ndarray, rois: list, camera_id: int, thread_id: str):
         """
-        Lưu frame với ROI và center points được vẽ lên
+        Lưu frame với ROI và center points được vẽ lên (hoặc chỉ các vùng ROI khi ARCHIVE_ROI_ONLY).
+        Việc vẽ, encode và ghi file chạy trên frame_archive_writer, hàm chỉ copy dữ liệu cần lưu.
+
+        Returns: đường dẫn file sẽ được ghi, hoặc None nếu bị bỏ do queue ghi đầy.
         """
         if frame is None or not rois:
             return None
-        
-        # Tạo bản copy để vẽ
+
+        saved_at = datetime.now()
+        timestamp_file = saved_at.strftime('%Y%m%d_%H%M%S_%f')[:-3]
+
+        if ARCHIVE_ROI_ONLY:
+            # Chỉ copy vùng quanh từng QR thay vì cả frame
+            height, width = frame.shape[:2]
+            saved_file = None
+            for rect, name, roi_width, center_x, center_y in rois:
+                x_min, y_min, x_max, y_max = rect
+                crop = frame[max(0, y_min - ARCHIVE_ROI_PADDING):min(height, y_max + ARCHIVE_ROI_PADDING),
+                             max(0, x_min - ARCHIVE_ROI_PADDING):min(width, x_max + ARCHIVE_ROI_PADDING)].copy()
+                if crop.size == 0:
+                    continue
+                safe_name = re.sub(r'[^\w.-]', '_', str(name))
+                saved_file = frame_archive_writer.submit(
+                    self.output_dir, f"roi_camera_{camera_id}_{safe_name}_{timestamp_file}", lambda crop=crop: crop
+                ) or saved_file
+            return saved_file
+
+        # Tạo bản copy để vẽ (frame là view chỉ đọc của buffer dùng lại), vẽ trên thread ghi
         frame_with_roi = frame.copy()
-        
+        return frame_archive_writer.submit(
+            self.output_dir, f"camera_{camera_id}_{thread_id}_{timestamp_file}",
+            lambda: self._draw_roi_overlay(frame_with_roi, rois, camera_id, thread_id, saved_at)
+        )
+
+    def _draw_roi_overlay(self, frame_with_roi: np.ndarray, rois: list, camera_id: int, thread_id: str,
+                          saved_at: datetime) -> np.ndarray:
+        """
+        Vẽ ROI, center points và thông tin camera lên frame (vẽ trực tiếp, frame phải là bản copy)
+        """
         # Màu sắc cho vẽ
         roi_color = (0, 255, 0)  # Xanh lá cho ROI
         center_color = (0, 0, 255)  # Đỏ cho center point
@@ -346,64 +459,47 @@ class ThreadSafeRTSPService:
                    cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 255, 0), 2)
         
         # Thêm timestamp
-        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
-        cv2.putText(frame_with_roi, timestamp, (10, frame.shape[0] - 20), 
+        timestamp = saved_at.strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
+        cv2.putText(frame_with_roi, timestamp, (10, frame_with_roi.shape[0] - 20), 
                    cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 0), 1)
-        
-        # Lưu file
-        timestamp_file = datetime.now().strftime('%Y%m%d_%H%M%S_%f')[:-3]
-        filename = f"{self.output_dir}/camera_{camera_id}_{thread_id}_{timestamp_file}.jpg"
-        
-        success = cv2.imwrite(filename, frame_with_roi, [cv2.IMWRITE_JPEG_QUALITY, 95])
-        
-        if success:
-            logger.info(f"[{thread_id}] 💾 Đã lưu frame với ROI: {filename}")
-            return filename
-        else:
-            logger.error(f"[{thread_id}] ❌ Không thể lưu frame: {filename}")
-            return None
+        return frame_with_roi
     
     def save_frame_for_debug(self, frame: np.ndarray, camera_id: int, thread_id: str, qr_codes: list = None):
         """
-        Lưu frame cho mục đích debug, có thể có hoặc không có QR codes
+        Lưu frame cho mục đích debug, có thể có hoặc không có QR codes (ghi trên frame_archive_writer)
         """
         if frame is None:
             return None
         
+        saved_at = datetime.now()
         # Tạo bản copy để vẽ
         frame_debug = frame.copy()
-        
-        # Thêm thông tin camera và thread
-        font = cv2.FONT_HERSHEY_SIMPLEX
-        info_text = f"Camera {camera_id} - {thread_id}"
-        cv2.putText(frame_debug, info_text, (10, 30), font, 0.8, (255, 255, 0), 2)
-        
-        # Thêm timestamp
-        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
-        cv2.putText(frame_debug, timestamp, (10, frame.shape[0] - 20), 
-                   font, 0.6, (255, 255, 0), 1)
-        
-        # Nếu có QR codes, vẽ chúng
-        if qr_codes:
-            frame_debug = self._draw_qr_codes_on_frame(frame_debug, qr_codes)
-            status_text = f"QR Codes: {len(qr_codes)} detected"
-            cv2.putText(frame_debug, status_text, (10, 60), font, 0.6, (0, 255, 0), 2)
-        else:
-            status_text = "No QR Codes detected"
-            cv2.putText(frame_debug, status_text, (10, 60), font, 0.6, (0, 255, 255), 2)
+
+        def render():
+            # Thêm thông tin camera và thread
+            font = cv2.FONT_HERSHEY_SIMPLEX
+            info_text = f"Camera {camera_id} - {thread_id}"
+            cv2.putText(frame_debug, info_text, (10, 30), font, 0.8, (255, 255, 0), 2)
+
+            # Thêm timestamp
+            timestamp = saved_at.strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
+            cv2.putText(frame_debug, timestamp, (10, frame_debug.shape[0] - 20),
+                       font, 0.6, (255, 255, 0), 1)
+
+            # Nếu có QR codes, vẽ chúng
+            if qr_codes:
+                self._draw_qr_codes_on_frame(frame_debug, qr_codes)
+                status_text = f"QR Codes: {len(qr_codes)} detected"
+                cv2.putText(frame_debug, status_text, (10, 60), font, 0.6, (0, 255, 0), 2)
+            else:
+                status_text = "No QR Codes detected"
+                cv2.putText(frame_debug, status_text, (10, 60), font, 0.6, (0, 255, 255), 2)
+            return frame_debug
         
         # Lưu file
-        timestamp_file = datetime.now().strftime('%Y%m%d_%H%M%S_%f')[:-3]
-        filename = f"{self.output_dir}/debug_camera_{camera_id}_{thread_id}_{timestamp_file}.jpg"
-        
-        success = cv2.imwrite(filename, frame_debug, [cv2.IMWRITE_JPEG_QUALITY, 95])
-        
-        if success:
-            logger.info(f"[{thread_id}] 💾 Đã lưu debug frame: {filename}")
-            return filename
-        else:
-            logger.error(f"[{thread_id}] ❌ Không thể lưu debug frame: {filename}")
-            return None
+        timestamp_file = saved_at.strftime('%Y%m%d_%H%M%S_%f')[:-3]
+        return frame_archive_writer.submit(self.output_dir, f"debug_camera_{camera_id}_{thread_id}_{timestamp_file}",
+                                           render)
     
     def _draw_qr_codes_on_frame(self, frame: np.ndarray, qr_codes: list):
         """
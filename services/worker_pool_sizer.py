@@ -0,0 +1,141 @@
+"""
+Tự điều chỉnh số worker capture/detect của pipeline sau mỗi lượt chạy,
+dựa trên thời gian frame/QR đo được, việc lượt chạy có trễ cửa sổ hay không và mức dùng CPU
+"""
+import logging
+import math
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    from config.settings import (ADAPTIVE_WORKERS, CAPTURE_WORKERS_MIN, CAPTURE_WORKERS_MAX, DETECT_WORKERS_MIN,
+                                 DETECT_WORKERS_MAX, ADAPTIVE_TARGET_FRACTION, ADAPTIVE_CPU_HIGH, ADAPTIVE_CPU_LOW,
+                                 TIMEOUT_SECONDS)
+except ImportError:
+    ADAPTIVE_WORKERS = True
+    CAPTURE_WORKERS_MIN = 2
+    CAPTURE_WORKERS_MAX = 32
+    DETECT_WORKERS_MIN = 1
+    DETECT_WORKERS_MAX = os.cpu_count() or 2
+    ADAPTIVE_TARGET_FRACTION = 0.8
+    ADAPTIVE_CPU_HIGH = 0.85
+    ADAPTIVE_CPU_LOW = 0.6
+    TIMEOUT_SECONDS = 30
+
+logger = logging.getLogger(__name__)
+
+
+class CpuSampler:
+    """
+    Đo mức dùng CPU trong một khoảng thời gian (0..1 trên tổng số core):
+    lấy giá trị lớn hơn giữa CPU của process hiện tại và load average của máy (nếu có).
+    """
+
+    def __init__(self):
+        self._cpu_count = os.cpu_count() or 1
+        self._started_wall = time.monotonic()
+        self._started_cpu = self._process_cpu()
+
+    @staticmethod
+    def _process_cpu() -> float:
+        times = os.times()
+        return times.user + times.system + times.children_user + times.children_system
+
+    def utilization(self) -> float:
+        wall = max(time.monotonic() - self._started_wall, 1e-6)
+        process_share = (self._process_cpu() - self._started_cpu) / (wall * self._cpu_count)
+        load_share = 0.0
+        if hasattr(os, "getloadavg"):
+            load_share = os.getloadavg()[0] / self._cpu_count
+        return min(1.0, max(process_share, load_share))
+
+
+class WorkerPoolSizer:
+    """
+    Số worker cần thiết ước lượng theo định luật Little:
+        worker = ceil(số camera * thời gian trung bình mỗi camera / thời gian mục tiêu)
+    - tăng khi lượt chạy trễ cửa sổ (có camera Timeout hoặc vượt thời gian mục tiêu) và CPU còn rảnh
+    - giảm khi CPU bão hoà
+    - giảm dần về mức ước lượng khi lượt chạy dư thời gian
+    Giá trị luôn nằm trong giới hạn cấu hình; mọi thay đổi được ghi log.
+    """
+
+    def __init__(self, enabled: bool = ADAPTIVE_WORKERS,
+                 capture_bounds=(CAPTURE_WORKERS_MIN, CAPTURE_WORKERS_MAX),
+                 detect_bounds=(DETECT_WORKERS_MIN, DETECT_WORKERS_MAX),
+                 target_seconds: float = TIMEOUT_SECONDS * ADAPTIVE_TARGET_FRACTION,
+                 cpu_high: float = ADAPTIVE_CPU_HIGH, cpu_low: float = ADAPTIVE_CPU_LOW):
+        self.enabled = enabled
+        self.capture_bounds = capture_bounds
+        self.detect_bounds = detect_bounds
+        self.target_seconds = target_seconds
+        self.cpu_high = cpu_high
+        self.cpu_low = cpu_low
+        self.last_decision: Dict[str, Any] = {}
+
+    @staticmethod
+    def _average(results: List[Dict[str, Any]], key: str) -> float:
+        values = [result.get(key) or 0 for result in results if result.get(key)]
+        return sum(values) / len(values) / 1000 if values else 0.0
+
+    @staticmethod
+    def _clamp(value: int, bounds) -> int:
+        return max(bounds[0], min(bounds[1], value))
+
+    def _next_size(self, current: int, needed: int, missed: bool, cpu: float, bounds) -> Tuple[int, str]:
+        if cpu >= self.cpu_high and current > bounds[0]:
+            return self._clamp(current - max(1, current // 4), bounds), f"CPU {cpu:.0%} bão hoà"
+        if missed and cpu < self.cpu_low:
+            return self._clamp(max(needed, current + 1), bounds), "lượt chạy trễ cửa sổ, CPU còn rảnh"
+        if not missed and needed < current:
+            return self._clamp(current - 1, bounds), f"dư thời gian (cần ~{needed})"
+        return current, ""
+
+    def adjust(self, pipeline, results: List[Dict[str, Any]], active_seconds: float,
+               cpu: float) -> Optional[Dict[str, Any]]:
+        """
+        Gọi sau mỗi lượt chạy của pipeline.
+        active_seconds: thời gian chạy không tính cửa sổ rải thời điểm bắt đầu.
+        """
+        if not self.enabled or not results:
+            return None
+
+        camera_count = len(results)
+        avg_frame = self._average(results, "frame_time")
+        avg_qr = self._average(results, "qr_time")
+        timeouts = sum(1 for result in results if result.get("reason") == "Timeout")
+        missed = timeouts > 0 or active_seconds > self.target_seconds
+
+        needed_capture = max(1, math.ceil(camera_count * avg_frame / self.target_seconds))
+        needed_detect = max(1, math.ceil(camera_count * avg_qr / self.target_seconds))
+
+        capture_workers, capture_reason = self._next_size(pipeline.capture_workers, needed_capture,
+                                                          missed, cpu, self.capture_bounds)
+        detect_workers, detect_reason = self._next_size(pipeline.detect_workers, needed_detect,
+                                                        missed, cpu, self.detect_bounds)
+
+        self.last_decision = {
+            "cameras": camera_count,
+            "avg_frame_s": round(avg_frame, 3),
+            "avg_qr_s": round(avg_qr, 3),
+            "active_seconds": round(active_seconds, 2),
+            "timeouts": timeouts,
+            "cpu": round(cpu, 3),
+            "capture_workers": capture_workers,
+            "detect_workers": detect_workers,
+        }
+
+        if capture_workers != pipeline.capture_workers:
+            logger.info(f"📐 Capture workers {pipeline.capture_workers} -> {capture_workers}: {capture_reason} "
+                        f"(frame TB {avg_frame:.2f}s, {camera_count} camera, {active_seconds:.1f}s/{self.target_seconds:.0f}s)")
+            pipeline.capture_workers = capture_workers
+        if detect_workers != pipeline.detect_workers:
+            logger.info(f"📐 Detect workers {pipeline.detect_workers} -> {detect_workers}: {detect_reason} "
+                        f"(QR TB {avg_qr:.2f}s, CPU {cpu:.0%})")
+            pipeline.detect_workers = detect_workers
+        return self.last_decision
+
+
+# Tạo instance global
+worker_pool_sizer = WorkerPoolSizer()
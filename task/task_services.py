@@ -78,7 +78,7 @@ class CameraTaskService:
                 return
 
             with conn.cursor() as cursor:
-                cursor.execute("SELECT name, rtsp_url FROM cameras")
+                cursor.execute("SELECT name, rtsp_url, capture_backend, snapshot_url FROM cameras")
                 cameras = cursor.fetchall()
 
             if not cameras:
@@ -99,7 +99,7 @@ class CameraTaskService:
                 logger.info(f"RTSP URL: {rtsp_url}")
                 
                 # 1. Lấy frame từ RTSP
-                frame = rtsp_service.get_frame_from_rtsp(rtsp_url)
+                frame = rtsp_service.get_frame_from_rtsp(rtsp_url, camera)
 
                 if frame is not None:
                     # 2. Nếu lấy frame thành công, thực hiện nhận diện QR và lưu vào database
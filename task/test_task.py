@@ -1,329 +1,428 @@
 from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.triggers.cron import CronTrigger
 import logging
 import sys
 import os
-import time
 from datetime import datetime, time as dt_time, timedelta
 import threading
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, Optional
 
 # Thêm đường dẫn gốc của dự án vào sys.path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 try:
-    from config.settings import MAX_CAMERA_WORKERS, TIMEOUT_SECONDS, LOG_LEVEL, LOG_FORMAT
+    from config.settings import (MAX_CAMERA_WORKERS, TIMEOUT_SECONDS, LOG_LEVEL, LOG_FORMAT,
+                                 SCHEDULE_RESYNC_MINUTES, CAPTURE_ENGINE, MISFIRE_GRACE_SECONDS,
+                                 CATCHUP_WINDOW_MINUTES, CLUSTER_HEARTBEAT_SECONDS, CAPTURE_QUEUE_ENABLED,
+                                 WARMUP_SECONDS, SCHEDULE_CHANGE_POLL_SECONDS)
 except ImportError:
     # Fallback values if config is not available
     MAX_CAMERA_WORKERS = 4
     TIMEOUT_SECONDS = 30
+    SCHEDULE_RESYNC_MINUTES = 10
+    SCHEDULE_CHANGE_POLL_SECONDS = 5
+    MISFIRE_GRACE_SECONDS = 60
+    CATCHUP_WINDOW_MINUTES = 30
+    CLUSTER_HEARTBEAT_SECONDS = 10
+    CAPTURE_QUEUE_ENABLED = False
+    WARMUP_SECONDS = 5
+    CAPTURE_ENGINE = "pipeline"
     LOG_LEVEL = "INFO"
     LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
 
-from services.rtsp_service import rtsp_service
-from services.thread_safe_rtsp_service import thread_safe_rtsp_service
-from services.database_service import database_service
+from services.capture_pipeline import capture_pipeline
+from services.async_capture_orchestrator import async_capture_orchestrator
+from services.thread_safe_db_service import thread_safe_db_service
+from services.run_coordinator import RunCoordinator
+from services.capture_spread import capture_spread_planner
+from services.cluster_membership import cluster_membership
+from services.capture_job_queue import capture_job_queue
+from services.camera_health import camera_health_registry
+from services.stream_dedup import DedupedEngine
+from services.paired_capture import PairedCaptureEngine, pair_groups
+from services.capture_warmup import capture_warmup_pool
+from services.capture_backends import resolve_backend
+from services.frame_archive import frame_archive_writer
 from db.database import get_connection
 
 # Cấu hình logging
 logging.basicConfig(level=getattr(logging, LOG_LEVEL), format=LOG_FORMAT)
 logger = logging.getLogger(__name__)
 
+# Prefix id của các cron job sinh ra từ schedule_times
+SCHEDULE_JOB_PREFIX = "capture_"
+# Prefix id của các job mở trước phiên RTSP (WARMUP_SECONDS trước mỗi capture_time)
+WARMUP_JOB_PREFIX = "warmup_"
+
 class CameraTaskServiceTest:
     def __init__(self):
         self.scheduler = BackgroundScheduler(daemon=True)
         self.max_workers = MAX_CAMERA_WORKERS  # Số lượng thread tối đa để xử lý camera đồng thời
         self.timeout_seconds = TIMEOUT_SECONDS  # Timeout cho mỗi camera
-        self.processing_lock = threading.Lock()  # Lock để đảm bảo thread safety
+        self.run_coordinator = RunCoordinator(self._process_cameras,
+                                              node_id=cluster_membership.node_id)  # Chống chạy chồng giữa các lượt
+        self._schedule_sync_lock = threading.Lock()  # Tránh hai lần đồng bộ cron trigger chạy chồng nhau
+        self._capture_times = []  # Các giờ:phút đang có cron trigger (dùng để chạy bù tick bị lỡ)
+        self._schedule_fingerprint = None  # Fingerprint của schedule_times tại lần đồng bộ gần nhất
+        self.last_run = {}  # Tóm tắt lượt chạy gần nhất (được gửi kèm heartbeat của node)
+        cluster_membership.stats_provider = self.get_stats
         logger.info(f"Initialized CameraTaskService with {self.max_workers} max workers")
 
-    def _check_and_process_cameras(self):
+    @staticmethod
+    def _parse_capture_time(value) -> Optional[dt_time]:
         """
-        Công việc được lên lịch để kiểm tra thời gian và xử lý camera.
-        Chỉ thực hiện khi thời gian hiện tại khớp với capture_time trong database.
+        Chuyển capture_time từ database (string 'HH:MM:SS', timedelta hoặc time) thành time object
         """
-        current_time = datetime.now().time()
-        logger.info(f"Kiểm tra thời gian hiện tại: {current_time.strftime('%H:%M:%S')}")
-        
-        # Lấy danh sách lịch chụp đang hoạt động
-        active_schedules = database_service.get_active_schedules()
-        
-        if not active_schedules:
-            logger.info("Không có lịch chụp nào đang hoạt động.")
+        if isinstance(value, dt_time):
+            return value
+        if isinstance(value, timedelta):
+            return (datetime.min + value).time()
+        try:
+            return datetime.strptime(str(value), '%H:%M:%S').time()
+        except ValueError:
+            logger.warning(f"Không thể parse thời gian: {value}")
+            return None
+
+    def sync_schedules(self):
+        """
+        Đồng bộ các cron trigger với bảng schedule_times.
+        Mỗi giờ:phút đang hoạt động là một cron job chạy đúng giây 0; các job của
+        lịch đã tắt/xoá bị gỡ. Được gọi khi khởi động, khi fingerprint của schedule_times đổi
+        và định kỳ mỗi SCHEDULE_RESYNC_MINUTES.
+        """
+        # Đọc fingerprint trước danh sách lịch: thay đổi xảy ra giữa hai lần đọc sẽ được đồng bộ ở lần kiểm tra sau
+        fingerprint = thread_safe_db_service.get_schedule_fingerprint_safe()
+        active_schedules = thread_safe_db_service.get_active_schedules_safe()
+        if active_schedules is None:
+            logger.error("❌ Không thể đọc schedule_times, giữ nguyên các cron trigger hiện tại.")
             return
-        
-        logger.info(f"Tìm thấy {len(active_schedules)} lịch chụp đang hoạt động")
-        
-        # Kiểm tra xem thời gian hiện tại có khớp với bất kỳ capture_time nào không
-        matching_schedules = []
+
+        # Gom các lịch trùng giờ:phút vào một job để không chạy hai lần cùng lúc
+        desired_jobs = {}
         for schedule in active_schedules:
-            capture_time_str = schedule['capture_time']
-            # Chuyển đổi string thành time object
-            if isinstance(capture_time_str, str):
-                try:
-                    capture_time = datetime.strptime(capture_time_str, '%H:%M:%S').time()
-                except ValueError:
-                    logger.warning(f"Không thể parse thời gian: {capture_time_str}")
-                    continue
-            else:
-                capture_time = capture_time_str
-            
-            # So sánh thời gian (chỉ so sánh giờ và phút, bỏ qua giây)
-            if (current_time.hour == capture_time.hour and 
-                current_time.minute == capture_time.minute):
-                matching_schedules.append(schedule)
-                logger.info(f"✅ Thời gian khớp với lịch chụp: {capture_time_str}")
-        
-        if not matching_schedules:
-            logger.info("Không có lịch chụp nào khớp với thời gian hiện tại.")
+            capture_time = self._parse_capture_time(schedule['capture_time'])
+            if capture_time is None:
+                continue
+            job_id = f"{SCHEDULE_JOB_PREFIX}{capture_time.hour:02d}{capture_time.minute:02d}"
+            desired_jobs.setdefault(job_id, (capture_time, []))[1].append(schedule['schedule_time_id'])
+        self._capture_times = [capture_time for capture_time, _ in desired_jobs.values()]
+        # Warm-up chỉ có ích khi chính process này capture (không dùng khi job được worker khác claim)
+        warmup_enabled = capture_warmup_pool.enabled and not CAPTURE_QUEUE_ENABLED
+        warmup_jobs = {f"{WARMUP_JOB_PREFIX}{job_id[len(SCHEDULE_JOB_PREFIX):]}": capture_time
+                       for job_id, (capture_time, _) in desired_jobs.items()} if warmup_enabled else {}
+
+        with self._schedule_sync_lock:
+            for job in self.scheduler.get_jobs():
+                if job.id.startswith(SCHEDULE_JOB_PREFIX) and job.id not in desired_jobs \
+                        or job.id.startswith(WARMUP_JOB_PREFIX) and job.id not in warmup_jobs:
+                    self.scheduler.remove_job(job.id)
+                    logger.info(f"🗑️ Đã gỡ cron trigger {job.id}")
+
+            for job_id, capture_time in warmup_jobs.items():
+                warmup_at = self._warmup_time(capture_time)
+                self.scheduler.add_job(
+                    self._warm_up_sessions,
+                    CronTrigger(hour=warmup_at.hour, minute=warmup_at.minute, second=warmup_at.second),
+                    args=[capture_time.strftime('%H:%M')],
+                    id=job_id,
+                    replace_existing=True,
+                    misfire_grace_time=max(1, int(WARMUP_SECONDS)),
+                    coalesce=True
+                )
+
+            for job_id, (capture_time, schedule_ids) in desired_jobs.items():
+                self.scheduler.add_job(
+                    self._run_scheduled_capture,
+                    CronTrigger(hour=capture_time.hour, minute=capture_time.minute, second=0),
+                    args=[schedule_ids, capture_time.strftime('%H:%M')],
+                    id=job_id,
+                    replace_existing=True,
+                    misfire_grace_time=MISFIRE_GRACE_SECONDS,
+                    coalesce=True
+                )
+
+        self._schedule_fingerprint = fingerprint
+        logger.info(f"📅 Đã đồng bộ {len(desired_jobs)} cron trigger từ {len(active_schedules)} lịch chụp đang hoạt động")
+
+    def _check_schedule_changes(self):
+        """
+        Đồng bộ lại cron trigger khi schedule_times thay đổi. API chạy ở process khác
+        (RUN_SCHEDULER_IN_API=false) chỉ sửa database, worker nhận thay đổi qua lần kiểm tra này.
+        """
+        fingerprint = thread_safe_db_service.get_schedule_fingerprint_safe()
+        if fingerprint is None or fingerprint == self._schedule_fingerprint:
             return
-        
-        # Nếu có lịch chụp khớp, thực hiện xử lý camera
-        logger.info(f"🚀 Bắt đầu xử lý camera theo {len(matching_schedules)} lịch chụp khớp")
-        self._process_cameras()
+        logger.info("📅 schedule_times đã thay đổi, đồng bộ lại cron trigger")
+        self.sync_schedules()
+
+    @staticmethod
+    def _warmup_time(capture_time: dt_time) -> dt_time:
+        """Thời điểm mở trước phiên RTSP: capture_time - WARMUP_SECONDS (lùi qua nửa đêm nếu cần)"""
+        return (datetime.combine(datetime(2000, 1, 2).date(), capture_time)
+                - timedelta(seconds=WARMUP_SECONDS)).time()
 
-    def _process_single_camera(self, camera_info):
+    @staticmethod
+    def _assign_shard_keys(cameras) -> Dict[Any, str]:
         """
-        Xử lý một camera đơn lẻ - lấy frame, phát hiện QR và lưu vào database.
+        Camera cùng cặp (camera_pairs) phải do cùng một node chụp để đồng bộ được: gán shard_key
+        của nhóm trước khi chia camera theo node. Returns: {camera_id: group_key}
         """
-        camera_name = camera_info.get('name', 'N/A')
-        rtsp_url = camera_info.get('rtsp_url')
-        camera_id = camera_info.get('camera_id')
-        
-        if not rtsp_url:
-            logger.warning(f"Camera '{camera_name}' không có rtsp_url. Bỏ qua.")
-            return {"success": False, "camera_name": camera_name, "reason": "No RTSP URL"}
-        
-        try:
-            thread_id = threading.current_thread().name
-            
-            # Thời gian bắt đầu xử lý camera
-            camera_start_time = time.time()
-            start_dt = datetime.fromtimestamp(camera_start_time)
-            logger.info(f"[{thread_id}] 🎬 Bắt đầu xử lý Camera: {camera_name} (ID: {camera_id}) lúc: {start_dt.strftime('%H:%M:%S')}.{start_dt.microsecond//1000:03d}ms")
-            logger.info(f"[{thread_id}] 🔗 RTSP URL: {rtsp_url}")
-            
-            # 1. Lấy frame từ RTSP (sử dụng thread-safe service)
-            frame_start_time = time.time()
-            frame = thread_safe_rtsp_service.get_frame_from_rtsp(rtsp_url)
-            frame_end_time = time.time()
-            frame_duration = (frame_end_time - frame_start_time) * 1000
-
-            if frame is not None:
-                logger.info(f"[{thread_id}] ✅ Frame đã được lấy thành công trong {frame_duration:.2f}ms")
-                
-                # 2. Nếu lấy frame thành công, thực hiện nhận diện QR và lưu vào database
-                qr_start_time = time.time()
-                logger.info(f"[{thread_id}] 🔍 Bắt đầu phát hiện QR cho Camera: {camera_name}")
-                newly_found_rois = thread_safe_rtsp_service.qr_detection_saveToDb_safe(frame, camera_id)
-                qr_end_time = time.time()
-                qr_duration = (qr_end_time - qr_start_time) * 1000
-                
-                camera_end_time = time.time()
-                total_camera_duration = (camera_end_time - camera_start_time) * 1000
-                
-                if newly_found_rois:
-                    logger.info(f"[{thread_id}] 🎯 Các ROI mới tìm thấy cho {camera_name}: {len(newly_found_rois)} QR codes")
-                    # Log chi tiết từng QR code
-                    for j, detection in enumerate(newly_found_rois):
-                        rect, name, roi_width, center_x, center_y = detection
-                        logger.info(f"[{thread_id}]   QR {j+1}: {name} - Center: ({center_x}, {center_y}) - Width: {roi_width}")
-                    
-                    logger.info(f"[{thread_id}] ⏰ Thời gian QR detection: {qr_duration:.2f}ms")
-                    logger.info(f"[{thread_id}] ⏰ Tổng thời gian xử lý camera: {total_camera_duration:.2f}ms")
-                    end_dt = datetime.fromtimestamp(camera_end_time)
-                    logger.info(f"[{thread_id}] 🏁 Kết thúc xử lý Camera: {camera_name} lúc: {end_dt.strftime('%H:%M:%S')}.{end_dt.microsecond//1000:03d}ms (Thành công)")
-                    
-                    return {
-                        "success": True, 
-                        "camera_name": camera_name, 
-                        "qr_count": len(newly_found_rois),
-                        "qr_codes": newly_found_rois,
-                        "processing_time": total_camera_duration,
-                        "frame_time": frame_duration,
-                        "qr_time": qr_duration
-                    }
-                else:
-                    logger.info(f"[{thread_id}] ⚠️ Không tìm thấy ROI mới nào cho {camera_name}.")
-                    logger.info(f"[{thread_id}] ⏰ Thời gian QR detection: {qr_duration:.2f}ms")
-                    logger.info(f"[{thread_id}] ⏰ Tổng thời gian xử lý camera: {total_camera_duration:.2f}ms")
-                    end_dt = datetime.fromtimestamp(camera_end_time)
-                    logger.info(f"[{thread_id}] 🏁 Kết thúc xử lý Camera: {camera_name} lúc: {end_dt.strftime('%H:%M:%S')}.{end_dt.microsecond//1000:03d}ms (Không có QR)")
-                    
-                    return {
-                        "success": True, 
-                        "camera_name": camera_name, 
-                        "qr_count": 0,
-                        "qr_codes": [],
-                        "processing_time": total_camera_duration,
-                        "frame_time": frame_duration,
-                        "qr_time": qr_duration
-                    }
-            else:
-                camera_end_time = time.time()
-                total_camera_duration = (camera_end_time - camera_start_time) * 1000
-                logger.error(f"[{thread_id}] ❌ Không thể lấy frame cho Camera: {camera_name}")
-                logger.error(f"[{thread_id}] ⏰ Thời gian xử lý thất bại: {total_camera_duration:.2f}ms")
-                end_dt = datetime.fromtimestamp(camera_end_time)
-                logger.info(f"[{thread_id}] 🏁 Kết thúc xử lý Camera: {camera_name} lúc: {end_dt.strftime('%H:%M:%S')}.{end_dt.microsecond//1000:03d}ms (Lỗi frame)")
-                
-                return {
-                    "success": False, 
-                    "camera_name": camera_name, 
-                    "reason": "Cannot get frame",
-                    "processing_time": total_camera_duration,
-                    "frame_time": frame_duration,
-                    "qr_time": 0
-                }
-                
-        except Exception as e:
-            error_time = time.time()
-            total_error_duration = (error_time - camera_start_time) * 1000
-            logger.error(f"[{threading.current_thread().name}] ❌ Lỗi khi xử lý Camera {camera_name}: {e}")
-            logger.error(f"[{threading.current_thread().name}] ⏰ Thời gian xử lý lỗi: {total_error_duration:.2f}ms")
-            error_dt = datetime.fromtimestamp(error_time)
-            logger.info(f"[{threading.current_thread().name}] 🏁 Kết thúc xử lý Camera: {camera_name} lúc: {error_dt.strftime('%H:%M:%S')}.{error_dt.microsecond//1000:03d}ms (Lỗi)")
-            
-            return {
-                "success": False, 
-                "camera_name": camera_name, 
-                "reason": str(e),
-                "processing_time": total_error_duration,
-                "frame_time": 0,
-                "qr_time": 0
-            }
+        groups = pair_groups(thread_safe_db_service.get_camera_pairs_safe() or [])
+        for camera in cameras:
+            if camera['camera_id'] in groups:
+                camera['shard_key'] = groups[camera['camera_id']]
+        return groups
 
-    def _process_cameras(self):
+    def _warm_up_sessions(self, capture_time_str):
+        """
+        Mở trước phiên RTSP cho các camera node này sẽ chụp ở tick capture_time_str,
+        để tại tick chỉ còn đọc frame mới nhất thay vì kết nối + handshake + chờ keyframe.
+        """
+        cameras = thread_safe_db_service.get_cameras_safe()
+        if not cameras:
+            return
+        groups = self._assign_shard_keys(cameras)
+        # Camera dùng HTTP snapshot không giữ phiên RTSP nên không cần warm-up; camera thuộc cặp
+        # tự mở phiên qua PairSync nên phiên warm-up chỉ chiếm slot của host
+        cameras = [camera for camera in cluster_membership.select_cameras(cameras)
+                   if not camera_health_registry.is_open(camera.get('camera_id'))
+                   and camera['camera_id'] not in groups
+                   and resolve_backend(camera)[0].name != "http"]
+        logger.info(f"🔥 Warm-up cho lịch chụp {capture_time_str}: {len(cameras)} camera")
+        capture_warmup_pool.open(DedupedEngine.group_by_source(cameras))
+
+    def _run_scheduled_capture(self, schedule_ids, capture_time_str):
+        """
+        Được cron trigger gọi đúng thời điểm capture_time của lịch.
+        Lượt chạy đi qua run coordinator để không chạy chồng lên lượt trước.
+        """
+        now = datetime.now()
+        capture_time = datetime.strptime(capture_time_str, '%H:%M').time()
+        scheduled_for = datetime.combine(now.date(), capture_time)
+        if scheduled_for > now:
+            # Tick của ngày hôm trước được chạy trễ qua nửa đêm
+            scheduled_for -= timedelta(days=1)
+        logger.info(f"🚀 Bắt đầu xử lý camera theo lịch chụp {capture_time_str} (schedule_time_id: {schedule_ids})")
+        self.run_coordinator.submit(scheduled_for, "cron")
+
+    def _find_missed_tick(self, now: datetime) -> Optional[datetime]:
+        """
+        Tìm tick gần nhất trong cửa sổ CATCHUP_WINDOW_MINUTES chưa có lượt chạy nào
+        (ví dụ service đang khởi động lại đúng lúc capture_time).
+        """
+        if CATCHUP_WINDOW_MINUTES <= 0:
+            return None
+        window_start = now - timedelta(minutes=CATCHUP_WINDOW_MINUTES)
+        candidates = []
+        for capture_time in self._capture_times:
+            for day in (now.date(), now.date() - timedelta(days=1)):
+                tick = datetime.combine(day, capture_time)
+                if window_start <= tick <= now:
+                    candidates.append(tick)
+        if not candidates:
+            return None
+
+        recorded_ticks = thread_safe_db_service.get_capture_run_times_safe(window_start)
+        if recorded_ticks is None:
+            logger.error("❌ Không thể đọc capture_runs, bỏ qua chạy bù.")
+            return None
+        missed_ticks = [tick for tick in candidates if tick not in recorded_ticks]
+        # Chỉ chạy bù tick mới nhất: các tick cũ hơn sẽ cho cùng một ảnh hiện tại
+        return max(missed_ticks) if missed_ticks else None
+
+    def _schedule_catchup(self):
+        missed_tick = self._find_missed_tick(datetime.now())
+        if missed_tick is None:
+            return
+        logger.warning(f"🔁 Phát hiện tick {missed_tick:%Y-%m-%d %H:%M} bị lỡ, chạy bù ngay")
+        self.scheduler.add_job(
+            self.run_coordinator.submit,
+            'date',
+            run_date=datetime.now(),
+            args=[missed_tick, "catchup"],
+            id='capture_catchup_job',
+            replace_existing=True
+        )
+
+    @property
+    def capture_engine(self):
+        """Engine xử lý camera theo cấu hình CAPTURE_ENGINE"""
+        if CAPTURE_ENGINE == "asyncio":
+            return async_capture_orchestrator
+        return capture_pipeline
+
+    def _process_cameras(self, run_id: Optional[str] = None, scheduled_for: Optional[datetime] = None):
         """
         Xử lý tất cả camera đồng thời - lấy frame, phát hiện QR và lưu vào database.
+        Trả về số camera đã xử lý/thành công, hoặc None nếu lượt chạy thất bại.
         """
-        logger.info("🚀 Bắt đầu tác vụ: Lấy danh sách camera từ Database.")
+        run_id = run_id or RunCoordinator.new_run_id()
+        logger.info(f"🚀 [run {run_id}] Bắt đầu tác vụ: Lấy danh sách camera từ Database.")
         
         conn = None
         try:
             conn = get_connection()
             if conn is None:
                 logger.error("❌ Không thể kết nối đến database để lấy danh sách camera.")
-                return
+                return None
 
             with conn.cursor() as cursor:
-                cursor.execute("SELECT name, rtsp_url, camera_id FROM cameras")
+                cursor.execute("SELECT name, rtsp_url, capture_backend, snapshot_url, camera_id FROM cameras")
                 cameras = cursor.fetchall()
 
             if not cameras:
                 logger.warning("⚠️ Không có camera nào được tìm thấy từ Database.")
-                return
+                return {"camera_count": 0, "success_count": 0}
+
+            groups = self._assign_shard_keys(cameras)
 
-            logger.info(f"📹 Tìm thấy {len(cameras)} camera. Bắt đầu xử lý đồng thời với {self.max_workers} threads...")
+            # Chỉ giữ các camera mà node này phụ trách trong cluster
+            cameras = cluster_membership.select_cameras(cameras)
+            if not cameras:
+                logger.info(f"🧩 [run {run_id}] Node không phụ trách camera nào trong lượt này.")
+                return {"camera_count": 0, "success_count": 0}
+
+            logger.info(f"📹 Tìm thấy {len(cameras)} camera. Bắt đầu xử lý với engine: {CAPTURE_ENGINE}...")
             
             # Thêm thông tin thời gian bắt đầu
             start_time = datetime.now()
             
-            # Sử dụng ThreadPoolExecutor để xử lý camera đồng thời
-            with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="CameraWorker") as executor:
-                # Gửi tất cả các camera vào thread pool
-                future_to_camera = {
-                    executor.submit(self._process_single_camera, camera): camera 
-                    for camera in cameras
-                }
-                
-                # Theo dõi tiến trình và kết quả
-                successful_cameras = []
-                failed_cameras = []
-                total_qr_codes = 0
-                total_frame_time = 0
-                total_qr_time = 0
-                
-                # Thêm timeout cho việc xử lý
-                for future in as_completed(future_to_camera, timeout=self.timeout_seconds):
-                    camera = future_to_camera[future]
-                    camera_name = camera.get('name', 'N/A')
-                    
-                    try:
-                        result = future.result()
-                        if result["success"]:
-                            successful_cameras.append(camera_name)
-                            total_qr_codes += result.get("qr_count", 0)
-                            total_frame_time += result.get("frame_time", 0)
-                            total_qr_time += result.get("qr_time", 0)
-                        else:
-                            failed_cameras.append({
-                                "name": camera_name,
-                                "reason": result.get("reason", "Unknown error"),
-                                "processing_time": result.get("processing_time", 0)
-                            })
-                    except Exception as e:
-                        logger.error(f"❌ Lỗi khi xử lý camera {camera_name}: {e}")
-                        failed_cameras.append({
-                            "name": camera_name,
-                            "reason": str(e),
-                            "processing_time": 0
-                        })
-                
-                # Tính toán thời gian xử lý
-                end_time = datetime.now()
-                processing_time = (end_time - start_time).total_seconds()
-                
-                # Tổng kết kết quả
-                logger.info(f"🎉 Hoàn thành xử lý {len(cameras)} camera trong {processing_time:.2f} giây ({processing_time*1000:.2f}ms):")
-                logger.info(f"  ✅ Thành công: {len(successful_cameras)} camera")
-                logger.info(f"  🔍 Tổng QR codes tìm thấy: {total_qr_codes}")
-                logger.info(f"  ⏰ Tổng thời gian frame: {total_frame_time:.2f}ms")
-                logger.info(f"  ⏰ Tổng thời gian QR detection: {total_qr_time:.2f}ms")
-                logger.info(f"  ⏰ Thời gian trung bình/camera: {(processing_time*1000)/len(cameras):.2f}ms")
-                logger.info(f"  🏁 Kết thúc tất cả camera lúc: {end_time.strftime('%H:%M:%S')}.{end_time.microsecond//1000:03d}ms")
-                
-                if successful_cameras:
-                    logger.info(f"  📹 Camera thành công: {', '.join(successful_cameras)}")
-                
-                if failed_cameras:
-                    logger.warning(f"  ❌ Thất bại: {len(failed_cameras)} camera")
-                    for failed_camera in failed_cameras:
-                        logger.warning(f"    - {failed_camera['name']}: {failed_camera['reason']} (Thời gian: {failed_camera['processing_time']:.2f}ms)")
+            # Rải thời điểm bắt đầu capture trong cửa sổ sau capture_time
+            for camera, offset in zip(cameras, capture_spread_planner.plan(cameras)):
+                # Camera đã có phiên warm-up được chụp ngay tại tick
+                camera['start_offset'] = 0.0 if capture_warmup_pool.has(camera.get('rtsp_url')) else offset
+            if capture_spread_planner.policy != "none":
+                logger.info(f"⏱️ [run {run_id}] Rải {len(cameras)} camera trong {capture_spread_planner.window_seconds}s "
+                            f"(policy: {capture_spread_planner.policy})")
+
+            if CAPTURE_QUEUE_ENABLED:
+                # Worker (có thể ở process/máy khác) claim job từ capture_jobs, retry nếu thất bại
+                job_count = capture_job_queue.enqueue(run_id, scheduled_for, cameras, groups)
+                self.last_run = {"run_id": run_id, "scheduled_for": scheduled_for, "enqueued_jobs": job_count}
+                return {"camera_count": len(cameras), "success_count": 0}
+
+            # Pipeline capture -> detect -> persist hoặc asyncio orchestrator
+            # (camera đang mở circuit bị bỏ qua, chỉ được probe khi hết backoff; camera cùng cặp được chụp đồng bộ)
+            results = camera_health_registry.run(DedupedEngine(PairedCaptureEngine(self.capture_engine, groups), groups),
+                                                 cameras, scheduled_for)
+            capture_spread_planner.observe(results)
+            
+            # Theo dõi tiến trình và kết quả
+            successful_cameras = []
+            failed_cameras = []
+            total_qr_codes = 0
+            total_frame_time = 0
+            total_qr_time = 0
+            
+            for result in results:
+                camera_name = result.get("camera_name", "N/A")
+                if result["success"]:
+                    successful_cameras.append(camera_name)
+                    total_qr_codes += result.get("qr_count", 0)
+                    total_frame_time += result.get("frame_time", 0)
+                    total_qr_time += result.get("qr_time", 0)
+                else:
+                    failed_cameras.append({
+                        "name": camera_name,
+                        "reason": result.get("reason", "Unknown error"),
+                        "processing_time": result.get("processing_time", 0)
+                    })
+            
+            # Tính toán thời gian xử lý
+            end_time = datetime.now()
+            processing_time = (end_time - start_time).total_seconds()
+            
+            # Tổng kết kết quả
+            logger.info(f"🎉 [run {run_id}] Hoàn thành xử lý {len(cameras)} camera trong {processing_time:.2f} giây ({processing_time*1000:.2f}ms):")
+            logger.info(f"  ✅ Thành công: {len(successful_cameras)} camera")
+            logger.info(f"  🔍 Tổng QR codes tìm thấy: {total_qr_codes}")
+            logger.info(f"  ⏰ Tổng thời gian frame: {total_frame_time:.2f}ms")
+            logger.info(f"  ⏰ Tổng thời gian QR detection: {total_qr_time:.2f}ms")
+            logger.info(f"  ⏰ Thời gian trung bình/camera: {(processing_time*1000)/len(cameras):.2f}ms")
+            logger.info(f"  🏁 Kết thúc tất cả camera lúc: {end_time.strftime('%H:%M:%S')}.{end_time.microsecond//1000:03d}ms")
+            
+            if successful_cameras:
+                logger.info(f"  📹 Camera thành công: {', '.join(successful_cameras)}")
+            
+            if failed_cameras:
+                logger.warning(f"  ❌ Thất bại: {len(failed_cameras)} camera")
+                for failed_camera in failed_cameras:
+                    logger.warning(f"    - {failed_camera['name']}: {failed_camera['reason']} (Thời gian: {failed_camera['processing_time']:.2f}ms)")
+
+            self.last_run = {
+                "run_id": run_id,
+                "scheduled_for": scheduled_for,
+                "finished_at": end_time,
+                "camera_count": len(cameras),
+                "success_count": len(successful_cameras),
+                "qr_count": total_qr_codes,
+                "duration_ms": round(processing_time * 1000, 2),
+            }
+            return {"camera_count": len(cameras), "success_count": len(successful_cameras)}
 
         except Exception as e:
-            logger.error(f"❌ Lỗi không xác định trong tác vụ: {e}")
+            logger.error(f"❌ [run {run_id}] Lỗi không xác định trong tác vụ: {e}")
+            return None
         finally:
             if conn:
                 conn.close()
                 logger.debug("Database connection closed.")
 
+    def get_stats(self):
+        """
+        Thống kê của node: lượt chạy gần nhất và thống kê của capture engine
+        """
+        return {
+            "engine": CAPTURE_ENGINE,
+            "active_run_id": self.run_coordinator.active_run_id,
+            "last_run": self.last_run,
+            "capture": self.capture_engine.last_stats,
+            "scheduled_jobs": len(self._capture_times),
+            "queue": capture_job_queue.local_stats if CAPTURE_QUEUE_ENABLED else None,
+            "open_circuits": camera_health_registry.open_count(),
+            "warmup": capture_warmup_pool.last_stats,
+        }
+
     def start(self):
         """
-        Thêm công việc vào scheduler và bắt đầu chạy.
-        Tính toán thời gian bắt đầu vào phút tiếp theo.
-        Ví dụ: nếu start lúc 2:40:10 thì sẽ bắt đầu lúc 2:41:00 (realtime)
+        Đăng ký một cron trigger cho mỗi lịch chụp đang hoạt động và bắt đầu scheduler.
+        Các trigger được đồng bộ lại định kỳ để nhận thay đổi được sửa trực tiếp trong database.
         """
         logger.info("Khởi động dịch vụ tác vụ nền...")
-        
-        # Tính toán thời gian bắt đầu vào phút tiếp theo (realtime)
-        now = datetime.now()
-        # Tính thời gian đến phút tiếp theo với giây = 0
-        next_minute = now.replace(second=0, microsecond=0) + timedelta(minutes=1)
-        
-        logger.info(f"Thời gian hiện tại: {now.strftime('%H:%M:%S')}")
-        logger.info(f"Sẽ bắt đầu kiểm tra lúc: {next_minute.strftime('%H:%M:%S')}")
-        
-        # Thêm job đầu tiên để chạy vào thời điểm đã tính toán
+
+        self.sync_schedules()
+        cluster_membership.heartbeat()
+
         self.scheduler.add_job(
-            self._check_and_process_cameras,
-            'date',
-            run_date=next_minute,
-            id='initial_camera_processing_job',
+            cluster_membership.heartbeat,
+            'interval',
+            seconds=CLUSTER_HEARTBEAT_SECONDS,
+            id='cluster_heartbeat_job',
             replace_existing=True
         )
-        
-        # Thêm job định kỳ để chạy mỗi phút sau lần đầu tiên
+
         self.scheduler.add_job(
-            self._check_and_process_cameras,
+            self._check_schedule_changes,
             'interval',
-            minutes=1,
-            id='periodic_camera_processing_job',
+            seconds=SCHEDULE_CHANGE_POLL_SECONDS,
+            id='schedule_change_job',
             replace_existing=True,
-            start_date=next_minute + timedelta(minutes=1)  # Bắt đầu từ phút thứ 2
+            coalesce=True
         )
-        
+
+        self.scheduler.add_job(
+            self.sync_schedules,
+            'interval',
+            minutes=SCHEDULE_RESYNC_MINUTES,
+            id='schedule_resync_job',
+            replace_existing=True
+        )
+
         self.scheduler.start()
-        logger.info("Dịch vụ tác vụ nền đã bắt đầu, sẽ kiểm tra mỗi phút từ thời điểm đã lên lịch.")
+        self._schedule_catchup()
+        if CAPTURE_QUEUE_ENABLED:
+            capture_job_queue.start_consumer(lambda: self.capture_engine)
+        logger.info("Dịch vụ tác vụ nền đã bắt đầu, camera sẽ được xử lý theo cron trigger của từng lịch chụp.")
 
     def stop(self):
         """
@@ -331,6 +430,12 @@ class CameraTaskServiceTest:
         """
         logger.info("Dừng dịch vụ tác vụ nền...")
         self.scheduler.shutdown()
+        if CAPTURE_QUEUE_ENABLED:
+            capture_job_queue.stop_consumer(timeout=self.timeout_seconds)
+        # Ghi nốt các ảnh còn trong queue trước khi process kết thúc
+        if not frame_archive_writer.flush(timeout=self.timeout_seconds):
+            logger.warning("⚠️ Hết thời gian chờ ghi ảnh, một số ảnh chưa được lưu")
+        cluster_membership.leave()
         logger.info("Dịch vụ tác vụ nền đã dừng.")
 
 # Tạo một instance để có thể import và sử dụng ở nơi khác
@@ -0,0 +1,47 @@
+"""
+Capture worker chạy riêng, tách khỏi process API:
+
+    python -m task.worker
+
+Worker chạy scheduler + capture engine; liveness và thống kê được ghi vào bảng
+scheduler_nodes qua heartbeat (role = 'worker'). Khi dùng worker, đặt
+RUN_SCHEDULER_IN_API=false để API khởi động không kèm scheduler.
+"""
+import logging
+import signal
+import sys
+import os
+import threading
+
+# Thêm đường dẫn gốc của dự án vào sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from task.test_task import camera_task_service
+from services.cluster_membership import cluster_membership
+
+logger = logging.getLogger(__name__)
+
+
+def main():
+    stop_event = threading.Event()
+
+    def handle_signal(signum, frame):
+        logger.info(f"🛑 Nhận tín hiệu {signal.Signals(signum).name}, dừng worker...")
+        stop_event.set()
+
+    signal.signal(signal.SIGINT, handle_signal)
+    signal.signal(signal.SIGTERM, handle_signal)
+
+    cluster_membership.role = "worker"
+    camera_task_service.start()
+    logger.info(f"👷 Capture worker {cluster_membership.node_id} đang chạy (PID {os.getpid()})")
+
+    try:
+        stop_event.wait()
+    finally:
+        camera_task_service.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,85 @@
+"""
+Cấu hình chung cho unit test: chạy từ thư mục gốc repo (`python -m pytest tests`),
+không cần database hay camera thật (các phụ thuộc được thay bằng fake trong từng test).
+"""
+import contextlib
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class FakeCursor:
+    """Ghi lại các câu lệnh; fetchall/fetchone trả lần lượt các kết quả trong results"""
+
+    def __init__(self, results=None, rowcount=1):
+        self.results = list(results or [])
+        self.rowcount = rowcount
+        self.statements = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query, params=None):
+        self.statements.append((" ".join(query.split()), params))
+        return self.rowcount
+
+    def executemany(self, query, rows):
+        self.statements.append((" ".join(query.split()), list(rows)))
+        return len(rows)
+
+    def fetchall(self):
+        return self.results.pop(0)
+
+    def fetchone(self):
+        return self.results.pop(0)
+
+
+class FakeConnection:
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self.commits = 0
+
+    def cursor(self):
+        return self._cursor
+
+    def commit(self):
+        self.commits += 1
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    """Thay connection của thread_safe_db_service bằng FakeConnection dùng chung một FakeCursor"""
+    from services.thread_safe_db_service import thread_safe_db_service
+
+    cursor = FakeCursor()
+
+    @contextlib.contextmanager
+    def get_db_connection():
+        yield FakeConnection(cursor)
+
+    monkeypatch.setattr(thread_safe_db_service, "get_db_connection", get_db_connection)
+    return cursor
+
+
+@pytest.fixture
+def fake_connection(monkeypatch):
+    """
+    Thay get_connection() của một module API (endpoint dùng connection trực tiếp)
+    bằng FakeConnection; trả về FakeCursor được dùng chung
+    """
+    cursor = FakeCursor()
+
+    def patch(module):
+        monkeypatch.setattr(module, "get_connection", lambda: FakeConnection(cursor))
+        return cursor
+
+    return patch
@@ -0,0 +1,77 @@
+"""
+Unit test cho AsyncCaptureOrchestrator._offload_capture: executor capture riêng và trả frame muộn về pool
+"""
+import asyncio
+import threading
+import time
+
+import pytest
+
+import services.async_capture_orchestrator as orchestrator_module
+from services.async_capture_orchestrator import AsyncCaptureOrchestrator
+from services.frame_pool import FramePool, readonly
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    pool = FramePool(enabled=True)
+    monkeypatch.setattr(orchestrator_module, "frame_pool", pool)
+    return pool
+
+
+def test_offload_returns_result():
+    orchestrator = AsyncCaptureOrchestrator(capture_threads=1)
+
+    async def main():
+        return await orchestrator._offload_capture(lambda: ([1], None))
+
+    assert asyncio.run(main()) == ([1], None)
+
+
+def test_offload_runs_on_dedicated_executor():
+    orchestrator = AsyncCaptureOrchestrator(capture_threads=1)
+
+    async def main():
+        return await orchestrator._offload_capture(lambda: threading.current_thread().name)
+
+    assert asyncio.run(main()).startswith("AsyncCapture")
+
+
+def test_late_frames_are_released_after_deadline(pool):
+    orchestrator = AsyncCaptureOrchestrator(capture_threads=1)
+    finished = threading.Event()
+
+    def slow_grab():
+        buffer = pool.acquire((4, 4, 3))
+        time.sleep(0.2)
+        finished.set()
+        return [readonly(buffer)], None
+
+    async def main():
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(orchestrator._offload_capture(slow_grab), timeout=0.02)
+        assert pool.snapshot()["in_use"] == 1
+        await asyncio.sleep(0.4)
+
+    asyncio.run(main())
+    assert finished.is_set()
+    assert pool.snapshot()["in_use"] == 0
+    assert pool.acquire((4, 4, 3)) is not None and pool.reused == 1
+
+
+def test_pending_job_is_cancelled_with_waiter(pool):
+    orchestrator = AsyncCaptureOrchestrator(capture_threads=1)
+    calls = []
+    blocker = threading.Event()
+
+    async def main():
+        first = orchestrator._offload_capture(blocker.wait, 1)
+        second = orchestrator._offload_capture(calls.append, "ran")
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(second, timeout=0.02)
+        blocker.set()
+        await first
+        await asyncio.sleep(0.05)
+
+    asyncio.run(main())
+    assert calls == []
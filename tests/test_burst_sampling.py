@@ -0,0 +1,61 @@
+"""
+Unit test cho việc gộp kết quả phát hiện QR của một burst frame (services/burst_sampling.py)
+"""
+import pytest
+
+from services.burst_sampling import aggregate_detections, trimmed_mean
+
+
+def roi(name, center_x, center_y, width=40):
+    rect = (center_x - width // 2, center_y - width // 2, center_x + width // 2, center_y + width // 2)
+    return (rect, name, width, center_x, center_y)
+
+
+def test_median_center_rejects_outlier_frame():
+    detections = [[roi("QR1", 100, 200)], [roi("QR1", 102, 201)], [roi("QR1", 160, 260)]]
+
+    rois, stats = aggregate_detections(detections, method="median")
+
+    assert [(name, x, y) for _, name, _, x, y in rois] == [("QR1", 102, 201)]
+    # Rect lấy từ frame có tâm gần tâm gộp nhất
+    assert rois[0][0] == roi("QR1", 102, 201)[0]
+    assert stats["QR1"]["sample_count"] == 3
+    assert stats["QR1"]["dispersion"] == pytest.approx(47.784, abs=0.001)
+
+
+def test_qr_missing_in_some_frames_keeps_own_sample_count():
+    detections = [[roi("QR1", 100, 200), roi("QR2", 300, 50)], [roi("QR1", 100, 202)], []]
+
+    rois, stats = aggregate_detections(detections)
+
+    assert sorted(name for _, name, _, _, _ in rois) == ["QR1", "QR2"]
+    assert stats["QR1"]["sample_count"] == 2 and stats["QR2"] == {"sample_count": 1, "dispersion": 0.0}
+
+
+def test_trimmed_mean():
+    assert trimmed_mean([1, 2, 3, 4, 100], 0.2) == 3
+    # Quá ít giá trị để cắt thì giữ nguyên
+    assert trimmed_mean([1, 3], 0.4) == 2
+
+
+def test_trimmed_mean_method():
+    detections = [[roi("QR1", x, 10)] for x in (10, 11, 12, 13, 90)]
+    rois, _ = aggregate_detections(detections, method="trimmed_mean", trim_fraction=0.2)
+    assert rois[0][3] == 12
+
+
+def test_unnamed_qr_codes_are_matched_by_nearest_center():
+    # QR không đọc được nội dung: thứ tự phát hiện (và tên theo index) đổi giữa các frame
+    detections = [
+        [roi("QR_Camera_7_0", 100, 100), roi("QR_Camera_7_1", 400, 300)],
+        [roi("QR_Camera_7_0", 402, 301), roi("QR_Camera_7_1", 101, 99)],
+        [roi("QR_Camera_7_0", 800, 600)],
+    ]
+
+    rois, stats = aggregate_detections(detections, tolerance=25)
+
+    centers = {name: (x, y) for _, name, _, x, y in rois}
+    assert centers["QR_Camera_7_0"] == (100, 100) and stats["QR_Camera_7_0"]["sample_count"] == 2
+    assert centers["QR_Camera_7_1"] == (401, 300) and stats["QR_Camera_7_1"]["sample_count"] == 2
+    # Ngoài phạm vi của mọi nhóm: QR mới với tên chưa dùng
+    assert centers["QR_Camera_7_2"] == (800, 600) and stats["QR_Camera_7_2"]["sample_count"] == 1
@@ -0,0 +1,64 @@
+"""
+Unit test cho circuit breaker của camera (services/camera_health.py) và việc ghi tình trạng vào camera_health
+"""
+from services.camera_health import CameraHealthRegistry, CLOSED, OPEN
+
+
+class FailingEngine:
+    def __init__(self, fail_ids):
+        self.fail_ids = set(fail_ids)
+        self.calls = []
+
+    def run(self, cameras, scheduled_for=None):
+        self.calls.append([camera['camera_id'] for camera in cameras])
+        return [{"camera_id": camera['camera_id'], "camera_name": camera['name'],
+                 "success": camera['camera_id'] not in self.fail_ids, "reason": "Timeout",
+                 "frame_time": 10.0, "processing_time": 20.0}
+                for camera in cameras]
+
+
+CAMERAS = [{"camera_id": 1, "name": "cam1", "rtsp_url": "rtsp://10.0.0.1/1"},
+           {"camera_id": 2, "name": "cam2", "rtsp_url": "rtsp://10.0.0.2/1"}]
+
+
+def test_circuit_opens_after_threshold_and_is_persisted(fake_db):
+    registry = CameraHealthRegistry(failure_threshold=2, backoff_base=60)
+    engine = FailingEngine(fail_ids=[2])
+
+    registry.run(engine, CAMERAS)
+    registry.run(engine, CAMERAS)
+    results = registry.run(engine, CAMERAS)
+
+    assert engine.calls[-1] == [1]
+    skipped = [result for result in results if result.get("skipped")]
+    assert [result["camera_id"] for result in skipped] == [2]
+    assert registry.is_open(2) and not registry.is_open(1)
+
+    query, rows = fake_db.statements[-1]
+    assert query.startswith("INSERT INTO camera_health")
+    by_camera = {row[0]: row for row in rows}
+    # (camera_id, camera_name, node_id, state, consecutive_failures, ...)
+    assert by_camera[1][3] == CLOSED and by_camera[2][3] == OPEN
+    assert by_camera[2][4] == 2
+    assert by_camera[2][11] is not None  # open_until
+
+
+def test_database_error_does_not_break_run(monkeypatch):
+    from services.thread_safe_db_service import thread_safe_db_service
+    monkeypatch.setattr(thread_safe_db_service, "save_camera_health_safe", lambda node_id, items: False)
+    registry = CameraHealthRegistry()
+    results = registry.run(FailingEngine(fail_ids=[]), CAMERAS)
+    assert all(result["success"] for result in results)
+
+
+def test_probe_targets_capture_url_of_backend(fake_db, monkeypatch):
+    registry = CameraHealthRegistry(failure_threshold=1, backoff_base=0)
+    probed = []
+    monkeypatch.setattr(registry, "probe", lambda url: probed.append(url) or True)
+    cameras = [dict(CAMERAS[0], snapshot_url="http://10.0.0.9:8080/snap/1")]
+
+    registry.run(FailingEngine(fail_ids=[1]), cameras)
+    registry.run(FailingEngine(fail_ids=[]), cameras)
+
+    assert probed == ["http://10.0.0.9:8080/snap/1"]
+    assert not registry.is_open(1)
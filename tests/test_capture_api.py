@@ -0,0 +1,25 @@
+"""
+Unit test cho các endpoint thống kê capture (api/capture.py) đọc từ database giả
+"""
+import json
+from datetime import datetime
+
+from api.capture import get_capture_stats
+
+
+def test_capture_stats_come_from_live_node_heartbeats(fake_db):
+    heartbeat_at = datetime(2026, 1, 1, 8, 0, 5)
+    fake_db.results = [[
+        {"node_id": "worker-1", "hostname": "h1", "pid": 1, "role": "worker", "started_at": heartbeat_at,
+         "heartbeat_at": heartbeat_at, "alive": 1,
+         "stats": json.dumps({"engine": "pipeline", "last_run": {"run_id": "r1"}, "capture": {"stages": {}}})},
+        {"node_id": "worker-2", "hostname": "h2", "pid": 2, "role": "worker", "started_at": heartbeat_at,
+         "heartbeat_at": heartbeat_at, "alive": 0, "stats": json.dumps({"engine": "pipeline"})},
+        {"node_id": "api-1", "hostname": "h3", "pid": 3, "role": "api", "started_at": heartbeat_at,
+         "heartbeat_at": heartbeat_at, "alive": 1, "stats": None},
+    ]]
+
+    stats = get_capture_stats()
+
+    assert stats == [{"node_id": "worker-1", "role": "worker", "heartbeat_at": heartbeat_at, "engine": "pipeline",
+                      "last_run": {"run_id": "r1"}, "capture": {"stages": {}}}]
@@ -0,0 +1,139 @@
+"""
+Unit test cho hàng đợi job capture (services/capture_job_queue.py) với connection/cursor giả
+"""
+from datetime import datetime
+
+import services.capture_job_queue as capture_job_queue_module
+from services.capture_job_queue import CaptureJobQueue
+
+
+def job(job_id, camera_id, pair_leader_id=None, attempts=0, expired=0):
+    return {"job_id": job_id, "run_id": "run1", "camera_id": camera_id, "pair_leader_id": pair_leader_id,
+            "scheduled_for": datetime(2026, 1, 1, 8, 0), "attempts": attempts, "expired": expired}
+
+
+def test_enqueue_gives_pair_group_one_leader_and_offset(fake_db):
+    cameras = [{"camera_id": 1, "start_offset": 3.0}, {"camera_id": 2, "start_offset": 1.5},
+               {"camera_id": 3, "start_offset": 2.0}, {"camera_id": 4, "start_offset": 0.5}]
+    groups = {1: "pair:1", 2: "pair:1", 4: "pair:4", 9: "pair:4"}
+
+    assert CaptureJobQueue().enqueue("run1", datetime(2026, 1, 1, 8, 0), cameras, groups) == 4
+
+    _, rows = fake_db.statements[0]
+    by_camera = {row[1]: row for row in rows}
+    # (run_id, camera_id, pair_leader_id, scheduled_for, offset_us, window)
+    assert by_camera[1][2] == by_camera[2][2] == 1
+    assert by_camera[1][4] == by_camera[2][4] == 1_500_000
+    assert by_camera[3][2] is None and by_camera[3][4] == 2_000_000
+    # Nhóm chỉ còn một camera trên node này thì không cần đồng bộ
+    assert by_camera[4][2] is None and by_camera[4][4] == 500_000
+
+
+def test_claim_pulls_in_pair_members_of_leader(fake_db):
+    fake_db.results = [
+        [job(10, 1, pair_leader_id=1), job(11, 5)],
+        [job(12, 2, pair_leader_id=1, attempts=1)],
+        [{"camera_id": camera_id, "name": f"cam{camera_id}", "rtsp_url": f"rtsp://cam{camera_id}",
+          "capture_backend": None, "snapshot_url": None} for camera_id in (1, 2, 5)],
+    ]
+
+    jobs = CaptureJobQueue().claim()
+
+    assert sorted(job['camera_id'] for job in jobs) == [1, 2, 5]
+    sibling_query, sibling_params = fake_db.statements[1]
+    assert "(run_id, pair_leader_id) IN ((%s, %s))" in sibling_query
+    assert sibling_params == ["run1", 1]
+    lease_query, lease_params = fake_db.statements[2]
+    assert lease_query.startswith("UPDATE capture_jobs SET status = 'leased'")
+    assert sorted(lease_params[2:]) == [10, 11, 12]
+    assert all(job['camera'] is not None for job in jobs)
+
+
+def test_process_syncs_pair_jobs(fake_db, monkeypatch):
+    class RecordingEngine:
+        last_stats = None
+
+        def __init__(self):
+            self.cameras = []
+
+        def run(self, cameras, scheduled_for=None):
+            self.cameras = cameras
+            return [{"camera_id": camera['camera_id'], "success": True} for camera in cameras]
+
+    monkeypatch.setattr(capture_job_queue_module.camera_health_registry, "run",
+                        lambda engine, cameras, scheduled_for=None: engine.run(cameras, scheduled_for))
+    jobs = [dict(job(10, 1, pair_leader_id=1, attempts=1), camera={"camera_id": 1, "rtsp_url": "rtsp://a/1"}),
+            dict(job(12, 2, pair_leader_id=1, attempts=1), camera={"camera_id": 2, "rtsp_url": "rtsp://b/2"}),
+            dict(job(11, 5, attempts=1), camera={"camera_id": 5, "rtsp_url": "rtsp://c/5"})]
+    engine = RecordingEngine()
+
+    CaptureJobQueue().process(jobs, engine)
+
+    syncs = {camera['camera_id']: camera.get('pair_sync') for camera in engine.cameras}
+    assert syncs[1] is not None and syncs[1] is syncs[2] and syncs[1].parties == 2
+    assert syncs[5] is None
+
+
+def test_claim_fails_expired_jobs_and_leases_the_rest(fake_db):
+    fake_db.results = [
+        [job(10, 1, attempts=2, expired=1), job(11, 2)],
+        [{"camera_id": 2, "name": "cam2", "rtsp_url": "rtsp://cam2", "capture_backend": None, "snapshot_url": None}],
+    ]
+    queue = CaptureJobQueue()
+
+    jobs = queue.claim()
+
+    assert [job['job_id'] for job in jobs] == [11]
+    assert jobs[0]['attempts'] == 1
+    expire_query, expire_params = fake_db.statements[1]
+    assert "SET status = 'failed'" in expire_query and expire_params == [10]
+    lease_query, lease_params = fake_db.statements[2]
+    assert "SET status = 'leased'" in lease_query and lease_params == [queue.worker_id, queue.lease_seconds, 11]
+    assert queue.local_stats["claimed"] == 1 and queue.local_stats["failed"] == 1
+
+
+def test_claim_returns_nothing_when_no_job_is_due(fake_db):
+    fake_db.results = [[]]
+    assert CaptureJobQueue().claim() == []
+    assert len(fake_db.statements) == 1
+
+
+def test_fail_retries_with_exponential_backoff(fake_db):
+    fake_db.results = [{"status": "pending"}]
+    queue = CaptureJobQueue(max_attempts=3, retry_base_seconds=5)
+
+    assert queue.fail(job(10, 1, attempts=2), "Timeout")
+
+    _, params = fake_db.statements[0]
+    # (max_attempts, backoff, backoff, reason, job_id, worker_id)
+    assert params == (3, 10, 10, "Timeout", 10, queue.worker_id)
+    assert queue.local_stats["retried"] == 1
+
+
+def test_fail_without_attempts_left_marks_failed(fake_db):
+    fake_db.results = [{"status": "failed"}, {"status": "failed"}]
+    queue = CaptureJobQueue(max_attempts=3)
+    queue.fail(job(10, 1, attempts=3), "Timeout")
+    queue.fail(job(11, 2, attempts=1), "No RTSP URL", retry=False)
+    assert queue.local_stats == {"claimed": 0, "done": 0, "retried": 0, "failed": 2, "lost_lease": 0}
+
+
+def test_fail_past_deadline_counts_as_failed_despite_attempts_left(fake_db):
+    # Còn lượt thử nhưng retry sẽ quá deadline_at: database ghi failed
+    fake_db.results = [{"status": "failed"}]
+    queue = CaptureJobQueue(max_attempts=3)
+
+    assert queue.fail(job(10, 1, attempts=1), "Timeout")
+
+    assert fake_db.statements[1] == ("SELECT status FROM capture_jobs WHERE job_id = %s", (10,))
+    assert queue.local_stats["retried"] == 0 and queue.local_stats["failed"] == 1
+
+
+def test_lost_lease_is_counted_separately(fake_db):
+    fake_db.rowcount = 0
+    queue = CaptureJobQueue()
+
+    assert not queue.complete(job(10, 1, attempts=1))
+    assert not queue.fail(job(11, 2, attempts=1), "Timeout")
+
+    assert queue.local_stats == {"claimed": 0, "done": 0, "retried": 0, "failed": 0, "lost_lease": 2}
@@ -0,0 +1,43 @@
+"""
+Unit test cho việc rải thời điểm capture trong cửa sổ (services/capture_spread.py)
+"""
+import pytest
+
+from services.capture_spread import CaptureSpreadPlanner
+
+CAMERAS = [{"camera_id": camera_id} for camera_id in range(1, 6)]
+
+
+def test_none_policy_starts_everything_at_tick():
+    assert CaptureSpreadPlanner("none", 20).plan(CAMERAS) == [0.0] * 5
+
+
+def test_hash_policy_is_stable_and_inside_window():
+    planner = CaptureSpreadPlanner("hash", 20)
+    offsets = planner.plan(CAMERAS)
+    assert offsets == planner.plan(list(reversed(CAMERAS)))[::-1]
+    assert all(0 <= offset < 20 for offset in offsets)
+    assert len(set(offsets)) == len(offsets)
+
+
+def test_latency_policy_starts_slow_cameras_first():
+    planner = CaptureSpreadPlanner("latency", 10)
+    planner.observe([{"camera_id": 1, "frame_time": 100.0}, {"camera_id": 2, "frame_time": 300.0},
+                     {"camera_id": 3, "frame_time": 600.0}])
+    offsets = planner.plan(CAMERAS[:3])
+    # Camera 3 chậm nhất bắt đầu ngay, mỗi camera sau bắt đầu khi phần tải trước đã rải hết
+    assert offsets == pytest.approx([9.0, 6.0, 0.0])
+
+
+def test_latency_is_smoothed_and_unknown_cameras_use_average():
+    planner = CaptureSpreadPlanner("latency", 10)
+    planner.observe([{"camera_id": 1, "frame_time": 100.0}])
+    planner.observe([{"camera_id": 1, "frame_time": 200.0}, {"camera_id": 2, "frame_time": 0}])
+    assert planner._latency_ms == {1: pytest.approx(130.0)}
+    # Camera 2 chưa có số đo dùng trung bình 130ms: hai camera chia đều cửa sổ
+    assert sorted(planner.plan(CAMERAS[:2])) == pytest.approx([0.0, 5.0])
+
+
+def test_invalid_policy_is_rejected():
+    with pytest.raises(ValueError):
+        CaptureSpreadPlanner("random")
@@ -0,0 +1,98 @@
+"""
+Unit test cho phiên warm-up (services/capture_warmup.py): slot của host trong limiter
+được giữ khi mở phiên, chuyển cho camera khi adopt() và được trả khi phiên đóng
+"""
+import time
+
+import cv2
+import numpy as np
+import pytest
+
+import services.capture_warmup as warmup_module
+from services.capture_warmup import CaptureWarmupPool
+from services.host_limiter import HostConcurrencyLimiter
+
+
+class FakeCapture:
+    def __init__(self, url, *args):
+        self.url = url
+
+    def set(self, prop, value):
+        return True
+
+    def isOpened(self):
+        return "bad" not in self.url
+
+    def grab(self):
+        time.sleep(0.005)
+        return True
+
+    def get(self, prop):
+        return {cv2.CAP_PROP_FRAME_WIDTH: 4, cv2.CAP_PROP_FRAME_HEIGHT: 3}[prop]
+
+    def read(self, image=None):
+        return True, np.zeros((3, 4, 3), dtype=np.uint8)
+
+    def release(self):
+        pass
+
+
+@pytest.fixture
+def limiter(monkeypatch):
+    monkeypatch.setattr(warmup_module.cv2, "VideoCapture", FakeCapture)
+    return HostConcurrencyLimiter(per_host=2)
+
+
+def wait_until(predicate, timeout=2.0):
+    deadline = time.time() + timeout
+    while not predicate() and time.time() < deadline:
+        time.sleep(0.01)
+    return predicate()
+
+
+def cameras(*urls):
+    return [{"rtsp_url": url} for url in urls]
+
+
+def test_warm_sessions_hold_host_slots(limiter):
+    pool = CaptureWarmupPool(lead_seconds=5, max_sessions=8, ttl_seconds=5, limiter=limiter)
+    opened = pool.open(cameras("rtsp://nvr1/ch1", "rtsp://nvr1/ch2", "rtsp://nvr1/ch3", "rtsp://nvr2/ch1"))
+
+    # Host thứ nhất chỉ còn 2 slot: phiên thứ ba không được mở, capture thường cũng không còn slot
+    assert opened == 3
+    assert limiter.snapshot()["active"] == {"nvr1:554": 2, "nvr2:554": 1}
+    assert limiter.acquire_many({"nvr1:554": 1}, timeout=0) is False
+
+
+def test_take_burst_releases_slot_of_unadopted_session(limiter):
+    pool = CaptureWarmupPool(lead_seconds=5, max_sessions=8, ttl_seconds=5, limiter=limiter)
+    pool.open(cameras("rtsp://nvr1/ch1"))
+    assert wait_until(lambda: pool._sessions["rtsp://nvr1:554/ch1"].ready.is_set())
+
+    frames = pool.take_burst("rtsp://nvr1/ch1", 2)
+
+    assert len(frames) == 2
+    assert limiter.snapshot()["active"] == {}
+
+
+def test_adopted_slot_is_kept_until_caller_releases(limiter):
+    pool = CaptureWarmupPool(lead_seconds=5, max_sessions=8, ttl_seconds=5, limiter=limiter)
+    pool.open(cameras("rtsp://nvr1/ch1"))
+
+    host = pool.adopt("rtsp://nvr1/ch1")
+    assert host == "nvr1:554"
+    # Slot chỉ được chuyển một lần
+    assert pool.adopt("rtsp://nvr1/ch1") is None
+
+    pool.take_burst("rtsp://nvr1/ch1", 1)
+    assert limiter.snapshot()["active"] == {"nvr1:554": 1}
+    limiter.release(host)
+    assert limiter.snapshot()["active"] == {}
+
+
+def test_expired_or_failed_session_returns_slot(limiter):
+    pool = CaptureWarmupPool(lead_seconds=0.05, max_sessions=8, ttl_seconds=0, limiter=limiter)
+    pool.open(cameras("rtsp://nvr1/ch1", "rtsp://bad/ch1"))
+
+    assert wait_until(lambda: limiter.snapshot()["active"] == {})
+    assert pool.adopt("rtsp://nvr1/ch1") is None
@@ -0,0 +1,46 @@
+"""
+Unit test cho việc chia camera giữa các node (services/cluster_membership.py)
+khi không đọc được bảng scheduler_nodes
+"""
+import pytest
+
+import services.cluster_membership as membership_module
+from services.cluster_membership import ClusterMembership
+
+
+class FakeDbService:
+    def __init__(self, nodes):
+        self.nodes = nodes
+
+    def heartbeat_node_safe(self, *args):
+        return True
+
+    def get_live_nodes_safe(self, ttl):
+        return None if self.nodes is None else list(self.nodes)
+
+
+@pytest.fixture
+def db(monkeypatch):
+    service = FakeDbService(["node-a", "node-b"])
+    monkeypatch.setattr(membership_module, "thread_safe_db_service", service)
+    return service
+
+
+def cameras():
+    return [{"camera_id": camera_id} for camera_id in range(1, 21)]
+
+
+def test_unreadable_nodes_reuse_last_node_list(db):
+    membership = ClusterMembership(enabled=True, node_id="node-a")
+    selected = membership.select_cameras(cameras())
+    assert 0 < len(selected) < 20
+
+    db.nodes = None
+    assert membership.select_cameras(cameras()) == selected
+
+
+def test_unreadable_nodes_without_history_capture_nothing(db):
+    db.nodes = None
+    membership = ClusterMembership(enabled=True, node_id="node-a")
+
+    assert membership.select_cameras(cameras()) == []
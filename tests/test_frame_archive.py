@@ -0,0 +1,70 @@
+"""
+Unit test cho pool thread ghi ảnh lưu trữ (services/frame_archive.py)
+"""
+import threading
+import time
+
+import cv2
+import numpy as np
+import pytest
+
+from services.frame_archive import FrameArchiveWriter
+
+
+def image(value=0, width=8, height=4):
+    return np.full((height, width, 3), value, dtype=np.uint8)
+
+
+def fill_queue(writer, tmp_path):
+    """Worker duy nhất bận ghi ảnh 'first', queue (1 chỗ) đã có ảnh 'queued'"""
+    release = threading.Event()
+
+    def blocked():
+        release.wait(5)
+        return image()
+
+    writer.submit(str(tmp_path), "first", blocked)
+    deadline = time.monotonic() + 5
+    while writer._queue.qsize() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    writer.submit(str(tmp_path), "queued", image)
+    return release
+
+
+@pytest.mark.parametrize("policy, written, returned", [
+    ("drop_oldest", {"first.jpg", "latest.jpg"}, True),
+    ("drop_newest", {"first.jpg", "queued.jpg"}, False),
+])
+def test_drop_policy_when_queue_is_full(tmp_path, policy, written, returned):
+    writer = FrameArchiveWriter(workers=1, queue_size=1, drop_policy=policy)
+    release = fill_queue(writer, tmp_path)
+
+    path = writer.submit(str(tmp_path), "latest", image)
+    release.set()
+
+    assert (path is not None) == returned
+    assert writer.flush(timeout=5)
+    assert {file.name for file in tmp_path.iterdir()} == written
+    stats = writer.snapshot()
+    assert (stats["submitted"], stats["written"], stats["dropped"]) == (3, 2, 1)
+
+
+def test_images_are_downscaled_and_invalid_settings_fall_back(tmp_path):
+    writer = FrameArchiveWriter(workers=1, drop_policy="drop_random", image_format="JPEG", max_width=4)
+    assert (writer.drop_policy, writer.image_format) == ("drop_oldest", "jpg")
+
+    path = writer.submit(str(tmp_path), "small", lambda: image(width=8, height=4))
+    assert writer.flush(timeout=5)
+
+    assert cv2.imread(path).shape == (2, 4, 3)
+
+
+def test_render_errors_are_counted(tmp_path):
+    writer = FrameArchiveWriter(workers=1)
+
+    def broken():
+        raise RuntimeError("draw failed")
+
+    writer.submit(str(tmp_path), "broken", broken)
+    assert writer.flush(timeout=5)
+    assert writer.snapshot()["failed"] == 1
@@ -0,0 +1,98 @@
+"""
+Unit test cho pool buffer frame (services/frame_pool.py)
+"""
+import multiprocessing
+
+import cv2
+import numpy as np
+import pytest
+
+import services.capture_watchdog as watchdog_module
+from services.capture_watchdog import CaptureWatchdog
+from services.frame_pool import FramePool, readonly
+
+
+class FakeCapture:
+    def __init__(self, width=4, height=3, ok=True, shape=None):
+        self.width, self.height, self.ok, self.shape = width, height, ok, shape
+
+    def get(self, prop):
+        return {cv2.CAP_PROP_FRAME_WIDTH: self.width, cv2.CAP_PROP_FRAME_HEIGHT: self.height}[prop]
+
+    def read(self, image=None):
+        if not self.ok:
+            return False, None
+        if self.shape is not None or image is None:
+            # Luồng đổi độ phân giải: OpenCV cấp phát mảng mới
+            return True, np.full(self.shape or (self.height, self.width, 3), 7, dtype=np.uint8)
+        image[:] = 7
+        return True, image
+
+
+def test_read_returns_readonly_view_of_pooled_buffer():
+    pool = FramePool(enabled=True)
+    frame = pool.read(FakeCapture())
+
+    assert frame.shape == (3, 4, 3) and not frame.flags.writeable
+    with pytest.raises(ValueError):
+        frame[0, 0, 0] = 1
+
+    pool.release(frame)
+    again = pool.read(FakeCapture())
+    assert pool.allocated == 1 and pool.reused == 1
+    assert np.shares_memory(frame, again)
+
+
+def test_release_ignores_foreign_arrays_and_double_release():
+    pool = FramePool(enabled=True)
+    frame = pool.read(FakeCapture())
+
+    pool.release(np.zeros((3, 4, 3), dtype=np.uint8), readonly(np.zeros((3, 4, 3), dtype=np.uint8)), None, 5)
+    assert pool.snapshot()["in_use"] == 1 and pool.snapshot()["pooled_mb"] == 0
+
+    pool.release(frame, frame[1:, 1:])
+    pool.release(frame)
+    assert pool.snapshot()["in_use"] == 0
+    assert len(pool._free[(3, 4, 3)]) == 1
+
+
+def test_failed_or_resized_read_returns_buffer_to_pool():
+    pool = FramePool(enabled=True)
+    assert pool.read(FakeCapture(ok=False)) is None
+    frame = pool.read(FakeCapture(shape=(6, 8, 3)))
+
+    assert frame.shape == (6, 8, 3)
+    assert pool.snapshot()["in_use"] == 0
+    assert len(pool._free[(3, 4, 3)]) == 1
+
+
+def test_free_list_is_capped_per_shape():
+    pool = FramePool(enabled=True, max_per_shape=1)
+    frames = [pool.read(FakeCapture()) for _ in range(3)]
+    pool.release(*frames)
+    assert len(pool._free[(3, 4, 3)]) == 1
+
+
+def test_disabled_pool_allocates_per_read():
+    pool = FramePool(enabled=False)
+    frame = pool.read(FakeCapture())
+    pool.release(frame)
+    assert frame is not None and pool.allocated == 0 and pool.snapshot()["in_use"] == 0
+
+
+def test_watchdog_frames_are_received_into_pooled_buffers(monkeypatch):
+    pool = FramePool(enabled=True)
+    monkeypatch.setattr(watchdog_module, "frame_pool", pool)
+    receiver, sender = multiprocessing.Pipe(duplex=False)
+    sender.send_bytes(memoryview(np.full((3, 4, 3), 7, dtype=np.uint8)).cast("B"))
+    sender.send_bytes(b"short")
+
+    frame = CaptureWatchdog._recv_frame(receiver, (3, 4, 3), np.dtype(np.uint8))
+    assert frame.shape == (3, 4, 3) and int(frame[0, 0, 0]) == 7 and not frame.flags.writeable
+    assert pool.snapshot()["in_use"] == 1
+    pool.release(frame)
+    assert pool.snapshot()["in_use"] == 0
+
+    # Dữ liệu không đủ kích thước frame: buffer được trả lại ngay
+    assert CaptureWatchdog._recv_frame(receiver, (3, 4, 3), np.dtype(np.uint8)) is None
+    assert pool.snapshot()["in_use"] == 0 and pool.reused == 1
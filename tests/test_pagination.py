@@ -0,0 +1,84 @@
+"""
+Unit test cho keyset pagination (api/pagination.py) và các list endpoint dùng nó
+"""
+from datetime import datetime
+
+import pytest
+from fastapi import HTTPException, Response
+
+import api.camera as camera_api
+from api.measurement import export_measurements
+from api.pagination import NEXT_CURSOR_HEADER, decode_cursor, encode_cursor, paginate, parse_fields
+from services.export_service import measurement_export_service
+
+
+def test_cursor_round_trip():
+    cursor = encode_cursor([datetime(2026, 1, 1, 8, 0, 0, 123000), 42])
+    assert decode_cursor(cursor, 2) == ["2026-01-01 08:00:00.123000", 42]
+
+
+@pytest.mark.parametrize("cursor", ["not-base64!", encode_cursor([1, 2]), encode_cursor({"id": 1})])
+def test_invalid_cursor_is_rejected(cursor):
+    with pytest.raises(HTTPException) as error:
+        decode_cursor(cursor, 1)
+    assert error.value.status_code == 400
+
+
+def test_paginate_sets_next_cursor_only_when_more_rows():
+    response = Response()
+    rows = [{"camera_id": camera_id} for camera_id in (1, 2, 3)]
+    assert paginate(response, rows, 2, ["camera_id"]) == rows[:2]
+    assert decode_cursor(response.headers[NEXT_CURSOR_HEADER], 1) == [2]
+
+    response = Response()
+    assert paginate(response, rows, 3, ["camera_id"]) == rows
+    assert NEXT_CURSOR_HEADER not in response.headers
+
+
+def test_parse_fields_keeps_key_columns():
+    assert parse_fields("x,y", ["measurement_id", "x", "y"], ["measurement_id"]) == ["measurement_id", "x", "y"]
+    with pytest.raises(HTTPException):
+        parse_fields("password", ["x"], [])
+
+
+def test_cameras_without_limit_or_cursor_returns_all(fake_connection):
+    rows = [{"camera_id": camera_id} for camera_id in range(1, 251)]
+    cursor = fake_connection(camera_api)
+    cursor.results = [rows]
+    response = Response()
+
+    assert camera_api.get_cameras(response, limit=None, cursor=None, fields=None) == rows
+    query, params = cursor.statements[0]
+    assert "LIMIT" not in query and params == []
+    assert NEXT_CURSOR_HEADER not in response.headers
+
+
+def test_cameras_with_cursor_uses_default_page_size(fake_connection):
+    cursor = fake_connection(camera_api)
+    cursor.results = [[{"camera_id": 11}]]
+
+    camera_api.get_cameras(Response(), limit=None, cursor=encode_cursor([10]), fields=None)
+    query, params = cursor.statements[0]
+    assert query.endswith("WHERE camera_id > %s ORDER BY camera_id LIMIT %s")
+    assert params == [10, camera_api.DEFAULT_PAGE_SIZE + 1]
+
+
+def test_measurement_page_query_shares_export_filters():
+    after = (datetime(2026, 1, 1, 8, 0), 7)
+    query, params = measurement_export_service.build_query(camera_id=3, columns=["measurement_id", "tracking_time"],
+                                                           order="desc", after=after, limit=11)
+    assert query == ("SELECT measurement_id, tracking_time FROM measurements WHERE camera_id = %s"
+                     " AND (tracking_time < %s OR (tracking_time = %s AND measurement_id < %s))"
+                     " ORDER BY tracking_time DESC, measurement_id DESC LIMIT %s")
+    assert params == [3, after[0], after[0], 7, 11]
+
+    export_query, export_params = measurement_export_service.build_query(camera_id=3)
+    assert export_query.endswith("WHERE camera_id = %s ORDER BY tracking_time ASC, measurement_id ASC")
+    assert export_params == [3]
+
+
+def test_export_without_pyarrow_is_not_acceptable(monkeypatch):
+    monkeypatch.setattr(measurement_export_service, "is_format_available", lambda export_format: False)
+    with pytest.raises(HTTPException) as error:
+        export_measurements(format="parquet")
+    assert error.value.status_code == 406 and "pyarrow" in error.value.detail
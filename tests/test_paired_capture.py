@@ -0,0 +1,186 @@
+"""
+Unit test cho chụp đồng bộ theo cặp camera: pair_groups, PairSync và việc điều phối cả nhóm
+như một đơn vị trong hai capture engine (nhóm lớn hơn số worker / nhiều camera trên một NVR)
+"""
+import threading
+import time
+
+import pytest
+
+import services.async_capture_orchestrator as orchestrator_module
+import services.capture_backends as backends_module
+import services.capture_pipeline as pipeline_module
+from services.capture_backends import CaptureBackend
+from services.host_limiter import HostConcurrencyLimiter
+from services.paired_capture import PairSync, PairedCaptureEngine, pair_groups
+
+
+class FakeBackend(CaptureBackend):
+    """Mở phiên mất open_delay giây, ghi thời điểm đọc frame của từng URL"""
+
+    name = "opencv"
+
+    def __init__(self, open_delay: float = 0.05):
+        super().__init__()
+        self.open_delay = open_delay
+        self.read_at = {}
+
+    def grab_burst(self, url, count, before_read=None):
+        if "bad" in url:
+            return [], "Cannot open RTSP stream"
+        time.sleep(self.open_delay)
+        if before_read is not None:
+            before_read()
+        self.read_at[url] = time.time()
+        return [object()] * count, None
+
+
+class FakeRTSPService:
+    def __init__(self):
+        self.saved = []
+
+    def detect_qr_codes(self, frame, camera_id):
+        return [((0, 0, 2, 2), f"qr-{camera_id}", 2, 1, 1)]
+
+    def save_detections_safe(self, frame, rois, camera_id, tracking_time=None, captured_at=None, burst_stats=None):
+        self.saved.append((camera_id, captured_at))
+
+
+@pytest.fixture
+def backend(monkeypatch):
+    backend = FakeBackend()
+    monkeypatch.setitem(backends_module.capture_backends, "opencv", backend)
+    monkeypatch.setattr(backends_module, "CAPTURE_BACKEND", "opencv")
+    return backend
+
+
+@pytest.fixture
+def rtsp_service(monkeypatch):
+    service = FakeRTSPService()
+    monkeypatch.setattr(pipeline_module, "thread_safe_rtsp_service", service)
+    monkeypatch.setattr(orchestrator_module, "thread_safe_rtsp_service", service)
+    monkeypatch.setattr(pipeline_module.worker_pool_sizer, "enabled", False)
+    return service
+
+
+def make_group(reference_host: str = "nvr1", movable_hosts=("nvr2", "nvr3", "nvr4", "nvr5")):
+    cameras = [{"name": "ref", "camera_id": 1, "rtsp_url": f"rtsp://{reference_host}/ref"}]
+    pairs = []
+    for index, host in enumerate(movable_hosts, start=2):
+        cameras.append({"name": f"mov{index}", "camera_id": index, "rtsp_url": f"rtsp://{host}/ch{index}"})
+        pairs.append({"camera_id_movable": index, "camera_id_fixed": 1})
+    return cameras, pair_groups(pairs)
+
+
+# ==================== pair_groups ====================
+
+def test_pair_groups_merges_pairs_sharing_a_camera():
+    groups = pair_groups([
+        {"camera_id_movable": 3, "camera_id_fixed": 1},
+        {"camera_id_movable": 2, "camera_id_fixed": 1},
+        {"camera_id_movable": 7, "camera_id_fixed": 9},
+    ])
+    assert groups == {1: "pair:1", 2: "pair:1", 3: "pair:1", 7: "pair:7", 9: "pair:7"}
+
+
+def test_pair_groups_empty():
+    assert pair_groups([]) == {}
+
+
+# ==================== PairSync ====================
+
+def test_pair_sync_releases_all_parties_together():
+    backend = FakeBackend(open_delay=0)
+    sync = PairSync("pair:1", 2, timeout=2)
+    results = {}
+
+    def capture(url, delay):
+        time.sleep(delay)
+        results[url] = sync.capture(url, backend, url)
+
+    threads = [threading.Thread(target=capture, args=("rtsp://a/1", 0.0)),
+               threading.Thread(target=capture, args=("rtsp://b/1", 0.2))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert all(frames for frames, _ in results.values())
+    assert sync.captured_at is not None and not sync.broken
+    assert abs(backend.read_at["rtsp://a/1"] - backend.read_at["rtsp://b/1"]) < 0.05
+
+
+def test_pair_sync_aborts_when_a_party_fails_before_barrier():
+    backend = FakeBackend(open_delay=0)
+    sync = PairSync("pair:1", 2, timeout=5)
+    results = {}
+
+    def capture(url):
+        results[url] = sync.capture(url, backend, url)
+
+    started = time.time()
+    threads = [threading.Thread(target=capture, args=(url,)) for url in ("rtsp://a/bad", "rtsp://b/1")]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert time.time() - started < 1
+    assert sync.broken and sync.captured_at is None
+    assert results["rtsp://a/bad"] == ([], "Cannot open RTSP stream")
+    assert results["rtsp://b/1"][0]
+
+
+# ==================== Điều phối nhóm trong engine ====================
+
+def run_pipeline(cameras, groups, monkeypatch, per_host):
+    monkeypatch.setattr(pipeline_module, "host_concurrency_limiter", HostConcurrencyLimiter(per_host=per_host))
+    # Burst 2 frame: mọi camera đều lấy frame qua backend (không cần RTSP/ffmpeg thật)
+    monkeypatch.setattr(pipeline_module, "BURST_FRAMES", 2)
+    pipeline = pipeline_module.CapturePipeline(capture_workers=2, detect_workers=1, persist_workers=1,
+                                               isolate_capture=False, timeout_seconds=10)
+    return PairedCaptureEngine(pipeline, groups, sync_timeout=3).run(cameras)
+
+
+def run_async(cameras, groups, monkeypatch, per_host):
+    monkeypatch.setattr(orchestrator_module, "MAX_SESSIONS_PER_HOST", per_host)
+    orchestrator = orchestrator_module.AsyncCaptureOrchestrator(max_concurrent=2, capture_threads=2, run_window=10,
+                                                           burst_frames=2)
+    return PairedCaptureEngine(orchestrator, groups, sync_timeout=3).run(cameras)
+
+
+@pytest.mark.parametrize("run_engine", [run_pipeline, run_async])
+def test_group_larger_than_workers_is_synced(run_engine, backend, rtsp_service, monkeypatch):
+    # 1 camera mốc + 4 camera di động, chỉ có 2 worker / 2 phiên đồng thời
+    cameras, groups = make_group()
+    started = time.time()
+    results = run_engine(cameras, groups, monkeypatch, per_host=2)
+
+    assert time.time() - started < 2, "nhóm phải được chụp ngay, không chờ hết timeout của barrier"
+    assert [result["pair_synced"] for result in results] == [True] * 5
+    assert all(result["success"] for result in results)
+    read_times = list(backend.read_at.values())
+    assert max(read_times) - min(read_times) < 0.05
+    assert len({captured_at for _, captured_at in rtsp_service.saved}) == 1
+
+
+@pytest.mark.parametrize("run_engine", [run_pipeline, run_async])
+def test_pair_on_one_nvr_with_single_session_per_host(run_engine, backend, rtsp_service, monkeypatch):
+    cameras, groups = make_group(reference_host="nvr1", movable_hosts=("nvr1",))
+    started = time.time()
+    results = run_engine(cameras, groups, monkeypatch, per_host=1)
+
+    assert time.time() - started < 2
+    assert [result["pair_synced"] for result in results] == [True, True]
+
+
+@pytest.mark.parametrize("run_engine", [run_pipeline, run_async])
+def test_group_and_single_cameras_share_host(run_engine, backend, rtsp_service, monkeypatch):
+    cameras, groups = make_group(reference_host="nvr1", movable_hosts=("nvr1",))
+    cameras += [{"name": f"single{index}", "camera_id": index, "rtsp_url": f"rtsp://nvr1/s{index}"}
+                for index in range(10, 14)]
+    results = run_engine(cameras, groups, monkeypatch, per_host=2)
+
+    by_id = {result["camera_id"]: result for result in results}
+    assert by_id[1]["pair_synced"] and by_id[2]["pair_synced"]
+    assert all(result["success"] for result in results)
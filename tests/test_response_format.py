@@ -0,0 +1,38 @@
+"""
+Unit test cho content negotiation của dữ liệu biểu đồ (api/response_format.py)
+khi server thiếu thư viện của định dạng nhị phân
+"""
+import pytest
+from fastapi import HTTPException
+
+import api.response_format as response_format
+from api.response_format import ARROW_MEDIA_TYPE, JSON_MEDIA_TYPE, MSGPACK_MEDIA_TYPE, negotiate_media_type
+
+
+class FakeRequest:
+    def __init__(self, accept: str = ""):
+        self.headers = {"accept": accept}
+
+
+@pytest.fixture
+def without_pyarrow(monkeypatch):
+    monkeypatch.setattr(response_format, "is_media_type_available",
+                        lambda media_type: media_type != ARROW_MEDIA_TYPE)
+
+
+def test_explicit_unavailable_format_is_not_acceptable(without_pyarrow):
+    with pytest.raises(HTTPException) as error:
+        negotiate_media_type(FakeRequest(), format="arrow")
+    assert error.value.status_code == 406 and "pyarrow" in error.value.detail
+
+
+def test_accept_falls_through_to_next_available_format(without_pyarrow):
+    request = FakeRequest(f"{ARROW_MEDIA_TYPE}, {MSGPACK_MEDIA_TYPE};q=0.9")
+    assert negotiate_media_type(request) == MSGPACK_MEDIA_TYPE
+    assert negotiate_media_type(FakeRequest(f"{ARROW_MEDIA_TYPE}, */*;q=0.1")) == JSON_MEDIA_TYPE
+
+
+def test_accept_with_only_unavailable_format_is_not_acceptable(without_pyarrow):
+    with pytest.raises(HTTPException) as error:
+        negotiate_media_type(FakeRequest(ARROW_MEDIA_TYPE))
+    assert error.value.status_code == 406
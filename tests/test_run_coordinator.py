@@ -0,0 +1,109 @@
+"""
+Unit test cho điều phối lượt chạy theo lịch (services/run_coordinator.py)
+"""
+import threading
+from datetime import datetime
+
+import pytest
+
+import services.run_coordinator as run_coordinator_module
+from services.run_coordinator import RunCoordinator
+
+
+@pytest.fixture
+def run_log(monkeypatch):
+    """Trạng thái được ghi vào capture_runs: [(scheduled_for.hour, status)]"""
+    log = []
+    scheduled = {}
+
+    def record(run_id, scheduled_for, trigger_source, status, node_id=None):
+        scheduled[run_id] = scheduled_for
+        log.append((scheduled_for.hour, status))
+        return True
+
+    def finish(run_id, status, camera_count=0, success_count=0):
+        log.append((scheduled[run_id].hour, status))
+        return True
+
+    db = run_coordinator_module.thread_safe_db_service
+    monkeypatch.setattr(db, "record_capture_run_safe", record)
+    monkeypatch.setattr(db, "finish_capture_run_safe", finish)
+    return log
+
+
+class BlockingRunner:
+    """Lượt đầu tiên chờ release() để các lượt sau đến khi nó còn đang chạy"""
+
+    def __init__(self):
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.ran = []
+
+    def __call__(self, run_id, scheduled_for):
+        self.ran.append(scheduled_for.hour)
+        if len(self.ran) == 1:
+            self.started.set()
+            self.release.wait(5)
+        return {"camera_count": 1, "success_count": 1}
+
+
+def tick(hour):
+    return datetime(2026, 1, 1, hour, 0)
+
+
+def run_overlapping(coordinator, runner, later_hours):
+    thread = threading.Thread(target=coordinator.submit, args=(tick(1),))
+    thread.start()
+    assert runner.started.wait(5)
+    run_ids = [coordinator.submit(tick(hour)) for hour in later_hours]
+    runner.release.set()
+    thread.join(5)
+    return run_ids
+
+
+def test_skip_drops_runs_while_busy(run_log):
+    runner = BlockingRunner()
+    coordinator = RunCoordinator(runner, policy="skip")
+
+    assert run_overlapping(coordinator, runner, [2, 3]) == [None, None]
+
+    assert runner.ran == [1]
+    assert (2, "skipped") in run_log and (3, "skipped") in run_log
+    assert coordinator.active_run_id is None
+
+
+def test_queue_runs_up_to_max_queued_in_order(run_log):
+    runner = BlockingRunner()
+    coordinator = RunCoordinator(runner, policy="queue", max_queued=2)
+
+    run_ids = run_overlapping(coordinator, runner, [2, 3, 4])
+
+    assert run_ids[0] and run_ids[1] and run_ids[2] is None
+    assert runner.ran == [1, 2, 3]
+    assert (4, "skipped") in run_log
+    assert run_log.count((3, "completed")) == 1
+
+
+def test_coalesce_keeps_only_latest_pending_run(run_log):
+    runner = BlockingRunner()
+    coordinator = RunCoordinator(runner, policy="coalesce")
+
+    run_overlapping(coordinator, runner, [2, 3, 4])
+
+    assert runner.ran == [1, 4]
+    assert (2, "coalesced") in run_log and (3, "coalesced") in run_log
+
+
+def test_failed_runner_is_recorded_and_next_run_still_starts(run_log):
+    def runner(run_id, scheduled_for):
+        raise RuntimeError("boom")
+
+    coordinator = RunCoordinator(runner, policy="skip")
+    assert coordinator.submit(tick(1)) is not None
+    assert coordinator.submit(tick(2)) is not None
+    assert run_log == [(1, "running"), (1, "failed"), (2, "running"), (2, "failed")]
+
+
+def test_invalid_policy_is_rejected():
+    with pytest.raises(ValueError):
+        RunCoordinator(lambda run_id, scheduled_for: None, policy="parallel")
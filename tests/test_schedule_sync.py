@@ -0,0 +1,32 @@
+"""
+Unit test cho việc worker nhận thay đổi schedule_times (task/test_task.py)
+"""
+import task.test_task as test_task_module
+from task.test_task import CameraTaskServiceTest
+
+
+def test_schedule_change_triggers_resync(monkeypatch):
+    fingerprints = iter([(2, 111), (2, 111), (2, 111), (3, 222), (3, 222)])
+    monkeypatch.setattr(test_task_module.thread_safe_db_service, "get_schedule_fingerprint_safe",
+                        lambda: next(fingerprints))
+    monkeypatch.setattr(test_task_module.thread_safe_db_service, "get_active_schedules_safe",
+                        lambda: [{"schedule_time_id": 1, "capture_time": "08:00:00", "is_active": 1}])
+    service = CameraTaskServiceTest()
+    synced = []
+    original_sync = service.sync_schedules
+    monkeypatch.setattr(service, "sync_schedules", lambda: synced.append(1) or original_sync())
+
+    service.sync_schedules()          # đọc fingerprint (2, 111)
+    service._check_schedule_changes()  # không đổi
+    assert len(synced) == 1
+    service._check_schedule_changes()  # (2, 111) -> không đổi
+    service._check_schedule_changes()  # (3, 222) -> đồng bộ lại, đọc fingerprint (3, 222)
+    assert len(synced) == 2
+    assert service._schedule_fingerprint == (3, 222)
+
+
+def test_unreadable_fingerprint_keeps_triggers(monkeypatch):
+    monkeypatch.setattr(test_task_module.thread_safe_db_service, "get_schedule_fingerprint_safe", lambda: None)
+    service = CameraTaskServiceTest()
+    monkeypatch.setattr(service, "sync_schedules", lambda: (_ for _ in ()).throw(AssertionError("resync")))
+    service._check_schedule_changes()
@@ -0,0 +1,69 @@
+"""
+Unit test cho hub SSE độ lún (services/settlement_stream.py): measurement từ pipeline trong
+process và từ poll latest_measurements (process/node khác ghi) không bị phát trùng
+"""
+import asyncio
+from datetime import datetime
+
+from services.settlement_stream import SettlementStreamHub
+
+KEY = (1, 2, 10, 20)
+CONTEXT = {"ym0": 100, "yr0": 50, "Sb": 1.0, "Sa": 1.0}
+
+
+def subscribe(fake_db, hub, loop):
+    fake_db.results = [
+        [{"camera_id": 10, "conversion_rate": 1.0}, {"camera_id": 20, "conversion_rate": 1.0}],
+        [{"qr_code_id": 1, "initial_y": 100}, {"qr_code_id": 2, "initial_y": 50}],
+        [{"qr_code_id": 1, "measurement_id": 5, "y": 100}],
+    ]
+    return hub.subscribe(KEY, loop)
+
+
+def drain(loop, subscriber):
+    loop.run_until_complete(asyncio.sleep(0))
+    events = []
+    while not subscriber.queue.empty():
+        events.append(subscriber.queue.get_nowait())
+    return events
+
+
+def test_poll_pushes_measurements_written_elsewhere(fake_db):
+    loop = asyncio.new_event_loop()
+    hub = SettlementStreamHub(poll_seconds=3600)
+    try:
+        subscriber = subscribe(fake_db, hub, loop)
+        assert hub.current_point(KEY) == {"settlement": 0.0}
+
+        # Worker ở process khác đã ghi measurement 6 của QR di động
+        fake_db.results = [[{"qr_code_id": 1, "measurement_id": 6, "y": 104,
+                             "tracking_time": datetime(2026, 1, 1, 8, 0)},
+                            {"qr_code_id": 2, "measurement_id": 3, "y": 50,
+                             "tracking_time": datetime(2026, 1, 1, 7, 0)}]]
+        hub.poll_once()
+        events = drain(loop, subscriber)
+        assert [(event["qr_code_id"], event["settlement"]) for event in events] == [(1, 4.0), (2, 4.0)]
+
+        # Poll lại cùng dữ liệu: không phát trùng
+        fake_db.results = [[{"qr_code_id": 1, "measurement_id": 6, "y": 104,
+                             "tracking_time": datetime(2026, 1, 1, 8, 0)}]]
+        hub.poll_once()
+        assert drain(loop, subscriber) == []
+    finally:
+        loop.close()
+
+
+def test_local_publish_is_not_repeated_by_poll(fake_db):
+    loop = asyncio.new_event_loop()
+    hub = SettlementStreamHub(poll_seconds=3600)
+    try:
+        subscriber = subscribe(fake_db, hub, loop)
+        measurement = {"qr_code_id": 1, "measurement_id": 7, "y": 103, "tracking_time": datetime(2026, 1, 1, 8, 0)}
+        hub.publish_measurement(measurement)
+        assert [event["settlement"] for event in drain(loop, subscriber)] == [3.0]
+
+        fake_db.results = [[measurement]]
+        hub.poll_once()
+        assert drain(loop, subscriber) == []
+    finally:
+        loop.close()
@@ -0,0 +1,78 @@
+"""
+Unit test cho việc gộp camera cùng nguồn RTSP (services/stream_dedup.py)
+"""
+import pytest
+
+from services.stream_dedup import DedupedEngine, normalize_rtsp_url
+
+
+@pytest.mark.parametrize("url, expected", [
+    ("RTSP://Admin:pw@NVR.Local/Streaming/Channels/101/", "rtsp://nvr.local:554/Streaming/Channels/101"),
+    ("rtsp://nvr.local:554/live?subtype=0&channel=1", "rtsp://nvr.local:554/live?channel=1&subtype=0"),
+    ("  rtsp://10.0.0.5  ", "rtsp://10.0.0.5:554/"),
+    ("http://cam/snap.jpg", "http://cam:80/snap.jpg"),
+    (None, ""),
+])
+def test_normalize_rtsp_url(url, expected):
+    assert normalize_rtsp_url(url) == expected
+
+
+class RecordingEngine:
+    last_stats = {"engine": "fake"}
+
+    def __init__(self):
+        self.cameras = []
+
+    def run(self, cameras, scheduled_for=None):
+        self.cameras = cameras
+        return [{"camera_id": camera['camera_id'], "camera_name": camera['name'], "success": True, "qr_count": 2}
+                for camera in cameras]
+
+
+def test_shared_source_is_captured_once_and_result_fanned_out():
+    engine = RecordingEngine()
+    cameras = [
+        {"camera_id": 1, "name": "cam1", "rtsp_url": "rtsp://nvr/ch1"},
+        {"camera_id": 2, "name": "cam2", "rtsp_url": "rtsp://user:pw@NVR:554/ch1/"},
+        {"camera_id": 3, "name": "cam3", "rtsp_url": "rtsp://nvr/ch2"},
+        {"camera_id": 4, "name": "cam4", "rtsp_url": None},
+    ]
+
+    results = DedupedEngine(engine).run(cameras)
+
+    assert [camera['camera_id'] for camera in engine.cameras] == [1, 3, 4]
+    assert [member['camera_id'] for member in engine.cameras[0]['members']] == [1, 2]
+    by_camera = {result['camera_id']: result for result in results}
+    assert sorted(by_camera) == [1, 2, 3, 4]
+    assert by_camera[2]['camera_name'] == "cam2" and by_camera[2]['qr_count'] == 2
+    assert by_camera[1].get('shared_source') and by_camera[2].get('shared_source')
+    assert not by_camera[3].get('shared_source')
+    assert DedupedEngine(engine).last_stats == {"engine": "fake"}
+
+
+def test_same_url_with_different_backend_or_snapshot_is_not_merged():
+    cameras = [
+        {"camera_id": 1, "name": "cam1", "rtsp_url": "rtsp://nvr/ch1"},
+        {"camera_id": 2, "name": "cam2", "rtsp_url": "rtsp://nvr/ch1", "capture_backend": "ffmpeg"},
+        {"camera_id": 3, "name": "cam3", "rtsp_url": "rtsp://nvr/ch1", "snapshot_url": "http://nvr/snap/1"},
+        {"camera_id": 4, "name": "cam4", "rtsp_url": "rtsp://nvr/ch1", "snapshot_url": "http://nvr/snap/2"},
+    ]
+
+    representatives = DedupedEngine.group_by_source(cameras)
+
+    assert [camera['camera_id'] for camera in representatives] == [1, 2, 3, 4]
+
+
+def test_paired_camera_becomes_representative_of_shared_source():
+    engine = RecordingEngine()
+    cameras = [
+        {"camera_id": 1, "name": "cam1", "rtsp_url": "rtsp://nvr/ch1"},
+        {"camera_id": 2, "name": "cam2", "rtsp_url": "rtsp://nvr/ch1", "shard_key": "pair:2"},
+    ]
+
+    results = DedupedEngine(engine, {2: "pair:2"}).run(cameras)
+
+    assert [camera['camera_id'] for camera in engine.cameras] == [2]
+    assert engine.cameras[0]['shard_key'] == "pair:2"
+    assert [member['camera_id'] for member in engine.cameras[0]['members']] == [1, 2]
+    assert sorted(result['camera_id'] for result in results) == [1, 2]
@@ -0,0 +1,49 @@
+"""
+Unit test cho việc tự điều chỉnh số worker của pipeline (services/worker_pool_sizer.py)
+"""
+from types import SimpleNamespace
+
+import pytest
+
+from services.worker_pool_sizer import WorkerPoolSizer
+
+BOUNDS = (2, 16)
+
+
+@pytest.fixture
+def sizer():
+    return WorkerPoolSizer(enabled=True, capture_bounds=BOUNDS, detect_bounds=(1, 4),
+                           target_seconds=10, cpu_high=0.85, cpu_low=0.6)
+
+
+@pytest.mark.parametrize("current, needed, missed, cpu, expected", [
+    (8, 8, True, 0.9, 6),     # CPU bão hoà: giảm 1/4 kể cả khi trễ
+    (2, 8, True, 0.95, 2),    # đã ở mức tối thiểu
+    (4, 9, True, 0.3, 9),     # trễ, CPU rảnh: nhảy lên mức ước lượng
+    (4, 2, True, 0.3, 5),     # trễ nhưng ước lượng thấp: tăng 1
+    (15, 40, True, 0.3, 16),  # không vượt giới hạn trên
+    (4, 9, True, 0.7, 4),     # trễ nhưng CPU không đủ rảnh: giữ nguyên
+    (6, 3, False, 0.3, 5),    # dư thời gian: giảm dần từng worker
+    (6, 6, False, 0.3, 6),
+])
+def test_next_size(sizer, current, needed, missed, cpu, expected):
+    size, reason = sizer._next_size(current, needed, missed, cpu, BOUNDS)
+    assert size == expected
+    assert bool(reason) == (size != current)
+
+
+def test_adjust_applies_littles_law_to_pipeline(sizer):
+    pipeline = SimpleNamespace(capture_workers=2, detect_workers=1)
+    results = [{"frame_time": 3000.0, "qr_time": 500.0}] * 20 + [{"reason": "Timeout"}]
+
+    decision = sizer.adjust(pipeline, results, active_seconds=12, cpu=0.2)
+
+    # 21 camera * 3s / 10s -> 7 capture worker; 21 * 0.5s / 10s -> 2 detect worker
+    assert (pipeline.capture_workers, pipeline.detect_workers) == (7, 2)
+    assert decision["timeouts"] == 1 and decision["capture_workers"] == 7
+
+
+def test_adjust_is_noop_when_disabled():
+    pipeline = SimpleNamespace(capture_workers=3, detect_workers=2)
+    assert WorkerPoolSizer(enabled=False).adjust(pipeline, [{"frame_time": 1}], 100, 0.1) is None
+    assert (pipeline.capture_workers, pipeline.detect_workers) == (3, 2)